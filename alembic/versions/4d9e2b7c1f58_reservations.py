@@ -0,0 +1,55 @@
+"""reservations
+
+Revision ID: 4d9e2b7c1f58
+Revises: e7b4d0c91a36
+Create Date: 2026-10-19 19:05:12.417730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d9e2b7c1f58'
+down_revision: Union[str, Sequence[str], None] = 'e7b4d0c91a36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('reservations',
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('resource_id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('kind', 'resource_id')
+    )
+    op.create_index(op.f('ix_reservations_order_id'), 'reservations', ['order_id'], unique=False)
+    # Claims of the orders still unfinished, the oldest order wins where they overlap
+    op.execute("""
+        INSERT INTO reservations (kind, resource_id, order_id)
+        SELECT kind, resource_id, MIN(order_id)
+        FROM (
+            SELECT 'bucket' AS kind, ba.bucket_id AS resource_id, ba.order_id
+            FROM bucket_actions ba JOIN orders o ON o.id = ba.order_id
+            WHERE o.status NOT IN ('completed', 'failed', 'cancelled')
+              AND o.order_type IN ('unloading', 'place_changing')
+            UNION ALL
+            SELECT 'position', ba.target_position_id, ba.order_id
+            FROM bucket_actions ba JOIN orders o ON o.id = ba.order_id
+            WHERE o.status NOT IN ('completed', 'failed', 'cancelled')
+              AND o.order_type IN ('unloading', 'place_changing')
+              AND ba.target_position_id IS NOT NULL
+        ) claims
+        GROUP BY kind, resource_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reservations_order_id'), table_name='reservations')
+    op.drop_table('reservations')
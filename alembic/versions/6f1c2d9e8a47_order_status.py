@@ -0,0 +1,38 @@
+"""order status
+
+Revision ID: 6f1c2d9e8a47
+Revises: 427cc0a9452a
+Create Date: 2026-10-19 14:03:21.118406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f1c2d9e8a47'
+down_revision: Union[str, Sequence[str], None] = '427cc0a9452a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('status', sa.String(length=20), server_default='pending', nullable=False))
+    op.add_column('orders', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('orders', sa.Column('status_updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_orders_status_priority', 'orders', ['status', 'priority'], unique=False)
+    op.add_column('bucket_actions', sa.Column('status', sa.String(length=20), server_default='pending', nullable=False))
+    op.add_column('bucket_actions', sa.Column('status_updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('bucket_actions', 'status_updated_at')
+    op.drop_column('bucket_actions', 'status')
+    op.drop_index('ix_orders_status_priority', table_name='orders')
+    op.drop_column('orders', 'status_updated_at')
+    op.drop_column('orders', 'created_at')
+    op.drop_column('orders', 'status')
@@ -0,0 +1,105 @@
+"""partition bucket_actions and outbox_events
+
+Revision ID: 8a5f3e61c7d2
+Revises: 4d9e2b7c1f58
+Create Date: 2026-10-19 20:31:58.204117
+
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a5f3e61c7d2'
+down_revision: Union[str, Sequence[str], None] = '4d9e2b7c1f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table: (partition size, indexes as (name, column), foreign keys)
+TABLES = {
+    'bucket_actions': ('month', [], [
+        'FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE',
+        'FOREIGN KEY (bucket_id) REFERENCES buckets (id)',
+        'FOREIGN KEY (source_position_id) REFERENCES positions (id)',
+        'FOREIGN KEY (target_position_id) REFERENCES positions (id)',
+    ]),
+    'outbox_events': ('day', [
+        ('ix_outbox_events_id', 'id'),
+        ('ix_outbox_events_created_at', 'created_at'),
+    ], []),
+}
+
+
+def _next_period(start: date, interval: str) -> date:
+    if interval == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _partition(table: str, interval: str, indexes: List[Tuple[str, str]], foreign_keys: List[str]) -> None:
+    """
+    Turn `table` into a table range partitioned on created_at. The existing
+    table becomes the partition of the current period, reaching back to
+    MINVALUE, so no rows are copied. The next period and a default
+    partition are created as well; later ones come from the maintenance job.
+    """
+    today = datetime.now(timezone.utc).date()
+    start = today.replace(day=1) if interval == 'month' else today
+    end = _next_period(start, interval)
+    legacy = f'{table}_p{start:%Y%m%d}'
+
+    op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    op.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey')
+    for name, column in indexes:
+        op.execute(f'ALTER INDEX {name} RENAME TO {legacy}_{column}_idx')
+
+    op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+    # The partition key must be part of the primary key
+    op.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)')
+    for name, column in indexes:
+        op.execute(f'CREATE INDEX {name} ON {table} ({column})')
+    for foreign_key in foreign_keys:
+        op.execute(f'ALTER TABLE {table} ADD {foreign_key}')
+    # The sequence would otherwise go when the legacy partition is archived
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+    op.execute(f"ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{end.isoformat()}')")
+    op.execute(
+        f'CREATE TABLE {table}_p{end:%Y%m%d} PARTITION OF {table} '
+        f"FOR VALUES FROM ('{end.isoformat()}') TO ('{_next_period(end, interval).isoformat()}')"
+    )
+    op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+
+
+def _unpartition(table: str, indexes: List[Tuple[str, str]], foreign_keys: List[str]) -> None:
+    """Copy the rows still attached back into a plain table; archived partitions are not restored"""
+    op.execute(f'CREATE TABLE {table}_plain (LIKE {table} INCLUDING DEFAULTS)')
+    op.execute(f'INSERT INTO {table}_plain SELECT * FROM {table}')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}_plain.id')
+    op.execute(f'DROP TABLE {table}')
+    op.execute(f'ALTER TABLE {table}_plain RENAME TO {table}')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+    for name, column in indexes:
+        op.execute(f'CREATE INDEX {name} ON {table} ({column})')
+    for foreign_key in foreign_keys:
+        op.execute(f'ALTER TABLE {table} ADD {foreign_key}')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('bucket_actions', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table, (interval, indexes, foreign_keys) in TABLES.items():
+        _partition(table, interval, indexes, foreign_keys)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for table, (_, indexes, foreign_keys) in TABLES.items():
+            _unpartition(table, indexes, foreign_keys)
+    op.drop_column('bucket_actions', 'created_at')
@@ -0,0 +1,28 @@
+"""outbox created_at index
+
+Revision ID: c3a81f5b2d90
+Revises: 6f1c2d9e8a47
+Create Date: 2026-10-19 15:41:07.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a81f5b2d90'
+down_revision: Union[str, Sequence[str], None] = '6f1c2d9e8a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_outbox_events_created_at'), 'outbox_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_outbox_events_created_at'), table_name='outbox_events')
@@ -0,0 +1,37 @@
+"""table versions
+
+Revision ID: e7b4d0c91a36
+Revises: c3a81f5b2d90
+Create Date: 2026-10-19 17:12:45.630918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b4d0c91a36'
+down_revision: Union[str, Sequence[str], None] = 'c3a81f5b2d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    table_versions = op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_versions, [
+        {'table_name': 'orders', 'version': 0},
+        {'table_name': 'bucket_actions', 'version': 0},
+        {'table_name': 'positions', 'version': 0},
+    ])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('table_versions')
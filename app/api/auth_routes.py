@@ -3,9 +3,9 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import RedirectResponse
 from starlette.requests import Request
 
-from app.core.auth import keycloak_auth
+from app.core.auth import get_keycloak_auth
 from app.core.dependencies import get_current_user_optional, get_login_redirect
-from app.core.config import settings
+from app.core.config import get_settings
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -39,9 +39,10 @@ async def auth_callback(
             detail="Authorization code not provided"
         )
     
+    settings = get_settings()
     try:
         # Exchange code for tokens
-        token_data = keycloak_auth.exchange_code_for_token(code)
+        token_data = get_keycloak_auth().exchange_code_for_token(code)
 
         access_token = token_data.get("access_token")
         refresh_token = token_data.get("refresh_token")
@@ -94,6 +95,9 @@ async def logout():
     """
     Clear local cookies and redirect to Keycloak logout page.
     """
+    settings = get_settings()
+    keycloak_auth = get_keycloak_auth()
+
     # Prepare redirect to frontend (SPA) after logout
     redirect_url = getattr(settings, "FRONTEND_URL", "http://localhost:4200")
     
@@ -141,7 +145,7 @@ async def get_current_user_info(
         "email": current_user.get("email"),
         "given_name": current_user.get("given_name"),
         "family_name": current_user.get("family_name"),
-        "roles": keycloak_auth.get_user_roles(current_user)
+        "roles": get_keycloak_auth().get_user_roles(current_user)
     }
 
 
@@ -161,5 +165,5 @@ async def protected_route(
     return {
         "message": "This is a protected route",
         "user": current_user.get("preferred_username"),
-        "roles": keycloak_auth.get_user_roles(current_user)
+        "roles": get_keycloak_auth().get_user_roles(current_user)
     }
@@ -0,0 +1,82 @@
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from starlette import status
+
+from app.api.schemas import OrderCreate
+from app.core.orders import OrderRejected
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+ParsedOrders = Tuple[List[Optional[OrderCreate]], List[Optional[OrderRejected]]]
+
+
+def _parse_record(raw, parsed: list, errors: list):
+    try:
+        parsed.append(OrderCreate.model_validate(raw))
+        errors.append(None)
+    except ValidationError as e:
+        parsed.append(None)
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        )
+        errors.append(OrderRejected(422, f"Invalid order: {problems}"))
+
+
+def _parse_line(line: bytes, parsed: list, errors: list):
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        parsed.append(None)
+        errors.append(OrderRejected(400, "Line is not valid JSON"))
+        return
+    _parse_record(raw, parsed, errors)
+
+
+def _check_limit(count: int, max_orders: int):
+    if count > max_orders:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Bulk request exceeds {max_orders} orders"
+        )
+
+
+async def read_bulk_orders(request: Request, max_orders: int) -> ParsedOrders:
+    """
+    Read orders from a JSON array body or a streamed NDJSON body.
+    Returns the parsed orders and, at the same index, the parse error of
+    records that could not be validated.
+    """
+    parsed: List[Optional[OrderCreate]] = []
+    errors: List[Optional[OrderRejected]] = []
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+    if content_type in NDJSON_CONTENT_TYPES:
+        # Parse line by line while the body streams in
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    _parse_line(line, parsed, errors)
+                    _check_limit(len(parsed), max_orders)
+        if buffer.strip():
+            _parse_line(buffer, parsed, errors)
+            _check_limit(len(parsed), max_orders)
+        return parsed, errors
+
+    try:
+        records = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body is not valid JSON")
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of orders")
+    _check_limit(len(records), max_orders)
+    for raw in records:
+        _parse_record(raw, parsed, errors)
+    return parsed, errors
+
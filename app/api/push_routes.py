@@ -0,0 +1,59 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import get_settings
+from app.core.dependencies import require_roles
+from app.core.push import PushMessage, get_push_hub, open_subscription, parse_topics
+
+router = APIRouter(tags=["push"])
+
+
+def _sse_frame(message: PushMessage) -> str:
+    event_id, event_type, data = message
+    frame = f"event: {event_type}\ndata: {data}\n\n"
+    return frame if event_id is None else f"id: {event_id}\n{frame}"
+
+
+@router.get("/events")
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Comma separated: order, bucket_action, bucket, position"),
+    since: Optional[int] = Query(None, ge=0, description="Replay events after this cursor first"),
+    last_event_id: Optional[int] = Header(None),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """
+    Server-sent events for outbox changes. Browsers reconnecting with
+    Last-Event-ID get what they missed. An `overflow` event means the client
+    fell behind; resume from its cursor with GET /changes.
+    """
+    try:
+        topic_set = parse_topics(topics)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    subscriber, backlog = await open_subscription(topic_set, last_event_id if last_event_id is not None else since)
+    heartbeat = get_settings().PUSH_HEARTBEAT_SECONDS
+
+    async def stream():
+        try:
+            for message in backlog:
+                yield _sse_frame(message)
+            while True:
+                message = await subscriber.next(heartbeat)
+                if message is None:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                yield _sse_frame(message)
+        finally:
+            get_push_hub().unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,121 @@
+import json
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.engine import Result
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.auth import get_keycloak_auth
+from app.core.coalesce import get_single_flight
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+from app.db.table_versions import get_table_versions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson, without FastAPI's jsonable_encoder pass"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_response(result: Result) -> FastJSONResponse:
+    """
+    Encode a result of plain column tuples straight to JSON objects keyed by
+    column label. Skips ORM instances and per-row model validation, so the
+    select must already return exactly the fields of the response model.
+    """
+    keys = list(result.keys())
+    return FastJSONResponse([dict(zip(keys, row)) for row in result])
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of `etag` against an If-None-Match header"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def shared_response(request: Request, current_user: dict, build: Callable[[], Response], version: str = "") -> Response:
+    """
+    Identical concurrent requests (same path, query and caller roles) share
+    one `build`, and the result is kept for the path's RESPONSE_CACHE_TTL_MS.
+    `version` joins the key so a data change never serves an older body.
+    """
+    settings = get_settings()
+    if not settings.RESPONSE_COALESCING:
+        return build()
+    path = request.url.path
+    key = (
+        path,
+        tuple(sorted(request.query_params.multi_items())),
+        tuple(sorted(get_keycloak_auth().get_user_roles(current_user))),
+        version,
+    )
+    ttl = settings.RESPONSE_CACHE_TTL_MS.get(path, 0) / 1000
+
+    def render():
+        response = build()
+        return response.status_code, response.body, response.media_type
+
+    status_code, body, media_type = get_single_flight().do(path, key, render, ttl)
+    return Response(body, status_code=status_code, media_type=media_type)
+
+
+def versioned_response(
+    request: Request,
+    db: Session,
+    tables: List[str],
+    build: Callable[[], Response],
+    current_user: Optional[dict] = None,
+) -> Response:
+    """
+    Conditional GET for a read of `tables`. The weak ETag comes from their
+    version counters, read before the query: a write committing in between
+    only makes the body newer than its tag, and the next poll fetches again.
+    A matching If-None-Match gets a 304 before `build` runs. With
+    `current_user`, the build goes through `shared_response`.
+    """
+    versions = get_table_versions(db, tables)
+    if len(versions) != len(tables):
+        # Counter rows not seeded, there is nothing safe to compare against
+        return build() if current_user is None else shared_response(request, current_user, build)
+
+    etag = 'W/"' + "-".join(f"{table}.{versions[table]}" for table in tables) + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        get_metrics().inc("http.not_modified")
+        return Response(status_code=304, headers=headers)
+    response = build() if current_user is None else shared_response(request, current_user, build, etag)
+    response.headers.update(headers)
+    return response
@@ -1,24 +1,60 @@
-from typing import List
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy import text
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, UploadFile, File
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy import select, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from starlette import status
-
-from app.api.schemas import OrderCreate, BucketActionOut, PositionCreate
-from app.db.database import SessionLocal
-from app.db.models import Order, Bucket, Position, BucketAction, model_to_dict
-from app.core.kafka_producer import send_to_kafka
+from starlette.concurrency import run_in_threadpool
+
+from app.api.bulk import read_bulk_orders
+from app.api.responses import FastJSONResponse, rows_response, versioned_response
+from app.api.schemas import (
+    OrderCreate,
+    BucketActionOut,
+    PositionCreate,
+    BulkOrderMode,
+    BulkOrderResult,
+    BulkOrderResponse,
+    PositionOut,
+    PositionDistanceOut,
+    SlotAllocationRequest,
+    SlotAllocationOut,
+    BucketMovesRequest,
+    BucketMovesResponse,
+    ChangesOut,
+    OrderStatus,
+    OrderStatusOut,
+    ProfileFormat,
+    ACTIVE_ORDER_STATUSES,
+)
+from app.db.database import SessionLocal, get_engine, session_scope
+from app.db.models import Order, Position, BucketAction, model_to_dict
+from app.core.changes import get_change_notifier, latest_change_id, read_changes
+from app.core.bucket_moves import BucketMove, apply_bucket_moves
+from app.core.config import get_settings
+from app.core.dispatch import dispatch_orders
+from app.core.order_batcher import submit_order
+from app.core.metrics import get_metrics
+from app.core.log import bind_log_context
+from app.core.idempotency import IdempotentRequest, begin_idempotent_request
+from app.core.orders import OrderRejected, OrderResult, persist_orders
+from app.core.profiler import Profile, ProfilerBusy, get_request_profiles, start_profiler, stop_profiler
+from app.core.slot_allocator import NotEnoughFreeSlots, get_slot_allocator, load_slot_allocator
+from app.core.spatial_index import get_position_index, load_position_index
 from app.core.dependencies import get_current_user, require_roles
-from app.core.kafka_topics import KafkaTopic
-import pandas as pd
-
 from app.db.outbox import add_to_outbox_event
+from app.db.table_versions import mark_changed
 
 router = APIRouter()
 
 
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
@@ -30,105 +66,243 @@ def get_db():
 def create_order(
     order: OrderCreate, 
     db: Session = Depends(get_db),
-    current_user: dict = Depends(require_roles(["operator", "admin", "manager"]))
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager"])),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
-    new_order = Order(
-        priority=order.priority,
-        order_type=order.order_type,
+    idempotent = begin_idempotent_request(db, "order", current_user, idempotency_key, order.model_dump_json())
+    if idempotent is not None:
+        replay = idempotent.replay()
+        if replay is not None:
+            return replay
+
+    def record_response(session: Session, result: OrderResult):
+        idempotent.record(status.HTTP_201_CREATED, _order_response(result), session)
+
+    try:
+        result = submit_order(db, order, on_accepted=record_response if idempotent else None)
+    except IntegrityError:
+        if idempotent is None:
+            raise
+        return idempotent.replay_after_conflict()
+
+    if not result.ok:
+        # A concurrent retry with the same key may hold the claims this
+        # order was refused for; it committed its key together with them
+        replay = idempotent.replay() if idempotent is not None else None
+        if replay is not None:
+            return replay
+        raise HTTPException(
+            status_code=result.error.status_code,
+            detail=result.error.detail
+        )
+    bind_log_context(order_id=result.order_id)
+    if idempotent is not None:
+        idempotent.committed()
+    return _order_response(result)
+
+
+def _order_response(result: OrderResult) -> dict:
+    return {"status": "order received", "order_id": result.order_id}
+
+
+def _persist_bulk_orders(
+    db: Session,
+    orders: List[Optional[OrderCreate]],
+    errors: List[Optional[OrderRejected]],
+    mode: BulkOrderMode,
+    idempotent: Optional[IdempotentRequest],
+) -> BulkOrderResponse:
+    atomic = mode == BulkOrderMode.ATOMIC
+    valid_indexes = [i for i, order in enumerate(orders) if order is not None]
+    results = [BulkOrderResult(index=i, accepted=False) for i in range(len(orders))]
+
+    outcomes = []
+    if not (atomic and any(errors)):
+        outcomes = persist_orders(db, [orders[i] for i in valid_indexes], atomic=atomic)
+        for outcome in outcomes:
+            index = valid_indexes[outcome.index]
+            if outcome.ok:
+                results[index].order_id = outcome.order_id
+                results[index].accepted = outcome.order_id is not None
+            else:
+                errors[index] = outcome.error
+
+    for index, error in enumerate(errors):
+        if error is not None:
+            results[index].status_code = error.status_code
+            results[index].detail = error.detail
+        elif not results[index].accepted:
+            results[index].detail = "Not processed, another order in the batch was rejected"
+
+    accepted = sum(1 for r in results if r.accepted)
+    response = BulkOrderResponse(
+        mode=mode,
+        accepted=accepted,
+        rejected=len(results) - accepted,
+        results=results,
     )
-    db.add(new_order)
-    db.flush()
-
-    kafka_payload = {
-        "order_id": new_order.id,
-        "priority": new_order.priority,
-        "order_type": new_order.order_type,
-        "actions": []
-    }
 
-    for action in order.actions:
-        # loading
-        if order.order_type == "loading":
-            bucket = Bucket()
-            db.add(bucket)
-            db.flush()
-        else:
-            # unloading / place_changing
-            if not action.bucket_id:
-                raise HTTPException(
-                    status_code=422,
-                    detail="Missing bucket_id for non-loading order"
-                )
-            bucket = db.query(Bucket).filter(Bucket.id == action.bucket_id).first()
-            if not bucket:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Bucket {action.bucket_id} not found"
-                )
-
-        source_pos = None
-        if order.order_type in {"loading", "place_changing"}:
-            if not action.source_position_id:
-                raise HTTPException(
-                    status_code=422,
-                    detail="Missing source_position_id for action"
-                )
-            source_pos = db.query(Position).filter(Position.id == action.source_position_id).first()
-            if not source_pos:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Source position {action.source_position_id} not found"
-                )
-
-        target_pos = None
-        if order.order_type in {"unloading", "place_changing"}:
-            if not action.target_position_id:
-                raise HTTPException(
-                    status_code=422,
-                    detail="Missing target_position_id for action"
-                )
-            target_pos = db.query(Position).filter(Position.id == action.target_position_id).first()
-            if not target_pos:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Target position {action.target_position_id} not found"
-                )
-
-        bucket_action = BucketAction(
-            order_id=new_order.id,
-            bucket_id=bucket.id,
-            source_position_id=action.source_position_id,
-            target_position_id=action.target_position_id
+    if accepted:
+        if idempotent is not None:
+            idempotent.record(status.HTTP_201_CREATED, response.model_dump(mode="json"))
+        db.commit()
+        if idempotent is not None:
+            idempotent.committed()
+        dispatch_orders([o.payload for o in outcomes if o.ok and o.order_id])
+    return response
+
+
+@router.post(
+    "/orders/bulk",
+    response_model=BulkOrderResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_orders_bulk(
+    request: Request,
+    mode: BulkOrderMode = Query(BulkOrderMode.PARTIAL),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager"])),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Create many orders in one request.
+    Accepts a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)
+    of orders. In `atomic` mode any rejected order rejects the whole batch,
+    in `partial` mode valid orders are accepted and the rest reported.
+    """
+    orders, errors = await read_bulk_orders(request, get_settings().BULK_ORDER_MAX_ORDERS)
+
+    request_body = json.dumps({
+        "mode": mode.value,
+        "orders": [order.model_dump(mode="json") if order else None for order in orders],
+    })
+    idempotent = begin_idempotent_request(db, "orders_bulk", current_user, idempotency_key, request_body)
+    if idempotent is not None:
+        replay = await run_in_threadpool(idempotent.replay)
+        if replay is not None:
+            return replay
+
+    try:
+        response = await run_in_threadpool(_persist_bulk_orders, db, orders, errors, mode, idempotent)
+    except IntegrityError:
+        if idempotent is None:
+            raise
+        return await run_in_threadpool(idempotent.replay_after_conflict)
+
+    if not response.accepted:
+        return JSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content=response.model_dump(mode="json"),
         )
-        db.add(bucket_action)
-
-        kafka_payload["actions"].append({
-            "bucket_id": bucket.id,
-            "source_position": {
-                "id": source_pos.id,
-                "x": source_pos.position_x,
-                "y": source_pos.position_y,
-                "z": source_pos.position_z,
-            } if source_pos else None,
-            "target_position": {
-                "id": target_pos.id,
-                "x": target_pos.position_x,
-                "y": target_pos.position_y,
-                "z": target_pos.position_z,
-            } if target_pos else None
-        })
+    return response
+
+
+@router.get("/orders/status", response_model=List[OrderStatusOut])
+def get_orders_by_status(
+    request: Request,
+    status_filter: Optional[List[OrderStatus]] = Query(None, alias="status"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """
+    Orders in the given statuses (active ones by default), highest priority
+    first. Served from the (status, priority) index. Supports If-None-Match.
+    """
+    statuses = [s.value for s in (status_filter or ACTIVE_ORDER_STATUSES)]
+    return versioned_response(request, db, ["orders"], current_user=current_user, build=lambda: rows_response(db.execute(
+        select(
+            Order.id,
+            Order.priority,
+            Order.order_type,
+            Order.status,
+            Order.created_at,
+            Order.status_updated_at,
+        )
+        .where(Order.status.in_(statuses))
+        .order_by(Order.priority.desc(), Order.id)
+        .limit(limit)
+    )))
 
-    db.commit()
-    send_to_kafka(KafkaTopic.ORDER, kafka_payload)
-    return {"status": "order received", "order_id": new_order.id}
+
+def _read_changes(since: Optional[int], limit: int):
+    with session_scope() as db:
+        if since is None:
+            return [], latest_change_id(db)
+        return read_changes(db, since, limit, get_settings().CHANGES_GAP_TIMEOUT_SECONDS)
+
+
+@router.get("/changes", response_model=ChangesOut)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="Cursor from the previous response, omit to start from now"),
+    limit: int = Query(100, ge=1, le=1000),
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for new events when there are none"),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """
+    Incremental feed of order, bucket action and position changes from the
+    outbox. Pass the returned cursor as `since` to get only newer events;
+    with `wait` the request is held until an event arrives or time runs out.
+    """
+    notifier = get_change_notifier()
+    deadline = time.monotonic() + wait
+    while True:
+        seen = notifier.latest_id
+        # No DB connection is held while waiting
+        events, cursor = await run_in_threadpool(_read_changes, since, limit)
+        remaining = deadline - time.monotonic()
+        if events or since is None or remaining <= 0:
+            return FastJSONResponse({"events": events, "cursor": cursor})
+        await notifier.wait(seen, remaining)
 
 
 @router.get("/bucket-actions", response_model=List[BucketActionOut])
 def get_all_bucket_actions(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
 ):
-    return db.query(BucketAction).all()
+    """Supports If-None-Match, unchanged data is answered with 304"""
+    return versioned_response(request, db, ["bucket_actions"], current_user=current_user, build=lambda: rows_response(db.execute(
+        select(
+            BucketAction.id,
+            BucketAction.order_id,
+            BucketAction.bucket_id,
+            BucketAction.source_position_id,
+            BucketAction.target_position_id,
+            BucketAction.status,
+        )
+    )))
+
+
+@router.post("/bucket-actions/complete", response_model=BucketMovesResponse)
+def complete_bucket_actions(
+    request: BucketMovesRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager"]))
+):
+    """
+    Record where buckets ended up after their actions completed.
+    Applied in one transaction; each report is accepted or rejected on its own.
+    """
+    if len(request.moves) > get_settings().BUCKET_MOVE_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {get_settings().BUCKET_MOVE_MAX_BATCH} moves per request"
+        )
+    results = apply_bucket_moves(
+        db,
+        [BucketMove(bucket_id=m.bucket_id, position_id=m.position_id) for m in request.moves]
+    )
+    # The slot allocator follows through the buckets_moved event
+    db.commit()
+
+    applied = sum(1 for r in results if r.applied)
+    return {
+        "applied": applied,
+        "rejected": len(results) - applied,
+        "results": [r.__dict__ for r in results],
+    }
 
 
 @router.post("/upload-positions")
@@ -148,6 +322,9 @@ async def upload_positions(
             detail="Only CSV or Excel files are supported"
         )
 
+    # pandas is only needed here, keep it out of worker startup
+    import pandas as pd
+
     try:
         if filename.endswith(".csv"):
             df = pd.read_csv(file.file)
@@ -165,11 +342,22 @@ async def upload_positions(
         df = df.astype(object).where(pd.notnull(df), None)
         records = df.to_dict(orient="records")
         db.bulk_insert_mappings(Position, records)
+        mark_changed(db, "positions")
+        # Other workers reload their position index when they see this event
+        await add_to_outbox_event(
+            db=db,
+            aggregate_type="position",
+            aggregate_id="upload",
+            event_type="positions_uploaded",
+            payload={"count": len(records)}
+        )
         db.commit()
         db.execute(text(
             "SELECT setval('positions_id_seq', (SELECT MAX(id) FROM positions))"
         ))
         db.commit()
+        load_position_index(db)
+        load_slot_allocator(db)
 
         return {"message": f"Inserted {len(records)} rows into database"}
 
@@ -202,6 +390,13 @@ async def create_position(
         )
 
         db.commit()
+        get_position_index().add(
+            new_position.id,
+            new_position.position_x,
+            new_position.position_y,
+            new_position.position_z
+        )
+        get_slot_allocator().add_position(new_position.id)
 
         return {
             "message": "Position inserted successfully",
@@ -213,6 +408,186 @@ async def create_position(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/positions", response_model=List[PositionOut])
+def list_positions(
+    request: Request,
+    after_id: int = Query(0, ge=0, description="Last id of the previous page"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """Positions in id order, paged by keyset. Supports If-None-Match."""
+    return versioned_response(request, db, ["positions"], current_user=current_user, build=lambda: rows_response(db.execute(
+        select(Position.id, Position.position_x, Position.position_y, Position.position_z)
+        .where(Position.id > after_id)
+        .order_by(Position.id)
+        .limit(limit)
+    )))
+
+
+def _position_index_or_503():
+    index = get_position_index()
+    if not index.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Position index is not loaded yet"
+        )
+    return index
+
+
+@router.get("/positions/within", response_model=List[PositionOut])
+def positions_within(
+    min_x: int,
+    min_y: int,
+    min_z: int,
+    max_x: int,
+    max_y: int,
+    max_z: int,
+    limit: Optional[int] = Query(None, ge=1),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """Positions inside the bounding box (inclusive), served from the in-memory index"""
+    index = _position_index_or_503()
+    return [
+        {"id": position_id, "position_x": x, "position_y": y, "position_z": z}
+        for position_id, (x, y, z) in index.within((min_x, min_y, min_z), (max_x, max_y, max_z), limit)
+    ]
+
+
+@router.get("/positions/nearest", response_model=List[PositionDistanceOut])
+def positions_nearest(
+    x: int,
+    y: int,
+    z: int,
+    k: int = Query(1, ge=1, le=1000),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """The k positions closest to (x, y, z), served from the in-memory index"""
+    index = _position_index_or_503()
+    return [
+        {"id": position_id, "position_x": px, "position_y": py, "position_z": pz, "distance": distance}
+        for position_id, (px, py, pz), distance in index.nearest((x, y, z), k)
+    ]
+
+
+def _parse_near(near: Optional[str]):
+    if near is None:
+        return None
+    try:
+        x, y, z = (int(part) for part in near.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=422,
+            detail="near must be given as x,y,z"
+        )
+    return x, y, z
+
+
+def _slot_allocator_or_503():
+    allocator = get_slot_allocator()
+    if not allocator.loaded:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Slot allocator is not loaded yet"
+        )
+    return allocator
+
+
+@router.get("/positions/free", response_model=List[PositionOut])
+def free_positions(
+    near: Optional[str] = Query(None, description="Reference point as x,y,z, closest slots first"),
+    count: int = Query(10, ge=1, le=10000),
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager", "viewer"]))
+):
+    """Positions that hold no bucket and are not reserved"""
+    allocator = _slot_allocator_or_503()
+    index = _position_index_or_503()
+    positions = []
+    for position_id in allocator.free_slots(count, _parse_near(near)):
+        coords = index.coords_of(position_id)
+        if coords is None:
+            # Not in the index yet, both are reloaded after an upload
+            continue
+        x, y, z = coords
+        positions.append({"id": position_id, "position_x": x, "position_y": y, "position_z": z})
+    return positions
+
+
+@router.post("/positions/allocate", response_model=SlotAllocationOut)
+def allocate_positions(
+    request: SlotAllocationRequest,
+    current_user: dict = Depends(require_roles(["operator", "admin", "manager"]))
+):
+    """
+    Reserve `count` free slots at once for a loading/place_changing order.
+    Either all requested slots are reserved or none (409).
+    """
+    allocator = _slot_allocator_or_503()
+    near = None
+    if request.near is not None:
+        _position_index_or_503()
+        near = (request.near.position_x, request.near.position_y, request.near.position_z)
+    try:
+        position_ids = allocator.allocate(request.count, near)
+    except NotEnoughFreeSlots as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"position_ids": position_ids, "expires_in": allocator.reservation_ttl}
+
+
+@router.get("/metrics")
+def get_service_metrics(
+    current_user: dict = Depends(require_roles(["admin"]))
+):
+    """In-process counters, gauges and cache statistics of this worker"""
+    return get_metrics().snapshot()
+
+
+def _profile_response(profile: Profile, profile_format: ProfileFormat, limit: int, idle: bool):
+    if profile_format == ProfileFormat.TOP:
+        return profile.top(limit, idle)
+    return PlainTextResponse(profile.collapsed(idle))
+
+
+@router.get("/admin/profile")
+async def profile_worker(
+    seconds: float = Query(5, gt=0, le=60),
+    interval_ms: Optional[float] = Query(None, ge=1, le=1000, description="Sampling interval, PROFILE_INTERVAL_MS by default"),
+    profile_format: ProfileFormat = Query(ProfileFormat.COLLAPSED, alias="format"),
+    limit: int = Query(50, ge=1, le=1000, description="Functions in the top table"),
+    idle: bool = Query(False, description="Keep samples of threads waiting for work"),
+    current_user: dict = Depends(require_roles(["admin"]))
+):
+    """
+    Sample the stacks of all threads of this worker for `seconds`. Returns
+    collapsed stacks for flamegraph tools, or a table of the functions with
+    the most samples. Nothing is sampled outside these runs.
+    """
+    try:
+        profiler = start_profiler(interval_ms / 1000 if interval_ms else None)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile = stop_profiler(profiler)
+    return _profile_response(profile, profile_format, limit, idle)
+
+
+@router.get("/admin/profile/requests/{profile_id}")
+def get_request_profile(
+    profile_id: str,
+    profile_format: ProfileFormat = Query(ProfileFormat.COLLAPSED, alias="format"),
+    limit: int = Query(50, ge=1, le=1000),
+    idle: bool = Query(False),
+    current_user: dict = Depends(require_roles(["admin"]))
+):
+    """Profile of a request sent with an X-Profile header, by its X-Profile-Id"""
+    profile = get_request_profiles().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profile with this id on this worker")
+    return _profile_response(profile, profile_format, limit, idle)
+
+
 @router.get("/admin-only")
 def admin_only_route(
     current_user: dict = Depends(require_roles(["admin"]))
@@ -1,5 +1,6 @@
+from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
 
@@ -9,6 +10,18 @@ class OrderType(str, Enum):
     PLACE_CHANGING = "place_changing"
 
 
+class OrderStatus(str, Enum):
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+ACTIVE_ORDER_STATUSES = [OrderStatus.PENDING, OrderStatus.IN_PROGRESS]
+TERMINAL_ORDER_STATUSES = [OrderStatus.COMPLETED, OrderStatus.FAILED, OrderStatus.CANCELLED]
+
+
 class BucketActionCreate(BaseModel):
     bucket_id: Optional[int] = None
     source_position_id: Optional[int] = None
@@ -21,6 +34,7 @@ class BucketActionOut(BaseModel):
     bucket_id: int
     source_position_id: Optional[int]
     target_position_id: Optional[int]
+    status: OrderStatus = OrderStatus.PENDING
 
     class Config:
         from_attributes = True
@@ -30,9 +44,105 @@ class OrderCreate(BaseModel):
     priority: int
     order_type: OrderType
     actions: List[BucketActionCreate]
+    # Reorder actions to shorten travel, None follows ORDER_SEQUENCING
+    optimize_sequence: Optional[bool] = None
+
+
+class OrderStatusOut(BaseModel):
+    id: int
+    priority: int
+    order_type: OrderType
+    status: OrderStatus
+    created_at: Optional[datetime] = None
+    status_updated_at: Optional[datetime] = None
+
+
+class ChangeEventOut(BaseModel):
+    id: int
+    event_type: str
+    aggregate_type: str
+    aggregate_id: str
+    payload: dict
+    created_at: datetime
+
+
+class ChangesOut(BaseModel):
+    events: List[ChangeEventOut]
+    cursor: int
 
 
 class PositionCreate(BaseModel):
     position_x: int
     position_y: int
     position_z: int
+
+
+class PositionOut(BaseModel):
+    id: int
+    position_x: int
+    position_y: int
+    position_z: int
+
+
+class PositionDistanceOut(PositionOut):
+    distance: float
+
+
+class SlotAllocationRequest(BaseModel):
+    count: int = Field(..., ge=1, le=10000)
+    near: Optional[PositionCreate] = None
+
+
+class SlotAllocationOut(BaseModel):
+    position_ids: List[int]
+    expires_in: int
+
+
+class BucketMoveReport(BaseModel):
+    bucket_id: int
+    # Where the bucket is now, None once it has left the warehouse
+    position_id: Optional[int] = None
+
+
+class BucketMovesRequest(BaseModel):
+    moves: List[BucketMoveReport]
+
+
+class BucketMoveResultOut(BaseModel):
+    bucket_id: int
+    applied: bool
+    from_position_id: Optional[int] = None
+    position_id: Optional[int] = None
+    status_code: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BucketMovesResponse(BaseModel):
+    applied: int
+    rejected: int
+    results: List[BucketMoveResultOut]
+
+
+class BulkOrderMode(str, Enum):
+    ATOMIC = "atomic"
+    PARTIAL = "partial"
+
+
+class BulkOrderResult(BaseModel):
+    index: int
+    accepted: bool
+    order_id: Optional[int] = None
+    status_code: Optional[int] = None
+    detail: Optional[str] = None
+
+
+class BulkOrderResponse(BaseModel):
+    mode: BulkOrderMode
+    accepted: int
+    rejected: int
+    results: List[BulkOrderResult]
+
+
+class ProfileFormat(str, Enum):
+    COLLAPSED = "collapsed"
+    TOP = "top"
@@ -0,0 +1,267 @@
+import asyncio
+import json
+import logging
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+
+from app.api.schemas import OrderCreate
+from app.core.auth import get_keycloak_auth
+from app.core.config import get_settings
+from app.core.order_batcher import submit_order
+from app.core.push import PushMessage, Subscriber, get_push_hub, open_subscription, parse_topics
+from app.db.database import session_scope
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/ws", tags=["websocket"])
+
+ORDER_ROLES = ["operator", "admin", "manager"]
+PUSH_ROLES = ["operator", "admin", "manager", "viewer"]
+
+
+def _extract_ws_token(websocket: WebSocket) -> Optional[str]:
+    # Same sources as HTTP routes: Authorization header, then cookie,
+    # plus a query parameter for clients that can't set headers
+    authorization = websocket.headers.get("authorization", "")
+    scheme, _, credentials = authorization.partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return websocket.cookies.get("access_token") or websocket.query_params.get("token")
+
+
+def _create_order(order: OrderCreate):
+    with session_scope() as db:
+        return submit_order(db, order)
+
+
+class OrderIngestConnection:
+    """
+    One authenticated producer connection.
+
+    Messages are `{"correlation_id": ..., "order": {OrderCreate}}`. Each order
+    is processed concurrently and acknowledged with its correlation id as soon
+    as it completes, so acks may arrive out of order. At most `max_in_flight`
+    orders are processed at once; beyond that the connection stops reading,
+    which pushes back on the producer through TCP flow control.
+    """
+
+    def __init__(self, websocket: WebSocket, token_payload: dict, max_in_flight: int):
+        self.websocket = websocket
+        self.expires_at = token_payload.get("exp")
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.send_lock = asyncio.Lock()
+        self.tasks = set()
+
+    async def send(self, message: dict):
+        async with self.send_lock:
+            await self.websocket.send_json(message)
+
+    async def receive(self) -> Optional[str]:
+        """The next message, None once the token has expired, even on an idle connection"""
+        if not self.expires_at:
+            return await self.websocket.receive_text()
+        remaining = self.expires_at - time.time()
+        if remaining <= 0:
+            return None
+        try:
+            return await asyncio.wait_for(self.websocket.receive_text(), remaining)
+        except asyncio.TimeoutError:
+            return None
+
+    async def run(self):
+        try:
+            while True:
+                await self.slots.acquire()
+                try:
+                    raw = await self.receive()
+                except Exception:
+                    self.slots.release()
+                    raise
+                if raw is None:
+                    self.slots.release()
+                    await self.websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token has expired")
+                    return
+                task = asyncio.create_task(self.handle(raw))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            # Orders already accepted still get written; their acks are dropped
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    async def handle(self, raw: str):
+        correlation_id = None
+        try:
+            try:
+                message = json.loads(raw)
+                correlation_id = message.get("correlation_id")
+                order = OrderCreate.model_validate(message.get("order"))
+            except (ValueError, AttributeError, ValidationError) as e:
+                await self.send({
+                    "correlation_id": correlation_id,
+                    "status": "rejected",
+                    "status_code": 422,
+                    "detail": f"Invalid message: {e}",
+                })
+                return
+
+            try:
+                result = await run_in_threadpool(_create_order, order)
+            except Exception as e:
+                logger.error(f"WebSocket order {correlation_id} failed: {e}")
+                await self.send({
+                    "correlation_id": correlation_id,
+                    "status": "error",
+                    "status_code": 500,
+                    "detail": "Order could not be processed",
+                })
+                return
+
+            if result.ok:
+                await self.send({
+                    "correlation_id": correlation_id,
+                    "status": "accepted",
+                    "order_id": result.order_id,
+                })
+            else:
+                await self.send({
+                    "correlation_id": correlation_id,
+                    "status": "rejected",
+                    "status_code": result.error.status_code,
+                    "detail": result.error.detail,
+                })
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away before the ack could be delivered
+            pass
+        finally:
+            self.slots.release()
+
+
+async def _authenticate(websocket: WebSocket, roles: List[str]) -> Optional[dict]:
+    """Validate the token once; closes the socket and returns None when it is refused"""
+    token = _extract_ws_token(websocket)
+    if not token:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Authentication required")
+        return None
+
+    keycloak_auth = get_keycloak_auth()
+    try:
+        token_payload = await run_in_threadpool(keycloak_auth.validate_token, token)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return None
+    if not keycloak_auth.has_any_role(token_payload, roles):
+        await websocket.close(
+            code=status.WS_1008_POLICY_VIOLATION,
+            reason=f"Access denied. Required roles: {', '.join(roles)}"
+        )
+        return None
+    return token_payload
+
+
+@router.websocket("/orders")
+async def order_ingest(websocket: WebSocket):
+    """
+    Persistent order ingest channel for automated producers.
+    The token is validated once when the connection is opened.
+    """
+    token_payload = await _authenticate(websocket, ORDER_ROLES)
+    if token_payload is None:
+        return
+
+    await websocket.accept()
+    connection = OrderIngestConnection(
+        websocket,
+        token_payload,
+        max_in_flight=get_settings().WS_ORDER_MAX_IN_FLIGHT,
+    )
+    await connection.run()
+
+
+class EventPushConnection:
+    """
+    One push client. Outbox events for its topics are sent as JSON text;
+    the client may send `{"subscribe": [...]}` or `{"unsubscribe": [...]}`
+    to change its topics. An `overflow` message means it fell behind and
+    should resume from its cursor with GET /changes.
+    """
+
+    def __init__(self, websocket: WebSocket, token_payload: dict, subscriber: Subscriber):
+        self.websocket = websocket
+        self.expires_at = token_payload.get("exp")
+        self.subscriber = subscriber
+
+    async def run(self, backlog: List[PushMessage]):
+        reader = asyncio.create_task(self.read_commands())
+        try:
+            for message in backlog:
+                await self.send(message)
+            heartbeat = get_settings().PUSH_HEARTBEAT_SECONDS
+            while not reader.done():
+                message = await self.subscriber.next(heartbeat)
+                if self.expires_at and time.time() >= self.expires_at:
+                    await self.websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token has expired")
+                    return
+                if message is None:
+                    await self.websocket.send_text('{"event_type":"ping"}')
+                else:
+                    await self.send(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            reader.cancel()
+            get_push_hub().unsubscribe(self.subscriber)
+
+    async def send(self, message: PushMessage):
+        event_id, event_type, data = message
+        if event_id is None:
+            data = json.dumps({"event_type": event_type, **json.loads(data)})
+        await self.websocket.send_text(data)
+
+    async def read_commands(self):
+        hub = get_push_hub()
+        try:
+            while True:
+                try:
+                    command = json.loads(await self.websocket.receive_text())
+                    topics = set(self.subscriber.topics)
+                    if "subscribe" in command:
+                        topics |= parse_topics(",".join(command["subscribe"]))
+                    if "unsubscribe" in command:
+                        topics -= set(command["unsubscribe"])
+                except (ValueError, TypeError, AttributeError) as e:
+                    await self.websocket.send_text(json.dumps({"event_type": "error", "detail": str(e)}))
+                    continue
+                hub.set_topics(self.subscriber, topics)
+                await self.websocket.send_text(json.dumps({"event_type": "subscribed", "topics": sorted(topics)}))
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+
+@router.websocket("/events")
+async def event_push(websocket: WebSocket):
+    """
+    Push channel for outbox changes, the WebSocket twin of GET /events.
+    Query parameters: `topics` (comma separated) and `since` to replay
+    events after a cursor first.
+    """
+    token_payload = await _authenticate(websocket, PUSH_ROLES)
+    if token_payload is None:
+        return
+    try:
+        topics = parse_topics(websocket.query_params.get("topics"))
+        since = websocket.query_params.get("since")
+        since = int(since) if since is not None else None
+    except ValueError as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e))
+        return
+
+    await websocket.accept()
+    subscriber, backlog = await open_subscription(topics, since)
+    await EventPushConnection(websocket, token_payload, subscriber).run(backlog)
@@ -0,0 +1,184 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+
+EXEMPT = "exempt"
+
+
+class AdmissionLimiter:
+    """
+    Concurrency limit for one class of requests, with a bounded FIFO of
+    waiting requests.
+
+    The queue may only hold what the admitted requests can work off within
+    `max_wait`, judged by a moving average of their service time: when the
+    database or Kafka slows down, the queue shrinks and excess requests are
+    refused at once instead of piling up in the threadpool until they all
+    time out. Lives on the event loop, so it needs no locking.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.service_time = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def queue_capacity(self) -> int:
+        if self.service_time <= 0:
+            return self.max_queue
+        return max(0, min(self.max_queue, int(self.limit * self.max_wait / self.service_time)))
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        backlog = (len(self._waiters) / self.limit + 1) * self.service_time
+        return max(1, min(30, math.ceil(backlog)))
+
+    async def acquire(self) -> bool:
+        """Wait for a slot, False if the request must be shed"""
+        metrics = get_metrics()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            metrics.inc(f"admission.{self.name}.admitted")
+            return True
+        if len(self._waiters) >= self.queue_capacity():
+            metrics.inc(f"admission.{self.name}.rejected")
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        metrics.inc(f"admission.{self.name}.queued")
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            self._give_up(future)
+            metrics.inc(f"admission.{self.name}.timed_out")
+            return False
+        except asyncio.CancelledError:
+            self._give_up(future)
+            raise
+        metrics.inc(f"admission.{self.name}.admitted")
+        return True
+
+    def _give_up(self, future: asyncio.Future):
+        """A waiter timed out or was cancelled"""
+        if future.done() and not future.cancelled():
+            # The slot was handed over in the same loop iteration as the
+            # timeout or cancellation, pass it on or it is never released
+            self._hand_over()
+        else:
+            # Drop the entry, so it does not count against queue_capacity
+            try:
+                self._waiters.remove(future)
+            except ValueError:
+                pass
+
+    def release(self, elapsed: float):
+        self.service_time = elapsed if self.service_time <= 0 else 0.9 * self.service_time + 0.1 * elapsed
+        self._hand_over()
+
+    def _hand_over(self):
+        # The slot passes straight to the oldest live waiter, `active` is unchanged
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": len(self._waiters),
+            "queue_capacity": self.queue_capacity(),
+            "service_time_ms": round(self.service_time * 1000, 2),
+        }
+
+
+class AdmissionController:
+    """Maps a request to the limiter of its class, see ADMISSION_ROUTE_CLASSES"""
+
+    def __init__(self):
+        settings = get_settings()
+        self.routes = dict(settings.ADMISSION_ROUTE_CLASSES)
+        limits = dict(settings.ADMISSION_LIMITS)
+        if settings.ORDER_GROUP_COMMIT:
+            # Waiting on the batcher, sized so a full batch can form
+            self.routes.setdefault("/order", "order")
+            limits.setdefault("order", settings.ORDER_GROUP_COMMIT_MAX_BATCH)
+        self.limiters: Dict[str, AdmissionLimiter] = {
+            name: AdmissionLimiter(
+                name,
+                limit,
+                settings.ADMISSION_MAX_QUEUE.get(name, 0),
+                settings.ADMISSION_MAX_WAIT_MS.get(name, 1000) / 1000,
+            )
+            for name, limit in limits.items()
+        }
+
+    def classify(self, method: str, path: str) -> str:
+        # Exact path first, then the longest listed prefix
+        prefix = path
+        while prefix:
+            if prefix in self.routes:
+                return self.routes[prefix]
+            prefix = prefix.rpartition("/")[0]
+        return "read" if method in ("GET", "HEAD") else "write"
+
+    def limiter_for(self, method: str, path: str) -> Optional[AdmissionLimiter]:
+        return self.limiters.get(self.classify(method, path))
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+        get_metrics().register_collector("admission", _controller.stats)
+    return _controller
+
+
+class AdmissionControlMiddleware:
+    """Sheds HTTP requests with 503 and Retry-After when their class is saturated"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not get_settings().ADMISSION_CONTROL:
+            await self.app(scope, receive, send)
+            return
+        limiter = get_admission_controller().limiter_for(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(limiter.retry_after())},
+            )
+            await response(scope, receive, send)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.monotonic() - started)
@@ -8,13 +8,14 @@ from fastapi import HTTPException, status
 from jose import jwt, JWTError, jwk
 from jose.exceptions import ExpiredSignatureError
 
-from app.core.config import settings
+from app.core.config import get_settings
 
 logger = logging.getLogger(__name__)
 
 
 class KeycloakAuth:
     def __init__(self):
+        settings = get_settings()
         self.keycloak_url = settings.KEYCLOAK_URL
         self.keycloak_public_url = settings.KEYCLOAK_PUBLIC_URL or settings.KEYCLOAK_URL
         self.realm = settings.KEYCLOAK_REALM
@@ -224,5 +225,19 @@ class KeycloakAuth:
         return any(role in user_roles for role in required_roles)
 
 
-# Global instance
-keycloak_auth = KeycloakAuth()
+_keycloak_auth: Optional[KeycloakAuth] = None
+
+
+def get_keycloak_auth() -> KeycloakAuth:
+    """Return the shared KeycloakAuth instance, creating it on first use"""
+    global _keycloak_auth
+    if _keycloak_auth is None:
+        _keycloak_auth = KeycloakAuth()
+    return _keycloak_auth
+
+
+def __getattr__(name):
+    # Global instance, built lazily so importing this module stays cheap
+    if name == "keycloak_auth":
+        return get_keycloak_auth()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,29 @@
+import asyncio
+import logging
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+def run_periodically(name: str, interval: float, job: Callable[[], object]) -> asyncio.Task:
+    """
+    Run a blocking `job` in the threadpool every `interval` seconds until the
+    returned task is cancelled. Failures are logged and retried next interval.
+    """
+    async def loop():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run_in_threadpool(job)
+            except Exception as e:
+                logger.warning(f"Background job '{name}' failed: {e}")
+
+    return asyncio.create_task(loop(), name=name)
+
+
+async def cancel_tasks(tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
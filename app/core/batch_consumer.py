@@ -0,0 +1,141 @@
+import logging
+import signal
+from abc import ABC, abstractmethod
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.kafka_topics import KafkaTopic
+from app.core.log import setup_logging, stop_logging
+from app.core.metrics import get_metrics
+from app.core.serialization import deserialize
+from app.db.database import session_scope
+
+logger = logging.getLogger(__name__)
+
+
+def create_kafka_consumer(topic: KafkaTopic, group_id: str, max_poll_records: int):
+    """KafkaConsumer on `topic` with manual offset commits"""
+    from kafka import KafkaConsumer
+
+    return KafkaConsumer(
+        topic.value,
+        bootstrap_servers=get_settings().KAFKA_BOOTSTRAP_SERVERS,
+        group_id=group_id,
+        enable_auto_commit=False,
+        auto_offset_reset="earliest",
+        max_poll_records=max_poll_records,
+        value_deserializer=lambda v: deserialize(topic.value, v),
+    )
+
+
+class BatchConsumer(ABC):
+    """
+    Drains a topic in batches of up to `max_batch` records.
+
+    Each poll is parsed, written in one transaction by `apply`, and offsets
+    are committed only after the database commit, so a crash in between
+    redelivers the batch; `apply` must therefore be idempotent. `consumer`
+    is anything with the kafka-python KafkaConsumer methods used here
+    (poll, commit, assignment, position, end_offsets, committed, seek), so
+    a fake broker can stand in for Kafka.
+    """
+
+    name = "consumer"
+
+    def __init__(self, consumer, max_batch: int, poll_timeout_ms: int = 1000):
+        self.consumer = consumer
+        self.max_batch = max_batch
+        self.poll_timeout_ms = poll_timeout_ms
+        self._running = False
+
+    @abstractmethod
+    def parse(self, message) -> Optional[dict]:
+        """Turn a record into a row for `apply`, None for malformed records"""
+
+    @abstractmethod
+    def apply(self, db: Session, rows: List[dict]) -> Dict[str, int]:
+        """Write one batch without committing, returns counters to record"""
+
+    def run_once(self) -> int:
+        """Process one poll, returns the number of records consumed"""
+        records = self.consumer.poll(timeout_ms=self.poll_timeout_ms, max_records=self.max_batch)
+        messages = [message for batch in records.values() for message in batch]
+        if messages:
+            self._process(messages)
+        self._report_lag()
+        return len(messages)
+
+    def _process(self, messages: list):
+        metrics = get_metrics()
+        rows = []
+        for message in messages:
+            row = self.parse(message)
+            if row is None:
+                logger.warning(f"Skipping malformed {self.name} message at offset {message.offset}")
+                metrics.inc(f"{self.name}.malformed")
+                continue
+            rows.append(row)
+
+        started = time.perf_counter()
+        with session_scope() as db:
+            counters = self.apply(db, rows) if rows else {}
+            db.commit()
+        self.consumer.commit()
+
+        metrics.inc(f"{self.name}.batches")
+        metrics.inc(f"{self.name}.records", len(messages))
+        for counter, value in counters.items():
+            metrics.inc(f"{self.name}.{counter}", value)
+        metrics.set_gauge(f"{self.name}.last_batch_ms", round((time.perf_counter() - started) * 1000, 2))
+
+    def _report_lag(self):
+        partitions = list(self.consumer.assignment())
+        if not partitions:
+            return
+        metrics = get_metrics()
+        end_offsets = self.consumer.end_offsets(partitions)
+        total = 0
+        for tp in partitions:
+            lag = max(end_offsets.get(tp, 0) - self.consumer.position(tp), 0)
+            metrics.set_gauge(f"{self.name}.lag.{tp.topic}.{tp.partition}", lag)
+            total += lag
+        metrics.set_gauge(f"{self.name}.lag", total)
+
+    def run(self):
+        self._running = True
+        while self._running:
+            try:
+                self.run_once()
+            except Exception as e:
+                # Offsets were not committed, the batch is polled again after seeking back
+                logger.warning(f"{self.name} batch failed, retrying: {e}")
+                get_metrics().inc(f"{self.name}.failures")
+                self._rewind()
+                time.sleep(1)
+
+    def _rewind(self):
+        for tp in self.consumer.assignment():
+            committed = self.consumer.committed(tp)
+            if committed is not None:
+                self.consumer.seek(tp, committed)
+            else:
+                self.consumer.seek_to_beginning(tp)
+
+    def stop(self):
+        self._running = False
+
+
+def run_consumer(worker: BatchConsumer):
+    """Run `worker` until SIGTERM or Ctrl-C, then close its Kafka consumer"""
+    setup_logging()
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.consumer.close()
+        stop_logging()
@@ -0,0 +1,164 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import Integer, bindparam, cast, column, select, update, values
+from sqlalchemy.orm import Session
+
+from app.core.orders import load_positions
+from app.core.slot_allocator import get_slot_allocator
+from app.db.models import Bucket, OutboxEvent
+from app.db.outbox import add_outbox_event
+
+
+@dataclass
+class BucketMove:
+    """A completed action: `bucket_id` now sits at `position_id` (None = left the warehouse)"""
+    bucket_id: int
+    position_id: Optional[int]
+
+
+@dataclass
+class MoveResult:
+    bucket_id: int
+    applied: bool = False
+    from_position_id: Optional[int] = None
+    position_id: Optional[int] = None
+    status_code: Optional[int] = None
+    detail: Optional[str] = None
+
+
+def _reject(result: MoveResult, status_code: int, detail: str):
+    result.status_code = status_code
+    result.detail = detail
+
+
+def apply_bucket_moves(db: Session, moves: List[BucketMove]) -> List[MoveResult]:
+    """
+    Apply completed moves to `buckets.position_id` in one pass.
+
+    Reports for the same bucket are coalesced, the last one wins. A move is
+    rejected if its bucket or position doesn't exist, or if the target is
+    held by a bucket that isn't itself moving away in this batch. Buckets
+    that swap or chain positions within the batch are first detached, since
+    the unique constraint on position_id is checked row by row; everything
+    else is a single UPDATE ... FROM (VALUES ...) on Postgres, and an
+    executemany on other databases.
+
+    Does not commit. Returns one result per distinct bucket, in report order.
+    """
+    latest: Dict[int, BucketMove] = {}
+    for move in moves:
+        latest.pop(move.bucket_id, None)
+        latest[move.bucket_id] = move
+    results = {
+        bucket_id: MoveResult(bucket_id=bucket_id, position_id=move.position_id)
+        for bucket_id, move in latest.items()
+    }
+
+    # Lock the moving buckets so concurrent batches for the same buckets serialize
+    current = dict(db.execute(
+        select(Bucket.id, Bucket.position_id)
+        .where(Bucket.id.in_(latest))
+        .with_for_update()
+    ).all())
+    targets = {move.position_id for move in latest.values() if move.position_id is not None}
+    known_positions = load_positions(db, targets)
+
+    claimed: Dict[int, int] = {}
+    for bucket_id, move in latest.items():
+        result = results[bucket_id]
+        if bucket_id not in current:
+            _reject(result, 404, f"Bucket {bucket_id} not found")
+        elif move.position_id is not None and move.position_id not in known_positions:
+            _reject(result, 404, f"Position {move.position_id} not found")
+        elif move.position_id is not None and move.position_id in claimed:
+            _reject(result, 409, f"Position {move.position_id} is already the target of bucket {claimed[move.position_id]}")
+        else:
+            result.from_position_id = current[bucket_id]
+            if move.position_id is not None:
+                claimed[move.position_id] = bucket_id
+
+    # A target may only be taken if its current holder moves away in this batch.
+    # Rejecting a mover keeps it in place, which can block another move, so
+    # repeat until nothing changes.
+    holders: Dict[int, int] = {}
+    if claimed:
+        rows = db.execute(
+            select(Bucket.id, Bucket.position_id)
+            .where(Bucket.position_id.in_(claimed))
+            .with_for_update()
+        ).all()
+        holders = {position_id: bucket_id for bucket_id, position_id in rows}
+    blocked = True
+    while blocked:
+        blocked = False
+        for position_id, mover_id in claimed.items():
+            holder_id = holders.get(position_id)
+            if results[mover_id].status_code is not None or holder_id in (None, mover_id):
+                continue
+            holder = results.get(holder_id)
+            if holder is not None and holder.status_code is None and holder.position_id != position_id:
+                continue
+            _reject(results[mover_id], 409, f"Position {position_id} is occupied by bucket {holder_id}")
+            blocked = True
+
+    accepted = [r for r in results.values() if r.status_code is None]
+    changed = [r for r in accepted if r.from_position_id != r.position_id]
+    if changed:
+        _write_positions(db, changed)
+        add_outbox_event(
+            db=db,
+            aggregate_type="bucket",
+            aggregate_id="batch",
+            event_type="buckets_moved",
+            payload={"moves": [[r.bucket_id, r.from_position_id, r.position_id] for r in changed]},
+        )
+    for result in accepted:
+        result.applied = True
+    return list(results.values())
+
+
+def _write_positions(db: Session, changed: List[MoveResult]):
+    targets = {r.position_id for r in changed if r.position_id is not None}
+    # Buckets leaving a position another bucket moves into (swap or chain) are detached first
+    detach = [r.bucket_id for r in changed if r.from_position_id in targets]
+    if detach:
+        db.execute(
+            update(Bucket).where(Bucket.id.in_(detach)).values(position_id=None),
+            execution_options={"synchronize_session": False},
+        )
+
+    table = Bucket.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        moved = values(column("id", Integer), column("position_id", Integer), name="moved").data(
+            [(r.bucket_id, r.position_id) for r in changed]
+        )
+        # The cast types the column when every target in the batch is NULL
+        db.execute(
+            table.update()
+            .where(table.c.id == moved.c.id)
+            .values(position_id=cast(moved.c.position_id, Integer))
+        )
+        return
+    # SQLite has no column aliases for VALUES, one statement per bucket
+    db.execute(
+        table.update()
+        .where(table.c.id == bindparam("b_id"))
+        .values(position_id=bindparam("b_position_id")),
+        [{"b_id": r.bucket_id, "b_position_id": r.position_id} for r in changed],
+    )
+
+
+def on_buckets_moved(event: OutboxEvent):
+    """
+    The only way moves reach the slot allocator, this worker's own included:
+    the tailer replays batches in commit order, so an older batch can never
+    free a slot a newer one filled.
+    """
+    allocator = get_slot_allocator()
+    moves = event.payload["moves"]
+    # Release every source before occupying any target so swaps and chains net out
+    for _, from_position_id, _ in moves:
+        allocator.move(from_position_id, None)
+    for _, _, to_position_id in moves:
+        allocator.move(None, to_position_id)
@@ -0,0 +1,211 @@
+import json
+import logging
+import select
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+from app.db.database import get_engine
+from app.db.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "ois_cache_invalidation"
+
+
+class ReadThroughCache:
+    """
+    Bounded LRU in front of a batch loader.
+
+    `get_many` answers what it can from memory and loads the rest with one
+    call to the loader. Only rows that exist are cached, so a missing key is
+    always re-checked against the database and creating a row never needs an
+    invalidation; updates and deletes must call `invalidate`.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self._data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_many(self, keys: Iterable[Hashable], loader: Callable[[set], Dict[Hashable, object]]) -> Dict[Hashable, object]:
+        found = {}
+        missing = set()
+        with self._lock:
+            for key in set(keys):
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+                else:
+                    missing.add(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = loader(missing)
+            self.put_many(loaded)
+            found.update(loaded)
+        return found
+
+    def put_many(self, items: Dict[Hashable, object]):
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys: Optional[Iterable[Hashable]] = None):
+        """Drop the given keys, or everything when `keys` is None"""
+        with self._lock:
+            if keys is None:
+                self.invalidations += len(self._data)
+                self._data.clear()
+                return
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_caches: Dict[str, ReadThroughCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str) -> ReadThroughCache:
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = ReadThroughCache(name, get_settings().LOOKUP_CACHE_SIZE)
+            if len(_caches) == 1:
+                get_metrics().register_collector(
+                    "caches", lambda: {n: c.stats() for n, c in list(_caches.items())}
+                )
+        return _caches[name]
+
+
+def get_position_cache() -> ReadThroughCache:
+    return get_cache("positions")
+
+
+def get_bucket_cache() -> ReadThroughCache:
+    return get_cache("buckets")
+
+
+def _apply_invalidation(message: dict):
+    cache = get_cache(message["cache"])
+    cache.invalidate(message.get("keys"))
+
+
+def invalidate(db: Session, cache_name: str, keys: Optional[Iterable[Hashable]] = None):
+    """
+    Invalidate entries here right away, and in other workers once the
+    current transaction commits (NOTIFY is delivered at commit).
+    """
+    keys = list(keys) if keys is not None else None
+    get_cache(cache_name).invalidate(keys)
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": INVALIDATION_CHANNEL, "payload": json.dumps({"cache": cache_name, "keys": keys})},
+        )
+
+
+def on_position_created(event: OutboxEvent):
+    get_position_cache().invalidate([event.payload["id"]])
+
+
+def on_position_updated(event: OutboxEvent):
+    get_position_cache().invalidate([event.payload["id"]])
+
+
+def on_positions_uploaded(event: OutboxEvent):
+    get_position_cache().invalidate()
+
+
+class InvalidationListener:
+    """
+    LISTENs on the invalidation channel with a dedicated connection and
+    applies invalidations published by other workers. On a lost connection
+    every cache is cleared, since notifications may have been missed.
+    """
+
+    def __init__(self, poll_timeout: float = 1.0):
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if get_engine().dialect.name != "postgresql":
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_timeout * 2)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener lost its connection: {e}")
+                for cache in list(_caches.values()):
+                    cache.invalidate()
+                self._stop.wait(self.poll_timeout)
+
+    def _listen(self):
+        raw = get_engine().raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+            while not self._stop.is_set():
+                if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        _apply_invalidation(json.loads(notify.payload))
+                    except (ValueError, KeyError) as e:
+                        logger.warning(f"Ignoring malformed cache invalidation: {e}")
+        finally:
+            raw.invalidate()
+
+
+_listener: Optional[InvalidationListener] = None
+
+
+def get_invalidation_listener() -> InvalidationListener:
+    global _listener
+    if _listener is None:
+        _listener = InvalidationListener()
+    return _listener
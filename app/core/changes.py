@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db.models import OutboxEvent
+
+
+def _age_seconds(created_at: datetime, now: datetime) -> float:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (now - created_at).total_seconds()
+
+
+def read_changes(db: Session, since: int, limit: int, gap_timeout: float) -> Tuple[List[dict], int]:
+    """
+    Outbox events after `since` in id order, and the cursor to continue from.
+
+    Ids are assigned at insert but become visible at commit, so a missing id
+    may still appear. The page stops before such a gap until the event after
+    it is `gap_timeout` seconds old, after which the missing id is assumed
+    to be a rolled back insert; a client never skips an event that commits late.
+    """
+    rows = db.execute(
+        select(
+            OutboxEvent.id,
+            OutboxEvent.event_type,
+            OutboxEvent.aggregate_type,
+            OutboxEvent.aggregate_id,
+            OutboxEvent.payload,
+            OutboxEvent.created_at,
+        )
+        .where(OutboxEvent.id > since)
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+    ).all()
+
+    now = datetime.now(timezone.utc)
+    events = []
+    cursor = since
+    for row in rows:
+        if row.id != cursor + 1 and _age_seconds(row.created_at, now) < gap_timeout:
+            break
+        events.append(row._asdict())
+        cursor = row.id
+    return events, cursor
+
+
+def latest_change_id(db: Session) -> int:
+    return db.execute(select(func.coalesce(func.max(OutboxEvent.id), 0))).scalar_one()
+
+
+class ChangeNotifier:
+    """
+    Wakes long-polling requests when this worker's outbox tailer sees new
+    events, so waiting clients cost nothing until there is something to read.
+    """
+
+    def __init__(self):
+        self.latest_id = 0
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
+        self._lock = threading.Lock()
+
+    def on_event(self, event: OutboxEvent):
+        with self._lock:
+            self.latest_id = max(self.latest_id, event.id)
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    async def wait(self, after_id: int, timeout: float) -> bool:
+        """
+        Wait for the next event, returning at once if one newer than
+        `after_id` was already seen. False on timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            if self.latest_id > after_id:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+_notifier: Optional[ChangeNotifier] = None
+
+
+def get_change_notifier() -> ChangeNotifier:
+    global _notifier
+    if _notifier is None:
+        _notifier = ChangeNotifier()
+    return _notifier
+
+
+def on_outbox_event(event: OutboxEvent):
+    get_change_notifier().on_event(event)
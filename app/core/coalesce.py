@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Runs a computation once for concurrent callers with the same key.
+
+    The first caller computes, callers arriving meanwhile block on its
+    result (or its exception). With a `ttl`, the finished result is also
+    served to later callers until it expires. Meant for sync handlers,
+    which run in the threadpool and may block.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._cache: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"computed": 0, "coalesced": 0, "cached": 0})
+
+    def do(self, name: str, key: Hashable, compute: Callable[[], T], ttl: float = 0.0) -> T:
+        """`name` groups the counters, e.g. the route path"""
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                expires_at, value = cached
+                if expires_at > time.monotonic():
+                    self._counts[name]["cached"] += 1
+                    get_metrics().inc("coalesce.cached")
+                    return value
+                del self._cache[key]
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+            self._counts[name]["computed" if leader else "coalesced"] += 1
+
+        if not leader:
+            get_metrics().inc("coalesce.coalesced")
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            if ttl > 0:
+                self._cache[key] = (time.monotonic() + ttl, value)
+                while len(self._cache) > self.capacity:
+                    self._cache.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "cached_entries": len(self._cache),
+                "by_route": {name: dict(counts) for name, counts in self._counts.items()},
+            }
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        _single_flight = SingleFlight(get_settings().RESPONSE_CACHE_MAX_ENTRIES)
+        get_metrics().register_collector("coalescing", _single_flight.stats)
+    return _single_flight
@@ -1,5 +1,9 @@
+from functools import lru_cache
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
+
 class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
@@ -28,6 +32,182 @@ class Settings(BaseSettings):
     
     # JWT settings
     JWT_ALGORITHM: str = "RS256"
+
+    # Database pool settings
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+
+    # Startup warm-up: open DB connections, fetch JWKS keys and connect the
+    # Kafka producer before the worker starts accepting requests
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_DB_CONNECTIONS: int = 5
+
+    # Group commit for POST /order: concurrent orders are collected for up to
+    # the window (or max batch) and written in one transaction
+    ORDER_GROUP_COMMIT: bool = False
+    ORDER_GROUP_COMMIT_WINDOW_MS: float = 3.0
+    ORDER_GROUP_COMMIT_MAX_BATCH: int = 100
+
+    # Upper bound on orders accepted by POST /orders/bulk in one request
+    BULK_ORDER_MAX_ORDERS: int = 10000
+
+    # Orders a single /ws/orders connection may have in flight before it stops reading
+    WS_ORDER_MAX_IN_FLIGHT: int = 32
+
+    # Idempotency-Key support: stored responses expire after the TTL and are
+    # purged in batches; the most recent keys are also kept in memory
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS: int = 300
+    IDEMPOTENCY_CLEANUP_BATCH_SIZE: int = 1000
+
+    # Range partitioned tables (Postgres) and their partition size, "day" or
+    # "month". The maintenance job keeps PARTITION_PREMAKE periods created
+    # ahead and archives partitions older than the retention to gzipped CSV.
+    PARTITIONED_TABLES: Dict[str, str] = {"bucket_actions": "month", "outbox_events": "day"}
+    # Outbox events are dropped by age alone: they are consumed in-process by
+    # each worker's tailer and by GET /changes clients, nothing relays them
+    # or marks them SENT, so the retention is how far back a client can resume.
+    PARTITION_RETENTION_DAYS: Dict[str, int] = {"bucket_actions": 365, "outbox_events": 14}
+    PARTITION_PREMAKE: int = 3
+    PARTITION_ARCHIVE_DIR: str = "archive"
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+
+    # How often each worker polls outbox_events to refresh in-memory state
+    OUTBOX_POLL_INTERVAL_SECONDS: float = 1.0
+
+    # Slots handed out by POST /positions/allocate stay reserved this long
+    # unless a bucket is placed there first
+    SLOT_RESERVATION_TTL_SECONDS: int = 300
+
+    # Entries per in-process lookup cache (positions, bucket existence)
+    LOOKUP_CACHE_SIZE: int = 100000
+
+    # Upper bound on completion reports in one POST /bucket-actions/complete
+    BUCKET_MOVE_MAX_BATCH: int = 5000
+
+    # Position topic consumer (python -m app.core.position_consumer)
+    POSITION_CONSUMER_GROUP: str = "ois-position-consumer"
+    POSITION_CONSUMER_MAX_BATCH: int = 2000
+
+    # Order status topic consumer (python -m app.core.order_status)
+    ORDER_STATUS_CONSUMER_GROUP: str = "ois-order-status-consumer"
+    ORDER_STATUS_CONSUMER_MAX_BATCH: int = 5000
+
+    # Priority lanes for order dispatch. Orders at or above URGENT/NORMAL
+    # priority go to those tiers, the rest to bulk. A waiting tier gets one
+    # batch ahead of higher ones once its oldest message is older than its
+    # max wait, then the highest tier is served again.
+    ORDER_URGENT_MIN_PRIORITY: int = 8
+    ORDER_NORMAL_MIN_PRIORITY: int = 4
+    ORDER_NORMAL_MAX_WAIT_MS: float = 200.0
+    ORDER_BULK_MAX_WAIT_MS: float = 1000.0
+    ORDER_DISPATCH_BATCH_SIZE: int = 500
+    # Publish each tier to its own topic (order.urgent, order.normal, order.bulk)
+    # instead of the shared order topic. Off by default, so the tiers only
+    # order publishing: on the shared topic and partition, an urgent order
+    # still lands behind bulk messages already published and not yet consumed.
+    # Turn it on once consumers subscribe to the lane topics.
+    ORDER_PRIORITY_TOPICS: bool = False
+
+    # Refuse orders that move a bucket or fill a position an unfinished
+    # order already claims (409). Claims end when the order status consumer
+    # sees the order completed, failed or cancelled, when the order cannot
+    # be published, or when the cleanup job finds the order's status
+    # unchanged for ORDER_CLAIM_TTL_SECONDS.
+    ORDER_RESERVATIONS: bool = True
+    ORDER_CLAIM_TTL_SECONDS: int = 3600
+    ORDER_CLAIM_CLEANUP_INTERVAL_SECONDS: int = 300
+    ORDER_CLAIM_CLEANUP_BATCH_SIZE: int = 1000
+
+    # Reorder the actions of an order to shorten the travel between them
+    # (orders can opt in or out with optimize_sequence). The time budget
+    # is shared by all orders of one insert batch.
+    ORDER_SEQUENCING: bool = False
+    SEQUENCING_TIME_BUDGET_MS: float = 20.0
+    SEQUENCING_MAX_ACTIONS: int = 500
+
+    # Payload field used as the Kafka message key per topic. Messages with
+    # the same key land on the same partition and stay in order.
+    KAFKA_MESSAGE_KEYS: Dict[str, str] = {
+        "order": "order_id",
+        "bucket_action": "bucket_id",
+        "position": "id",
+        "order_status": "order_id",
+    }
+    # Also publish one message per bucket action, keyed by bucket
+    KAFKA_PUBLISH_BUCKET_ACTIONS: bool = False
+
+    # Message encoding ("json" or "msgpack") and compression codec ("gzip",
+    # "snappy", "lz4", "zstd" or "none"), with per-topic overrides. Codecs
+    # other than gzip need their python library installed.
+    KAFKA_SERIALIZER: str = "json"
+    KAFKA_TOPIC_SERIALIZERS: Dict[str, str] = {}
+    KAFKA_COMPRESSION: str = "gzip"
+    KAFKA_TOPIC_COMPRESSION: Dict[str, str] = {}
+
+    # GET /changes holds a page back at a missing outbox id until the next
+    # event is this old, in case the missing one is still being committed
+    CHANGES_GAP_TIMEOUT_SECONDS: float = 5.0
+
+    # Push channels (GET /events, /ws/events)
+    PUSH_CLIENT_QUEUE_SIZE: int = 256
+    PUSH_HEARTBEAT_SECONDS: float = 15.0
+    PUSH_BACKFILL_LIMIT: int = 1000
+
+    # Hot read endpoints: identical concurrent requests share one query.
+    # Finished responses are also kept for this many ms per route path;
+    # they are keyed by table version, so a write is visible at once.
+    RESPONSE_COALESCING: bool = True
+    RESPONSE_CACHE_TTL_MS: Dict[str, int] = {
+        "/bucket-actions": 1000,
+        "/orders/status": 1000,
+        "/positions": 1000,
+    }
+    RESPONSE_CACHE_MAX_ENTRIES: int = 128
+
+    # Admission control: concurrent requests per class, the most that may
+    # wait for a slot (shrunk automatically as latency grows) and how long.
+    # Keep the sum of these limits under the threadpool size (40), so one
+    # class can't take the threads another one needs. With group commit,
+    # POST /order has an "order" class of its own: its handlers mostly wait
+    # on the batcher, so its limit is ORDER_GROUP_COMMIT_MAX_BATCH (a full
+    # batch can form) and the threadpool grows by as much at startup.
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_LIMITS: Dict[str, int] = {"critical": 4, "read": 16, "write": 12, "bulk": 2}
+    ADMISSION_MAX_QUEUE: Dict[str, int] = {"critical": 32, "read": 64, "write": 64, "bulk": 4, "order": 200}
+    ADMISSION_MAX_WAIT_MS: Dict[str, int] = {
+        "critical": 5000, "read": 1000, "write": 2000, "bulk": 10000, "order": 2000,
+    }
+    # Class per path or path prefix; other GETs are "read", other methods
+    # "write". "exempt" routes are never limited (probes, long-lived streams).
+    ADMISSION_ROUTE_CLASSES: Dict[str, str] = {
+        "/auth": "critical",
+        "/metrics": "critical",
+        "/admin-only": "critical",
+        "/orders/bulk": "bulk",
+        "/upload-positions": "bulk",
+        "/health": "exempt",
+        "/admin/profile": "exempt",
+        "/events": "exempt",
+        "/changes": "exempt",
+    }
+
+    # Logging goes through a bounded queue written out by one thread; when
+    # it is full, records are dropped rather than blocking a request.
+    # Per-request and per-message lines ("Request finished", Kafka
+    # deliveries) are logged at INFO for this share of requests/messages.
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_RATE: float = 0.01
+
+    # Sampling profiler (GET /admin/profile). With PROFILE_REQUESTS, an admin
+    # request carrying an X-Profile header is profiled on its own; the last
+    # PROFILE_KEEP_REQUESTS of those profiles are kept.
+    PROFILE_INTERVAL_MS: float = 10.0
+    PROFILE_REQUESTS: bool = True
+    PROFILE_KEEP_REQUESTS: int = 20
     
     @property
     def JWT_ISSUER(self) -> str:
@@ -37,4 +217,15 @@ class Settings(BaseSettings):
     class Config:
         env_file = ".env"
 
-settings = Settings()
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+def __getattr__(name):
+    # Keep `from app.core.config import settings` working while deferring
+    # reading the environment until the settings are first used
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
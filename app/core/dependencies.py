@@ -3,7 +3,7 @@ from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.responses import RedirectResponse
 
-from app.core.auth import keycloak_auth
+from app.core.auth import get_keycloak_auth
 
 # Security scheme for Bearer token
 security = HTTPBearer(auto_error=False)
@@ -29,7 +29,7 @@ async def get_current_user(
     token = _extract_token(request, credentials)
     if not token:
         # If no token provided, redirect to Keycloak login
-        login_url = keycloak_auth.get_login_url()
+        login_url = get_keycloak_auth().get_login_url()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required",
@@ -38,7 +38,7 @@ async def get_current_user(
     
     try:
         # Validate the token
-        token_payload = keycloak_auth.validate_token(token)
+        token_payload = get_keycloak_auth().validate_token(token)
         return token_payload
     except HTTPException:
         # Re-raise HTTP exceptions from token validation
@@ -64,7 +64,7 @@ async def get_current_user_optional(
         return None
     
     try:
-        token_payload = keycloak_auth.validate_token(token)
+        token_payload = get_keycloak_auth().validate_token(token)
         return token_payload
     except Exception:
         return None
@@ -76,7 +76,7 @@ def require_roles(required_roles: List[str]):
     Returns a dependency that checks if the current user has any of the required roles.
     """
     async def role_checker(current_user: dict = Depends(get_current_user)) -> dict:
-        if not keycloak_auth.has_any_role(current_user, required_roles):
+        if not get_keycloak_auth().has_any_role(current_user, required_roles):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Access denied. Required roles: {', '.join(required_roles)}"
@@ -115,7 +115,7 @@ def get_login_redirect():
     Useful for login endpoints.
     """
     def redirect_to_login():
-        login_url = keycloak_auth.get_login_url()
+        login_url = get_keycloak_auth().get_login_url()
         return RedirectResponse(url=login_url, status_code=status.HTTP_302_FOUND)
     
     return redirect_to_login
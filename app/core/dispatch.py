@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core import kafka_producer
+from app.core.config import get_settings
+from app.core.kafka_topics import KafkaTopic
+from app.core.metrics import get_metrics
+from app.core.orders import action_messages
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 1000
+
+
+@dataclass
+class Tier:
+    name: str
+    min_priority: Optional[int]
+    # None: never overtaken, this tier is always served first
+    max_wait_ms: Optional[float]
+
+
+@dataclass
+class _Pending:
+    enqueued_at: float
+    topic_name: str
+    payload: dict
+    key: Optional[object]
+    future: Future
+
+
+class PriorityDispatcher:
+    """
+    Publishes order messages to Kafka from one thread, highest tier first.
+
+    Callers enqueue payloads and wait on futures. The dispatcher takes up
+    to `batch_size` messages from the highest non-empty tier, sends them
+    with one flush and resolves their futures, so an urgent order waits
+    for at most one batch ahead of it. A lower tier whose oldest message
+    has waited longer than its `max_wait_ms` gets one batch ahead of the
+    highest tier, which bounds starvation during a flood of urgent orders.
+    The next batch always goes to the highest tier again, so a large
+    overdue backlog is drained alternately with it rather than in one go:
+    an urgent message waits for at most two batches. Several overdue tiers
+    take turns, so each is served within 2 * (tiers - 1) batches.
+    """
+
+    def __init__(self, tiers: List[Tier], batch_size: int):
+        self.tiers = tiers
+        self.batch_size = batch_size
+        self._queues: Dict[str, Deque[_Pending]] = {tier.name: deque() for tier in tiers}
+        self._latencies: Dict[str, Deque[float]] = {tier.name: deque(maxlen=LATENCY_WINDOW) for tier in tiers}
+        self._sent: Dict[str, int] = {tier.name: 0 for tier in tiers}
+        self._overtakes: Dict[str, int] = {tier.name: 0 for tier in tiers}
+        # Whether the last batch overtook the highest waiting tier
+        self._overtook = False
+        # Position in `tiers` of the tier that overtook last
+        self._last_overtaker = -1
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def tier_for(self, priority: int) -> Tier:
+        for tier in self.tiers:
+            if tier.min_priority is None or priority >= tier.min_priority:
+                return tier
+        return self.tiers[-1]
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="order-dispatcher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, tier: Tier, topic_name: str, payload: dict, key: Optional[object] = None) -> Future:
+        self.start()
+        future: Future = Future()
+        with self._cond:
+            self._queues[tier.name].append(_Pending(time.monotonic(), topic_name, payload, key, future))
+            self._cond.notify()
+        return future
+
+    def _next_tier(self, now: float) -> Optional[Tier]:
+        first = None
+        overdue: List[int] = []
+        for position, tier in enumerate(self.tiers):
+            queue = self._queues[tier.name]
+            if not queue:
+                continue
+            if first is None:
+                first = tier
+            elif tier.max_wait_ms is not None and (now - queue[0].enqueued_at) * 1000 >= tier.max_wait_ms:
+                overdue.append(position)
+        if overdue and not self._overtook:
+            # Overdue tiers take turns, so none of them starves behind another
+            position = next((p for p in overdue if p > self._last_overtaker), overdue[0])
+            tier = self.tiers[position]
+            self._last_overtaker = position
+            self._overtakes[tier.name] += 1
+            self._overtook = True
+            return tier
+        self._overtook = False
+        return first
+
+    def _take(self) -> Tuple[Optional[Tier], List[_Pending]]:
+        with self._cond:
+            while True:
+                tier = self._next_tier(time.monotonic())
+                if tier is not None:
+                    queue = self._queues[tier.name]
+                    return tier, [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+                if self._stopping:
+                    return None, []
+                self._cond.wait()
+
+    def _run(self):
+        while True:
+            tier, batch = self._take()
+            if tier is None:
+                break
+            self._send(tier, batch)
+
+    def _send(self, tier: Tier, batch: List[_Pending]):
+        by_topic: Dict[str, List[_Pending]] = {}
+        for item in batch:
+            by_topic.setdefault(item.topic_name, []).append(item)
+        for topic_name, items in by_topic.items():
+            try:
+                kafka_producer.send_many_to_topic(
+                    topic_name,
+                    [item.payload for item in items],
+                    [item.key for item in items],
+                )
+            except Exception as e:
+                logger.warning(f"Dispatch of {len(items)} {tier.name} messages to {topic_name} failed: {e}")
+                get_metrics().inc(f"dispatch.{tier.name}.failed", len(items))
+                for item in items:
+                    item.future.set_exception(e)
+                continue
+            done = time.monotonic()
+            with self._cond:
+                self._sent[tier.name] += len(items)
+                self._latencies[tier.name].extend((done - item.enqueued_at) * 1000 for item in items)
+            for item in items:
+                item.future.set_result(None)
+
+    def stats(self) -> dict:
+        with self._cond:
+            report = {}
+            for tier in self.tiers:
+                latencies = sorted(self._latencies[tier.name])
+                report[tier.name] = {
+                    "queued": len(self._queues[tier.name]),
+                    "sent": self._sent[tier.name],
+                    "overtakes": self._overtakes[tier.name],
+                    "latency_p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+                    "latency_p99_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+                    "latency_max_ms": round(latencies[-1], 2) if latencies else None,
+                }
+            return report
+
+
+_dispatcher: Optional[PriorityDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> PriorityDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            settings = get_settings()
+            _dispatcher = PriorityDispatcher(
+                tiers=[
+                    Tier("urgent", settings.ORDER_URGENT_MIN_PRIORITY, None),
+                    Tier("normal", settings.ORDER_NORMAL_MIN_PRIORITY, settings.ORDER_NORMAL_MAX_WAIT_MS),
+                    Tier("bulk", None, settings.ORDER_BULK_MAX_WAIT_MS),
+                ],
+                batch_size=settings.ORDER_DISPATCH_BATCH_SIZE,
+            )
+            get_metrics().register_collector("dispatch", _dispatcher.stats)
+        return _dispatcher
+
+
+def close_dispatcher():
+    """Send everything still queued, then stop the dispatcher thread"""
+    global _dispatcher
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.stop()
+
+
+def order_topic_name(tier: Tier) -> str:
+    if get_settings().ORDER_PRIORITY_TOPICS:
+        return f"{KafkaTopic.ORDER.value}.{tier.name}"
+    return KafkaTopic.ORDER.value
+
+
+def dispatch_orders(payloads: List[dict], timeout: float = 30):
+    """
+    Publish order payloads through their priority lanes, raises if any
+    delivery failed. With KAFKA_PUBLISH_BUCKET_ACTIONS each action is also
+    sent to the bucket action topic, keyed by bucket so moves of one bucket
+    stay in order within a lane.
+    """
+    dispatcher = get_dispatcher()
+    publish_actions = get_settings().KAFKA_PUBLISH_BUCKET_ACTIONS
+    futures = []
+    for payload in payloads:
+        tier = dispatcher.tier_for(payload["priority"])
+        key = kafka_producer.message_key(KafkaTopic.ORDER, payload)
+        futures.append(dispatcher.submit(tier, order_topic_name(tier), payload, key))
+        if publish_actions:
+            for message in action_messages(payload):
+                key = kafka_producer.message_key(KafkaTopic.BUCKET_ACTION, message)
+                futures.append(dispatcher.submit(tier, KafkaTopic.BUCKET_ACTION.value, message, key))
+    for future in futures:
+        future.result(timeout)
@@ -0,0 +1,206 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.db.models import IdempotencyKey
+
+MAX_KEY_LENGTH = 200
+
+
+@dataclass
+class StoredResponse:
+    request_hash: str
+    status_code: int
+    body: dict
+    expires_at: datetime
+
+
+def request_fingerprint(body: str) -> str:
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+def scoped_key(scope: str, current_user: dict, key: str) -> str:
+    """Namespace a client key by route and user so clients can't collide"""
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+        )
+    return f"{scope}:{current_user.get('sub', '')}:{key}"
+
+
+class IdempotencyStore:
+    """
+    Stored responses for idempotent POSTs.
+
+    The `idempotency_keys` table is the source of truth; the key row is
+    inserted in the same transaction as the work it guards, so a concurrent
+    retry fails on the primary key instead of creating a duplicate. An
+    in-process LRU in front of it answers repeated retries without a query.
+    """
+
+    def __init__(self, capacity: int, ttl_seconds: int):
+        self.capacity = capacity
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_get(self, key: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._cache.get(key)
+            if stored is None:
+                return None
+            if stored.expires_at <= datetime.now(timezone.utc):
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return stored
+
+    def _cache_put(self, key: str, stored: StoredResponse):
+        with self._lock:
+            self._cache[key] = stored
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.capacity:
+                self._cache.popitem(last=False)
+
+    def lookup(self, db: Session, key: str, request_hash: str) -> Optional[StoredResponse]:
+        """Return the stored response for `key`, or None if the request is new"""
+        stored = self._cache_get(key)
+        if stored is None:
+            row = db.execute(
+                select(IdempotencyKey).where(IdempotencyKey.key == key)
+            ).scalar_one_or_none()
+            if row is None or _as_utc(row.expires_at) <= datetime.now(timezone.utc):
+                return None
+            stored = StoredResponse(row.request_hash, row.status_code, row.response, _as_utc(row.expires_at))
+            self._cache_put(key, stored)
+
+        if stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        return stored
+
+    def save(self, db: Session, key: str, request_hash: str, status_code: int, body: dict) -> StoredResponse:
+        """Add the key row to the caller's transaction; call `remember` once it commits"""
+        stored = StoredResponse(request_hash, status_code, body, datetime.now(timezone.utc) + self.ttl)
+        db.add(IdempotencyKey(
+            key=key,
+            request_hash=request_hash,
+            status_code=status_code,
+            response=body,
+            expires_at=stored.expires_at,
+        ))
+        return stored
+
+    def remember(self, key: str, stored: StoredResponse):
+        self._cache_put(key, stored)
+
+    def purge_expired(self, db: Session, batch_size: int) -> int:
+        """Delete expired keys in batches of `batch_size`, committing each batch"""
+        total = 0
+        while True:
+            expired = (
+                select(IdempotencyKey.key)
+                .where(IdempotencyKey.expires_at < datetime.now(timezone.utc))
+                .limit(batch_size)
+            )
+            deleted = db.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.key.in_(expired)),
+                execution_options={"synchronize_session": False},
+            ).rowcount
+            db.commit()
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+_store: Optional[IdempotencyStore] = None
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        settings = get_settings()
+        _store = IdempotencyStore(
+            capacity=settings.IDEMPOTENCY_CACHE_SIZE,
+            ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+        )
+    return _store
+
+
+class IdempotentRequest:
+    """Idempotency handling for one request carrying an Idempotency-Key header"""
+
+    def __init__(self, store: IdempotencyStore, db: Session, key: str, request_hash: str):
+        self.store = store
+        self.db = db
+        self.key = key
+        self.request_hash = request_hash
+        self._pending: Optional[StoredResponse] = None
+
+    def replay(self) -> Optional[JSONResponse]:
+        """The stored response if this key was already processed"""
+        stored = self.store.lookup(self.db, self.key, self.request_hash)
+        if stored is None:
+            return None
+        return JSONResponse(
+            status_code=stored.status_code,
+            content=stored.body,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    def record(self, status_code: int, body: dict, db: Optional[Session] = None):
+        """
+        Add the response to the transaction doing the work, the request's
+        session unless `db` is given, before it is committed
+        """
+        self._pending = self.store.save(db or self.db, self.key, self.request_hash, status_code, body)
+
+    def committed(self):
+        if self._pending is not None:
+            self.store.remember(self.key, self._pending)
+            self._pending = None
+
+    def replay_after_conflict(self) -> JSONResponse:
+        """A concurrent request with the same key committed first, return its response"""
+        self.db.rollback()
+        self._pending = None
+        replay = self.replay()
+        if replay is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is already being processed"
+            )
+        return replay
+
+
+def begin_idempotent_request(
+    db: Session,
+    scope: str,
+    current_user: dict,
+    idempotency_key: Optional[str],
+    request_body: str,
+) -> Optional[IdempotentRequest]:
+    if idempotency_key is None:
+        return None
+    return IdempotentRequest(
+        get_idempotency_store(),
+        db,
+        scoped_key(scope, current_user, idempotency_key),
+        request_fingerprint(request_body),
+    )
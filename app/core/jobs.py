@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import get_settings
+from app.core.idempotency import get_idempotency_store
+from app.core.outbox_listener import get_outbox_tailer
+from app.core import bucket_moves, cache, changes, push, reservations, slot_allocator, spatial_index
+from app.db.database import session_scope
+
+
+def purge_idempotency_keys():
+    with session_scope() as db:
+        get_idempotency_store().purge_expired(db, get_settings().IDEMPOTENCY_CLEANUP_BATCH_SIZE)
+
+
+def expire_order_claims():
+    settings = get_settings()
+    updated_before = datetime.now(timezone.utc) - timedelta(seconds=settings.ORDER_CLAIM_TTL_SECONDS)
+    with session_scope() as db:
+        reservations.release_expired_claims(db, updated_before, settings.ORDER_CLAIM_CLEANUP_BATCH_SIZE)
+        db.commit()
+
+
+def setup_outbox_subscriptions():
+    tailer = get_outbox_tailer()
+    tailer.subscribe("position_created", spatial_index.on_position_created)
+    tailer.subscribe("position_updated", spatial_index.on_position_updated)
+    tailer.subscribe("positions_uploaded", spatial_index.on_positions_uploaded)
+    tailer.subscribe("position_created", slot_allocator.on_position_created)
+    tailer.subscribe("positions_uploaded", slot_allocator.on_positions_uploaded)
+    tailer.subscribe("buckets_moved", bucket_moves.on_buckets_moved)
+    tailer.subscribe("order_created", reservations.on_order_created)
+    tailer.subscribe("order_status_changed", reservations.on_order_status_changed)
+    tailer.subscribe("order_claims_released", reservations.on_order_claims_released)
+    tailer.subscribe("position_created", cache.on_position_created)
+    tailer.subscribe("position_updated", cache.on_position_updated)
+    tailer.subscribe("positions_uploaded", cache.on_positions_uploaded)
+    tailer.subscribe("*", changes.on_outbox_event)
+    tailer.subscribe("*", push.on_outbox_event)
+
+
+def load_in_memory_state():
+    """Position the outbox cursor, then load the in-memory indexes"""
+    with session_scope() as db:
+        # Cursor first: anything written during the load is replayed, never lost
+        get_outbox_tailer().start_from_latest(db)
+        spatial_index.load_position_index(db)
+        slot_allocator.load_slot_allocator(db)
+        reservations.load_reservation_index(db)
+
+
+def tail_outbox():
+    with session_scope() as db:
+        if not spatial_index.get_position_index().loaded:
+            spatial_index.load_position_index(db)
+        if not slot_allocator.get_slot_allocator().loaded:
+            slot_allocator.load_slot_allocator(db)
+        if not reservations.get_reservation_index().loaded:
+            reservations.load_reservation_index(db)
+        get_outbox_tailer().poll(db)
@@ -1,27 +1,111 @@
-import json
-from kafka import KafkaProducer
-from app.core.config import settings
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import get_settings
 from app.core.kafka_topics import KafkaTopic
-_producer = None
+from app.core.log import log_sampled
+from app.core.serialization import serialize, topic_setting
+
+logger = logging.getLogger(__name__)
+
+# One producer per compression codec, since kafka-python compresses per producer
+_producers: Dict[str, Any] = {}
 
-def get_producer() -> KafkaProducer:
-    global _producer
-    if _producer is None:
-        _producer = KafkaProducer(
+
+def get_producer(compression: Optional[str] = None):
+    settings = get_settings()
+    compression = compression or settings.KAFKA_COMPRESSION
+    if compression not in _producers:
+        # kafka-python is slow to import, load it only when the producer is needed
+        from kafka import KafkaProducer
+
+        _producers[compression] = KafkaProducer(
             bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
             acks="all",
             retries=8,
             linger_ms=20,
-            compression_type="gzip",
-            value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+            compression_type=None if compression == "none" else compression,
+            key_serializer=lambda k: None if k is None else str(k).encode("utf-8"),
         )
-    return _producer
+    return _producers[compression]
+
+
+def producer_for(topic_name: str):
+    settings = get_settings()
+    return get_producer(topic_setting(settings.KAFKA_TOPIC_COMPRESSION, topic_name, settings.KAFKA_COMPRESSION))
+
+
+_key_extractors: Dict[KafkaTopic, Callable[[dict], Any]] = {}
+
+
+def set_key_extractor(topic: KafkaTopic, extractor: Callable[[dict], Any]):
+    """Override how message keys are taken from payloads on `topic`"""
+    _key_extractors[topic] = extractor
+
 
+def message_key(topic: KafkaTopic, payload: dict) -> Optional[Any]:
+    """
+    Partition key for a payload: the registered extractor, else the field
+    configured in KAFKA_MESSAGE_KEYS. None sends the message unkeyed.
+    """
+    extractor = _key_extractors.get(topic)
+    if extractor is not None:
+        return extractor(payload)
+    field = get_settings().KAFKA_MESSAGE_KEYS.get(topic.value)
+    return payload.get(field) if field else None
+
+
+def warm_up_producer():
+    """Connect the producers and fetch metadata for all known topics"""
+    for topic in KafkaTopic:
+        producer_for(topic.value).partitions_for(topic.value)
+
+
+def close_producer():
+    while _producers:
+        _, producer = _producers.popitem()
+        producer.flush()
+        producer.close()
 
 
 def send_to_kafka(topic: KafkaTopic, data: dict):
-    producer = get_producer()
-    future = producer.send(topic=topic.value, value=data)
+    producer = producer_for(topic.value)
+    future = producer.send(
+        topic=topic.value,
+        value=serialize(topic.value, data),
+        key=message_key(topic, data),
+    )
     result = future.get(timeout=10)
-    print(f"Sent to Kafka: {result}")
+    _log_delivery(topic.value, data, result)
     producer.flush()
+
+
+def send_many_to_kafka(topic: KafkaTopic, items: List[dict]):
+    """Send a batch of messages with a single flush, raises if any delivery failed"""
+    send_many_to_topic(topic.value, items, [message_key(topic, data) for data in items])
+
+
+def send_many_to_topic(topic_name: str, items: List[dict], keys: Optional[List[Any]] = None):
+    """`send_many_to_kafka` for topics derived from a KafkaTopic, such as priority lanes"""
+    producer = producer_for(topic_name)
+    keys = keys or [None] * len(items)
+    futures = [
+        producer.send(topic=topic_name, value=serialize(topic_name, data), key=key)
+        for data, key in zip(items, keys)
+    ]
+    producer.flush()
+    results = [future.get(timeout=10) for future in futures]
+    for data, result in zip(items, results):
+        _log_delivery(topic_name, data, result)
+
+
+def _log_delivery(topic_name: str, data: dict, result):
+    """Sampled record per delivered message, written off this thread by the log queue"""
+    log_sampled(
+        logger,
+        "Sent to Kafka",
+        topic=topic_name,
+        partition=result.partition,
+        offset=result.offset,
+        order_id=data.get("order_id"),
+    )
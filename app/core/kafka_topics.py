@@ -3,3 +3,5 @@ from enum import Enum
 class KafkaTopic(Enum):
     ORDER = "order"
     POSITION = "position"
+    ORDER_STATUS = "order_status"
+    BUCKET_ACTION = "bucket_action"
@@ -0,0 +1,183 @@
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Fields attached to every record logged while handling a request. The dict
+# is shared with the threadpool, so a route binding an order id makes it
+# visible to the middleware's own log lines too.
+_log_context: ContextVar[Optional[dict]] = ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def bind_log_context(**fields):
+    """Add fields such as order_id to the current request's log records"""
+    context = _log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def current_request_id() -> Optional[str]:
+    context = _log_context.get()
+    return None if context is None else context.get("request_id")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, context and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def log_sampled(log: logging.Logger, message: str, **fields):
+    """
+    Log a line written for every request or message at INFO, for a
+    LOG_SAMPLE_RATE share of the calls; the rest are only counted.
+    """
+    if random.random() < get_settings().LOG_SAMPLE_RATE:
+        log.info(message, extra=fields)
+    else:
+        get_metrics().inc("logging.sampled_out")
+
+
+class _EnqueueHandler(QueueHandler):
+    """
+    Runs on the logging thread: stamps the request context on the record
+    and hands it to the queue without waiting. Formatting and writing
+    happen on the listener's thread.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        if context:
+            for key, value in context.items():
+                record.__dict__.setdefault(key, value)
+        return super().handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The record stays in this process, so only the message arguments
+        # are resolved now, while the objects they refer to are unchanged
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            get_metrics().inc("logging.dropped")
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging():
+    """
+    Route all logging through a bounded queue drained by one background
+    thread, so request threads never block on stdout. Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    settings = get_settings()
+    output = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_EnqueueHandler(log_queue))
+    root.setLevel(settings.LOG_LEVEL)
+    # uvicorn writes its own logs synchronously unless they propagate here
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    get_metrics().register_collector("logging", lambda: {"queued": log_queue.qsize()})
+
+
+def stop_logging():
+    """Write out what is still queued and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestContextMiddleware:
+    """
+    Gives each HTTP request an id, taken from X-Request-ID or generated,
+    that is stamped on its log records and echoed in the response.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = _log_context.set({"request_id": request_id})
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            log_sampled(
+                logger,
+                "Request finished",
+                method=scope["method"],
+                path=scope["path"],
+                status=status_code,
+                duration_ms=round((time.perf_counter() - started) * 1000, 2),
+            )
+            _log_context.reset(token)
@@ -0,0 +1,49 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional
+
+
+class Metrics:
+    """
+    Process-wide counters and gauges, plus collectors that report the
+    state of components (caches, consumers) when a snapshot is taken.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = defaultdict(int)
+        self._gauges: Dict[str, float] = {}
+        self._collectors: Dict[str, Callable[[], dict]] = {}
+
+    def inc(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def register_collector(self, name: str, collector: Callable[[], dict]):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            collectors = dict(self._collectors)
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            **{name: collect() for name, collect in collectors.items()},
+        }
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
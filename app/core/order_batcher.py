@@ -0,0 +1,202 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.api.schemas import OrderCreate
+from app.core.config import get_settings
+from app.core.dispatch import dispatch_orders
+from app.core.orders import OrderResult, persist_orders
+from app.core.reservations import release_claims
+from app.db.database import session_scope
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# Adds rows for an accepted order to the session the order is written in
+AcceptedCallback = Callable[[Session, OrderResult], None]
+
+
+class OrderBatcher:
+    """
+    Group commit for concurrent order submissions.
+
+    Request threads hand their validated order to `submit` and block on a
+    future. A single writer thread collects orders for up to `window_ms`
+    (or `max_batch` orders), inserts them in one transaction with batched
+    statements, publishes the Kafka messages through the priority
+    dispatcher, and then resolves every future with that order's own result.
+    An order's `on_accepted` callback adds its rows (the idempotency key)
+    to the same transaction, so they commit or fail together with the order.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="order-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join(timeout)
+                self._thread = None
+
+    def submit(self, order: OrderCreate, on_accepted: Optional[AcceptedCallback] = None, timeout: float = 30) -> OrderResult:
+        self.start()
+        future: Future = Future()
+        self._queue.put((order, on_accepted, future))
+        return future.result(timeout)
+
+    def _collect(self, first) -> Tuple[List[tuple], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, stopping = self._collect(item)
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.exception("Order batch failed")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _process(self, batch: List[tuple]):
+        orders = [(order, on_accepted) for order, on_accepted, _ in batch]
+        try:
+            results = self._write(orders)
+        except Exception:
+            # One bad order must not fail its neighbours, fall back to
+            # a transaction per order to isolate the failure
+            logger.warning(f"Group commit of {len(orders)} orders failed, retrying one by one")
+            results = []
+            for index, order in enumerate(orders):
+                try:
+                    result = self._write([order])[0]
+                except Exception as e:
+                    batch[index][2].set_exception(e)
+                    result = None
+                results.append(result)
+
+        accepted = [r for r in results if r is not None and r.ok]
+        publish_error = None
+        if accepted:
+            try:
+                dispatch_orders([r.payload for r in accepted])
+            except Exception as e:
+                publish_error = e
+                release_unpublished([r.order_id for r in accepted])
+
+        for (_, _, future), result in zip(batch, results):
+            if result is None:
+                continue
+            if result.ok and publish_error is not None:
+                future.set_exception(publish_error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _write(orders: List[Tuple[OrderCreate, Optional[AcceptedCallback]]]) -> List[OrderResult]:
+        with session_scope() as db:
+            results = persist_orders(db, [order for order, _ in orders])
+            for (_, on_accepted), result in zip(orders, results):
+                if result.ok and on_accepted is not None:
+                    on_accepted(db, result)
+            db.commit()
+            return results
+
+
+def release_unpublished(order_ids: List[int]):
+    """
+    Free the claims of committed orders whose Kafka publish failed: no
+    status update will ever finish them.
+    """
+    if not get_settings().ORDER_RESERVATIONS:
+        return
+    try:
+        with session_scope() as db:
+            release_claims(db, order_ids, "unpublished")
+            db.commit()
+    except Exception:
+        # The cleanup job releases them once they expire
+        logger.exception(f"Could not release the claims of unpublished orders {order_ids}")
+
+
+_batcher: Optional[OrderBatcher] = None
+
+
+def get_order_batcher() -> OrderBatcher:
+    global _batcher
+    if _batcher is None:
+        settings = get_settings()
+        _batcher = OrderBatcher(
+            window_ms=settings.ORDER_GROUP_COMMIT_WINDOW_MS,
+            max_batch=settings.ORDER_GROUP_COMMIT_MAX_BATCH,
+        )
+    return _batcher
+
+
+def close_order_batcher():
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+        _batcher = None
+
+
+def submit_order(
+    db: Session,
+    order: OrderCreate,
+    on_accepted: Optional[AcceptedCallback] = None,
+) -> OrderResult:
+    """
+    Create one order, through the group commit batcher when it is enabled.
+    `on_accepted` may add rows for an accepted order to the session it gets,
+    the one the order is written in; they are committed with the order, and
+    an IntegrityError on them rolls the order back before it is published.
+    """
+    if get_settings().ORDER_GROUP_COMMIT:
+        # Hand the connection back to the pool while this thread waits
+        db.rollback()
+        return get_order_batcher().submit(order, on_accepted)
+    result = persist_orders(db, [order])[0]
+    if result.ok:
+        if on_accepted is not None:
+            on_accepted(db, result)
+        db.commit()
+        try:
+            dispatch_orders([result.payload])
+        except Exception:
+            release_unpublished([result.order_id])
+            raise
+    return result
@@ -0,0 +1,172 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import Boolean, and_, bindparam, insert, or_, select
+from sqlalchemy.orm import Session
+
+from app.api.schemas import OrderStatus, TERMINAL_ORDER_STATUSES
+from app.core.batch_consumer import BatchConsumer, create_kafka_consumer, run_consumer
+from app.core.config import get_settings
+from app.core.kafka_topics import KafkaTopic
+from app.core.reservations import release_orders
+from app.db.models import BucketAction, Order, OutboxEvent
+
+TERMINAL = [s.value for s in TERMINAL_ORDER_STATUSES]
+
+
+def _timestamp(value, record_timestamp_ms: Optional[int]) -> datetime:
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    if record_timestamp_ms:
+        return datetime.fromtimestamp(record_timestamp_ms / 1000, tz=timezone.utc)
+    return datetime.now(timezone.utc)
+
+
+def parse_status_message(value, record_timestamp_ms: Optional[int] = None) -> Optional[dict]:
+    """
+    {"order_id": 1, "status": "completed", "bucket_action_id": 7, "timestamp": ...}
+    bucket_action_id is optional; timestamp is ISO 8601 or epoch millis and
+    defaults to the Kafka record time.
+    """
+    if not isinstance(value, dict):
+        return None
+    try:
+        row = {
+            "order_id": int(value["order_id"]),
+            "status": OrderStatus(value["status"]).value,
+            "bucket_action_id": int(value["bucket_action_id"]) if value.get("bucket_action_id") is not None else None,
+            "at": _timestamp(value.get("timestamp"), record_timestamp_ms),
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+    return row
+
+
+def _update_statuses(db: Session, model, updates: Dict[int, dict]):
+    """
+    One executemany UPDATE for the batch. Rows in a terminal state and rows
+    that already hold a newer update are left alone, so a redelivered or
+    reordered message cannot move an order backwards. A terminal status is
+    applied even if its timestamp is older, it must never be lost.
+    """
+    if not updates:
+        return
+    table = model.__table__
+    db.execute(
+        table.update()
+        .where(and_(
+            table.c.id == bindparam("u_id"),
+            # Plain comparisons, expanding IN parameters can't be used with executemany
+            *[table.c.status != status for status in TERMINAL],
+            or_(
+                table.c.status_updated_at.is_(None),
+                table.c.status_updated_at <= bindparam("u_at"),
+                bindparam("u_terminal", type_=Boolean),
+            ),
+        ))
+        .values(status=bindparam("u_status"), status_updated_at=bindparam("u_at")),
+        [
+            {"u_id": key, "u_status": row["status"], "u_at": row["at"], "u_terminal": row["status"] in TERMINAL}
+            for key, row in updates.items()
+        ],
+    )
+
+
+def _record_changes(db: Session, model, aggregate_type: str, updates: Dict[int, dict]) -> Dict[int, str]:
+    """
+    Outbox events for the updates that were applied, for GET /changes and
+    push subscribers. Returns the applied statuses by id.
+    """
+    if not updates:
+        return {}
+    current = db.execute(
+        select(model.id, model.status, model.status_updated_at).where(model.id.in_(list(updates)))
+    ).all()
+    events = []
+    applied = {}
+    for row_id, status, updated_at in current:
+        row = updates[row_id]
+        if status != row["status"] or updated_at is None or _utc(updated_at) != row["at"]:
+            continue
+        applied[row_id] = status
+        payload = {"id": row_id, "status": status, "at": row["at"].isoformat()}
+        if aggregate_type == "bucket_action":
+            payload["order_id"] = row["order_id"]
+        events.append({
+            "aggregate_type": aggregate_type,
+            "aggregate_id": str(row_id),
+            "event_type": f"{aggregate_type}_status_changed",
+            "payload": payload,
+        })
+    if events:
+        db.execute(insert(OutboxEvent), events)
+    return applied
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _supersedes(row: dict, kept: Optional[dict]) -> bool:
+    """Terminal statuses win over any other, then the newest `at`; ties go to the later message"""
+    if kept is None:
+        return True
+    return (row["status"] in TERMINAL, row["at"]) >= (kept["status"] in TERMINAL, kept["at"])
+
+
+def apply_status_updates(db: Session, rows: List[dict]) -> Dict[str, int]:
+    """
+    Coalesce a batch so only the latest state per order (and per bucket
+    action) is written, then apply it. Does not commit.
+    """
+    orders: Dict[int, dict] = {}
+    actions: Dict[int, dict] = {}
+    for row in rows:
+        if row["bucket_action_id"] is None:
+            updates, key = orders, row["order_id"]
+        else:
+            updates, key = actions, row["bucket_action_id"]
+        if _supersedes(row, updates.get(key)):
+            updates[key] = row
+
+    _update_statuses(db, Order, orders)
+    _update_statuses(db, BucketAction, actions)
+    applied = _record_changes(db, Order, "order", orders)
+    _record_changes(db, BucketAction, "bucket_action", actions)
+    finished = [order_id for order_id, status in applied.items() if status in TERMINAL]
+    release_orders(db, finished)
+    return {
+        "coalesced": len(rows) - len(orders) - len(actions),
+        "orders_updated": len(orders),
+        "actions_updated": len(actions),
+        "orders_finished": len(finished),
+    }
+
+
+class OrderStatusConsumer(BatchConsumer):
+    """Applies execution feedback from KafkaTopic.ORDER_STATUS to orders and bucket actions"""
+
+    name = "order_status_consumer"
+
+    def parse(self, message) -> Optional[dict]:
+        return parse_status_message(message.value, getattr(message, "timestamp", None))
+
+    def apply(self, db: Session, rows: List[dict]) -> Dict[str, int]:
+        return apply_status_updates(db, rows)
+
+
+def main():
+    settings = get_settings()
+    consumer = create_kafka_consumer(
+        KafkaTopic.ORDER_STATUS,
+        settings.ORDER_STATUS_CONSUMER_GROUP,
+        settings.ORDER_STATUS_CONSUMER_MAX_BATCH,
+    )
+    run_consumer(OrderStatusConsumer(consumer, max_batch=settings.ORDER_STATUS_CONSUMER_MAX_BATCH))
+
+
+if __name__ == "__main__":
+    main()
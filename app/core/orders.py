@@ -0,0 +1,383 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.api.schemas import BucketActionCreate, OrderCreate, OrderType
+from app.core.cache import get_bucket_cache, get_position_cache
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+from app.core.reservations import (
+    Claim,
+    assign_claims,
+    delete_claims,
+    describe,
+    get_reservation_index,
+    insert_claims,
+)
+from app.core.sequencing import SequencePlan, can_reorder, plan_sequence
+from app.db.models import Order, Bucket, Position, BucketAction, OutboxEvent
+
+# Orders whose actions move an existing bucket (a new bucket is created for loading)
+EXISTING_BUCKET_TYPES = {OrderType.UNLOADING, OrderType.PLACE_CHANGING}
+SOURCE_POSITION_TYPES = {OrderType.LOADING, OrderType.PLACE_CHANGING}
+TARGET_POSITION_TYPES = {OrderType.UNLOADING, OrderType.PLACE_CHANGING}
+
+
+# An order's actions in execution order, and the plan that reordered them
+Sequenced = Tuple[List[BucketActionCreate], Optional[SequencePlan]]
+
+
+class OrderRejected(Exception):
+    """An order failed validation; carries the HTTP status and detail to report"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class OrderResult:
+    """Outcome of one order in a batch, `index` is its position in the input"""
+    index: int
+    order_id: Optional[int] = None
+    payload: Optional[dict] = None
+    error: Optional[OrderRejected] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def load_existing_buckets(db: Session, bucket_ids: Iterable[int]) -> Set[int]:
+    """Ids among `bucket_ids` that exist, answered from the bucket cache where possible"""
+    ids = set(bucket_ids)
+    if not ids:
+        return set()
+
+    def load(missing: set) -> Dict[int, bool]:
+        rows = db.execute(select(Bucket.id).where(Bucket.id.in_(missing))).scalars()
+        return {bucket_id: True for bucket_id in rows}
+
+    return set(get_bucket_cache().get_many(ids, load))
+
+
+def load_positions(db: Session, position_ids: Iterable[int]) -> Dict[int, Tuple[int, int, int]]:
+    """Coordinates of the existing positions among `position_ids`, read through the position cache"""
+    ids = set(position_ids)
+    if not ids:
+        return {}
+
+    def load(missing: set) -> Dict[int, Tuple[int, int, int]]:
+        rows = db.execute(
+            select(Position.id, Position.position_x, Position.position_y, Position.position_z)
+            .where(Position.id.in_(missing))
+        )
+        return {row.id: (row.position_x, row.position_y, row.position_z) for row in rows}
+
+    return get_position_cache().get_many(ids, load)
+
+
+def _position_payload(position_id: int, coords: Tuple[int, int, int]) -> dict:
+    x, y, z = coords
+    return {"id": position_id, "x": x, "y": y, "z": z}
+
+
+def _validate_order(
+    order: OrderCreate,
+    buckets: Set[int],
+    positions: Dict[int, Tuple[int, int, int]],
+):
+    """Check one order against the prefetched buckets/positions, same checks and order as a single create"""
+    for action in order.actions:
+        if order.order_type in EXISTING_BUCKET_TYPES:
+            if not action.bucket_id:
+                raise OrderRejected(422, "Missing bucket_id for non-loading order")
+            if action.bucket_id not in buckets:
+                raise OrderRejected(404, f"Bucket {action.bucket_id} not found")
+
+        if order.order_type in SOURCE_POSITION_TYPES:
+            if not action.source_position_id:
+                raise OrderRejected(422, "Missing source_position_id for action")
+            if action.source_position_id not in positions:
+                raise OrderRejected(404, f"Source position {action.source_position_id} not found")
+
+        if order.order_type in TARGET_POSITION_TYPES:
+            if not action.target_position_id:
+                raise OrderRejected(422, "Missing target_position_id for action")
+            if action.target_position_id not in positions:
+                raise OrderRejected(404, f"Target position {action.target_position_id} not found")
+
+
+def prefetch_references(
+    db: Session,
+    orders: List[OrderCreate],
+) -> Tuple[Set[int], Dict[int, Tuple[int, int, int]]]:
+    """Load every bucket and position referenced by the orders with one query each"""
+    bucket_ids = set()
+    position_ids = set()
+    for order in orders:
+        for action in order.actions:
+            if action.bucket_id and order.order_type in EXISTING_BUCKET_TYPES:
+                bucket_ids.add(action.bucket_id)
+            if action.source_position_id:
+                position_ids.add(action.source_position_id)
+            if action.target_position_id:
+                position_ids.add(action.target_position_id)
+    return load_existing_buckets(db, bucket_ids), load_positions(db, position_ids)
+
+
+def validate_orders(
+    orders: List[OrderCreate],
+    buckets: Set[int],
+    positions: Dict[int, Tuple[int, int, int]],
+) -> List[OrderResult]:
+    """Returns one result per order, rejected orders have `error` set"""
+    results = []
+    for index, order in enumerate(orders):
+        result = OrderResult(index=index)
+        try:
+            _validate_order(order, buckets, positions)
+        except OrderRejected as e:
+            result.error = e
+        results.append(result)
+    return results
+
+
+def _order_claims(order: OrderCreate) -> List[Claim]:
+    """The buckets an order moves and the positions it fills, each once"""
+    claims = {}
+    for action in order.actions:
+        if order.order_type in EXISTING_BUCKET_TYPES and action.bucket_id:
+            claims[("bucket", action.bucket_id)] = None
+        if order.order_type in TARGET_POSITION_TYPES and action.target_position_id:
+            claims[("position", action.target_position_id)] = None
+    return list(claims)
+
+
+def claim_references(db: Session, orders: List[OrderCreate], results: List[OrderResult]) -> Dict[int, List[Claim]]:
+    """
+    Claim the buckets and target positions of the orders still accepted,
+    rejecting with 409 those that conflict with an unfinished order or with
+    another order of the batch. Returns the claims by result index.
+
+    Conflicts known to this worker's reservation index are refused with
+    lookups alone; the reservations table's primary key catches claims
+    another worker took meanwhile.
+    """
+    index = get_reservation_index()
+    taken: Dict[Claim, int] = {}
+    claimed: Dict[int, List[Claim]] = {}
+    for result in results:
+        if not result.ok:
+            continue
+        claims = _order_claims(orders[result.index])
+        for claim in claims:
+            holder = index.holder(claim)
+            if holder is not None:
+                result.error = OrderRejected(409, f"{describe(claim)} is claimed by unfinished order {holder}")
+            elif claim in taken:
+                result.error = OrderRejected(409, f"{describe(claim)} is claimed by an order submitted at the same time")
+            if not result.ok:
+                break
+        if result.ok:
+            taken.update((claim, result.index) for claim in claims)
+            claimed[result.index] = claims
+
+    won = insert_claims(db, list(taken))
+    lost = {result_index for claim, result_index in taken.items() if claim not in won}
+    if lost:
+        get_metrics().inc("reservations.races", len(lost))
+        released = []
+        for result in results:
+            if result.index in lost:
+                claims = claimed.pop(result.index)
+                claim = next(claim for claim in claims if claim not in won)
+                result.error = OrderRejected(409, f"{describe(claim)} is claimed by another unfinished order")
+                released.extend(claim for claim in claims if claim in won)
+        if released:
+            delete_claims(db, released)
+    return claimed
+
+
+def persist_orders(db: Session, orders: List[OrderCreate], atomic: bool = False) -> List[OrderResult]:
+    """
+    Validate, claim and insert orders, buckets and bucket actions with
+    batched statements. Rejected orders are skipped, or nothing is inserted
+    if `atomic` is set. Does not commit, the caller owns the transaction
+    and publishes the payloads of accepted orders after committing.
+    """
+    buckets, positions = prefetch_references(db, orders)
+    results = validate_orders(orders, buckets, positions)
+    if atomic and not all(r.ok for r in results):
+        return results
+    # Planned before the first write, while the transaction holds no locks
+    sequences = _sequence_orders(orders, results, positions)
+    claims = claim_references(db, orders, results) if get_settings().ORDER_RESERVATIONS else {}
+    if atomic and not all(r.ok for r in results):
+        return results
+    results = _insert_orders(db, orders, results, positions, sequences)
+    if claims:
+        assign_claims(db, {r.order_id: claims[r.index] for r in results if r.ok and r.index in claims})
+    return results
+
+
+def _sequence_actions(
+    order: OrderCreate,
+    positions: Dict[int, Tuple[int, int, int]],
+    deadline: float,
+) -> Sequenced:
+    """
+    The order's actions in execution order. When sequencing is on for the
+    order and its actions are independent, they are reordered to shorten
+    the travel between them, otherwise they keep the client's order.
+    """
+    settings = get_settings()
+    actions = order.actions
+    enabled = settings.ORDER_SEQUENCING if order.optimize_sequence is None else order.optimize_sequence
+    if not enabled or not 2 <= len(actions) <= settings.SEQUENCING_MAX_ACTIONS:
+        return actions, None
+    if time.perf_counter() >= deadline:
+        # The batch's budget went to earlier orders
+        get_metrics().inc("sequencing.skipped")
+        return actions, None
+
+    steps = []
+    legs = []
+    for action in actions:
+        source_id = action.source_position_id if order.order_type in SOURCE_POSITION_TYPES else None
+        target_id = action.target_position_id if order.order_type in TARGET_POSITION_TYPES else None
+        bucket_id = action.bucket_id if order.order_type in EXISTING_BUCKET_TYPES else None
+        steps.append((bucket_id, source_id, target_id))
+        start = positions[source_id or target_id]
+        legs.append((start, positions[target_id] if target_id else start))
+    if not can_reorder(steps):
+        return actions, None
+
+    plan = plan_sequence(legs, deadline)
+    metrics = get_metrics()
+    metrics.inc("sequencing.orders")
+    metrics.inc("sequencing.distance_saved", round(plan.distance_saved))
+    return [actions[i] for i in plan.order], plan
+
+
+def _sequence_orders(
+    orders: List[OrderCreate],
+    results: List[OrderResult],
+    positions: Dict[int, Tuple[int, int, int]],
+) -> Dict[int, Sequenced]:
+    """The actions of each accepted order in execution order, by result index"""
+    # One sequencing budget for the whole batch
+    deadline = time.perf_counter() + get_settings().SEQUENCING_TIME_BUDGET_MS / 1000
+    return {r.index: _sequence_actions(orders[r.index], positions, deadline) for r in results if r.ok}
+
+
+def _insert_orders(
+    db: Session,
+    orders: List[OrderCreate],
+    results: List[OrderResult],
+    positions: Dict[int, Tuple[int, int, int]],
+    sequences: Dict[int, Sequenced],
+) -> List[OrderResult]:
+    accepted = [r for r in results if r.ok]
+    if not accepted:
+        return results
+
+    order_ids = db.execute(
+        insert(Order).returning(Order.id, sort_by_parameter_order=True),
+        [
+            {"priority": orders[r.index].priority, "order_type": orders[r.index].order_type.value}
+            for r in accepted
+        ],
+    ).scalars().all()
+
+    # Loading orders bring new buckets into the warehouse
+    new_bucket_count = sum(
+        len(orders[r.index].actions)
+        for r in accepted
+        if orders[r.index].order_type == OrderType.LOADING
+    )
+    new_bucket_ids = []
+    if new_bucket_count:
+        new_bucket_ids = db.execute(
+            insert(Bucket).returning(Bucket.id, sort_by_parameter_order=True),
+            [{"position_id": None}] * new_bucket_count,
+        ).scalars().all()
+    new_bucket_ids = iter(new_bucket_ids)
+
+    action_rows = []
+    for result, order_id in zip(accepted, order_ids):
+        order = orders[result.index]
+        payload = {
+            "order_id": order_id,
+            "priority": order.priority,
+            "order_type": order.order_type.value,
+            "actions": []
+        }
+        actions, plan = sequences[result.index]
+        if plan is not None:
+            payload["sequencing"] = {
+                "distance_before": round(plan.distance_before, 2),
+                "distance_after": round(plan.distance_after, 2),
+                "distance_saved": round(plan.distance_saved, 2),
+            }
+        for action in actions:
+            if order.order_type == OrderType.LOADING:
+                bucket_id = next(new_bucket_ids)
+            else:
+                bucket_id = action.bucket_id
+
+            source_id = action.source_position_id if order.order_type in SOURCE_POSITION_TYPES else None
+            target_id = action.target_position_id if order.order_type in TARGET_POSITION_TYPES else None
+
+            action_rows.append({
+                "order_id": order_id,
+                "bucket_id": bucket_id,
+                "source_position_id": action.source_position_id,
+                "target_position_id": action.target_position_id,
+            })
+            payload["actions"].append({
+                "bucket_id": bucket_id,
+                "source_position": _position_payload(source_id, positions[source_id]) if source_id else None,
+                "target_position": _position_payload(target_id, positions[target_id]) if target_id else None,
+            })
+
+        result.order_id = order_id
+        result.payload = payload
+
+    if action_rows:
+        action_ids = iter(db.execute(
+            insert(BucketAction).returning(BucketAction.id, sort_by_parameter_order=True),
+            action_rows,
+        ).scalars().all())
+        for result in accepted:
+            for action in result.payload["actions"]:
+                action["action_id"] = next(action_ids)
+
+    # Feeds GET /changes and push subscribers
+    db.execute(insert(OutboxEvent), [
+        {
+            "aggregate_type": "order",
+            "aggregate_id": str(r.order_id),
+            "event_type": "order_created",
+            "payload": r.payload,
+        }
+        for r in accepted
+    ])
+    return results
+
+
+def action_messages(payload: dict) -> List[dict]:
+    """One message per bucket action of an order payload, for per-bucket ordering downstream"""
+    return [
+        {
+            "order_id": payload["order_id"],
+            "priority": payload["priority"],
+            "order_type": payload["order_type"],
+            **action,
+        }
+        for action in payload["actions"]
+    ]
@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OutboxHandler = Callable[[OutboxEvent], None]
+
+MAX_TRACKED_GAP = 1000
+
+
+class OutboxTailer:
+    """
+    Follows `outbox_events` and hands new events to in-process subscribers.
+
+    Every worker runs its own tailer, so this is also how a change made by
+    one worker reaches the in-memory state of the others. Ids are assigned at
+    insert time but become visible at commit, so an id skipped over may still
+    show up; skipped ids are re-checked until `gap_timeout` seconds pass
+    (after which they are assumed to belong to rolled back transactions).
+    """
+
+    def __init__(self, batch_size: int = 500, gap_timeout: float = 30):
+        self.batch_size = batch_size
+        self.gap_timeout = gap_timeout
+        self.cursor: Optional[int] = None
+        self._gaps: Dict[int, float] = {}
+        self._handlers: Dict[str, List[OutboxHandler]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: str, handler: OutboxHandler):
+        """Call `handler` for every event of `event_type`, "*" for all events"""
+        if handler not in self._handlers[event_type]:
+            self._handlers[event_type].append(handler)
+
+    def start_from_latest(self, db: Session):
+        with self._lock:
+            self.cursor = db.execute(select(func.coalesce(func.max(OutboxEvent.id), 0))).scalar_one()
+            self._gaps = {}
+
+    def poll(self, db: Session) -> int:
+        """Dispatch events committed since the last poll, returns how many were seen"""
+        with self._lock:
+            if self.cursor is None:
+                self.cursor = db.execute(select(func.coalesce(func.max(OutboxEvent.id), 0))).scalar_one()
+                return 0
+
+            seen = 0
+            if self._gaps:
+                now = time.monotonic()
+                self._gaps = {i: t for i, t in self._gaps.items() if now - t < self.gap_timeout}
+                late = db.execute(
+                    select(OutboxEvent).where(OutboxEvent.id.in_(list(self._gaps))).order_by(OutboxEvent.id)
+                ).scalars().all()
+                for event in late:
+                    self._gaps.pop(event.id, None)
+                    self._dispatch(event)
+                seen += len(late)
+
+            while True:
+                events = db.execute(
+                    select(OutboxEvent)
+                    .where(OutboxEvent.id > self.cursor)
+                    .order_by(OutboxEvent.id)
+                    .limit(self.batch_size)
+                ).scalars().all()
+                for event in events:
+                    # Large jumps come from sequence resets, not in-flight transactions
+                    if event.id - self.cursor <= MAX_TRACKED_GAP:
+                        now = time.monotonic()
+                        for missing in range(self.cursor + 1, event.id):
+                            self._gaps[missing] = now
+                    self.cursor = event.id
+                    self._dispatch(event)
+                seen += len(events)
+                if len(events) < self.batch_size:
+                    return seen
+
+    def _dispatch(self, event: OutboxEvent):
+        for handler in self._handlers.get(event.event_type, []) + self._handlers.get("*", []):
+            try:
+                handler(event)
+            except Exception as e:
+                logger.warning(f"Outbox handler for {event.event_type} #{event.id} failed: {e}")
+
+
+_tailer: Optional[OutboxTailer] = None
+
+
+def get_outbox_tailer() -> OutboxTailer:
+    global _tailer
+    if _tailer is None:
+        _tailer = OutboxTailer()
+    return _tailer
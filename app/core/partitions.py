@@ -0,0 +1,151 @@
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+from app.db.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Held while maintaining, so only one worker does it at a time
+ADVISORY_LOCK_ID = 0x0150_7A27
+
+# Partitions are named after the first day they hold, e.g. outbox_events_p20261019
+_SUFFIX = re.compile(r"_p(\d{8})$")
+
+
+def period_start(day: date, interval: str) -> date:
+    return day.replace(day=1) if interval == "month" else day
+
+
+def next_period(start: date, interval: str) -> date:
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: date) -> str:
+    return f"{table}_p{start:%Y%m%d}"
+
+
+def partition_start(table: str, name: str) -> Optional[date]:
+    match = _SUFFIX.search(name)
+    if match is None or name[:match.start()] != table:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d").date()
+
+
+def ensure_partitions(conn, table: str, interval: str, ahead: int, today: date) -> List[str]:
+    """Create the partitions for the current and the next `ahead` periods, returns the new ones"""
+    created = []
+    start = period_start(today, interval)
+    for _ in range(ahead + 1):
+        end = next_period(start, interval)
+        name = partition_name(table, start)
+        exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+        if not exists:
+            try:
+                conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+                ))
+                created.append(name)
+            except Exception as e:
+                # Typically rows for this range already sit in the default partition
+                logger.warning(f"Could not create partition {name}: {e}")
+        start = end
+    return created
+
+
+def archive_partitions(conn, table: str, interval: str, retention_days: int, archive_dir: str, today: date) -> List[str]:
+    """
+    Detach the partitions whose whole range is older than the retention,
+    export each to a gzipped CSV in `archive_dir` and drop it. A partition
+    detached by an earlier, interrupted run is picked up again by its name.
+    """
+    cutoff = today - timedelta(days=retention_days)
+    names = conn.execute(
+        text("SELECT relname FROM pg_class WHERE relkind IN ('r', 'p') AND relname LIKE :pattern"),
+        {"pattern": f"{table}\\_p%"},
+    ).scalars().all()
+
+    archived = []
+    for name in sorted(names):
+        start = partition_start(table, name)
+        if start is None or next_period(start, interval) > cutoff:
+            continue
+        attached = conn.execute(
+            text("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name) AND inhparent = to_regclass(:table)"),
+            {"name": name, "table": table},
+        ).scalar() is not None
+        if attached:
+            # CONCURRENTLY is not allowed next to a default partition. The lock
+            # on the parent is brief, but don't queue behind long queries for it
+            conn.execute(text("SET lock_timeout = '5s'"))
+            try:
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            finally:
+                conn.execute(text("RESET lock_timeout"))
+        path = export_partition(conn, name, archive_dir)
+        conn.execute(text(f"DROP TABLE {name}"))
+        logger.info(f"Archived partition {name} to {path}")
+        archived.append(name)
+    return archived
+
+
+def export_partition(conn, name: str, archive_dir: str) -> str:
+    """COPY a table into archive_dir/<name>.csv.gz, written under a temporary name first"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    partial = path + ".partial"
+    cursor = conn.connection.driver_connection.cursor()
+    try:
+        with gzip.open(partial, "wb") as out:
+            cursor.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", out)
+    finally:
+        cursor.close()
+    os.replace(partial, path)
+    return path
+
+
+def maintain_partitions():
+    """
+    Periodic job: create upcoming partitions and archive expired ones for
+    every table in PARTITIONED_TABLES. Does nothing outside Postgres or
+    while another worker holds the maintenance lock.
+    """
+    engine = get_engine()
+    if engine.dialect.name != "postgresql":
+        return
+    settings = get_settings()
+    today = datetime.now(timezone.utc).date()
+    metrics = get_metrics()
+    # Each statement commits on its own, a failure leaves earlier steps done
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID}).scalar():
+            return
+        try:
+            for table, interval in settings.PARTITIONED_TABLES.items():
+                created = ensure_partitions(conn, table, interval, settings.PARTITION_PREMAKE, today)
+                archived = archive_partitions(
+                    conn,
+                    table,
+                    interval,
+                    settings.PARTITION_RETENTION_DAYS[table],
+                    settings.PARTITION_ARCHIVE_DIR,
+                    today,
+                )
+                metrics.inc(f"partitions.{table}.created", len(created))
+                metrics.inc(f"partitions.{table}.archived", len(archived))
+                stray = conn.execute(text(f"SELECT count(*) FROM {table}_default")).scalar()
+                metrics.set_gauge(f"partitions.{table}.default_rows", stray)
+                if stray:
+                    logger.warning(f"{stray} rows of {table} are in its default partition")
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
@@ -0,0 +1,147 @@
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, select, text, tuple_
+from sqlalchemy.orm import Session
+
+from app.core.batch_consumer import BatchConsumer, create_kafka_consumer, run_consumer
+from app.core.cache import invalidate
+from app.core.config import get_settings
+from app.core.kafka_topics import KafkaTopic
+from app.core.spatial_index import Coords
+from app.db.models import OutboxEvent, Position
+
+COORDINATES = ("position_x", "position_y", "position_z")
+
+
+def _parse(value) -> Optional[dict]:
+    if not isinstance(value, dict):
+        return None
+    try:
+        row = {name: int(value[name]) for name in COORDINATES}
+        if value.get("id") is not None:
+            row["id"] = int(value["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return row
+
+
+def _coords(row: dict) -> Coords:
+    return tuple(row[name] for name in COORDINATES)
+
+
+def _upsert_statement(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Position upserts are not supported on {dialect}")
+    stmt = dialect_insert(Position)
+    return stmt.on_conflict_do_update(
+        index_elements=[Position.id],
+        set_={name: stmt.excluded[name] for name in COORDINATES},
+    )
+
+
+def _position_event(event_type: str, position_id: int, coords: Coords) -> dict:
+    return {
+        "aggregate_type": "position",
+        "aggregate_id": str(position_id),
+        "event_type": event_type,
+        "payload": {"id": position_id, **dict(zip(COORDINATES, coords))},
+    }
+
+
+def apply_position_updates(db: Session, rows: List[dict]) -> Dict[str, int]:
+    """
+    Write a batch of position messages without committing. Rows with an id
+    are upserted, last message per id wins; rows without one are inserted
+    unless a position already sits at their coordinates, which makes a
+    redelivered batch a no-op. Each created or moved position gets its own
+    position_created/position_updated event, so workers update their
+    indexes in place instead of reloading them.
+    """
+    keyed: Dict[int, dict] = {}
+    by_coords: Dict[Coords, dict] = {}
+    for row in rows:
+        if "id" in row:
+            keyed[row["id"]] = row
+        else:
+            by_coords[_coords(row)] = row
+
+    events = []
+    changed: List[dict] = []
+    new: List[dict] = []
+    coordinates = (Position.position_x, Position.position_y, Position.position_z)
+    if keyed:
+        current = {
+            position_id: tuple(coords)
+            for position_id, *coords in db.execute(
+                select(Position.id, *coordinates).where(Position.id.in_(list(keyed)))
+            )
+        }
+        changed = [
+            row for position_id, row in keyed.items()
+            if current.get(position_id) != _coords(row)
+        ]
+        if changed:
+            db.execute(_upsert_statement(db), changed)
+            created = [row["id"] for row in changed if row["id"] not in current]
+            if created and db.get_bind().dialect.name == "postgresql":
+                # Explicit ids bypass the sequence, keep it ahead of them
+                db.execute(text(
+                    "SELECT setval('positions_id_seq', GREATEST((SELECT MAX(id) FROM positions), 1))"
+                ))
+            events += [
+                _position_event(
+                    "position_updated" if row["id"] in current else "position_created", row["id"], _coords(row)
+                )
+                for row in changed
+            ]
+            invalidate(db, "positions", [row["id"] for row in changed])
+
+    if by_coords:
+        existing = {
+            tuple(coords)
+            for coords in db.execute(select(*coordinates).where(tuple_(*coordinates).in_(list(by_coords))))
+        }
+        new = [row for coords, row in by_coords.items() if coords not in existing]
+        if new:
+            inserted = db.execute(insert(Position).returning(Position.id, *coordinates), new)
+            events += [
+                _position_event("position_created", position_id, tuple(coords))
+                for position_id, *coords in inserted
+            ]
+    if events:
+        db.execute(insert(OutboxEvent), events)
+    return {"upserted": len(changed), "inserted": len(new), "unchanged": len(rows) - len(changed) - len(new)}
+
+
+class PositionConsumer(BatchConsumer):
+    """
+    Applies position and layout updates from KafkaTopic.POSITION. Messages
+    carry position_x/y/z and an optional id; see `apply_position_updates`.
+    """
+
+    name = "position_consumer"
+
+    def parse(self, message) -> Optional[dict]:
+        return _parse(message.value)
+
+    def apply(self, db: Session, rows: List[dict]) -> Dict[str, int]:
+        return apply_position_updates(db, rows)
+
+
+def main():
+    settings = get_settings()
+    consumer = create_kafka_consumer(
+        KafkaTopic.POSITION,
+        settings.POSITION_CONSUMER_GROUP,
+        settings.POSITION_CONSUMER_MAX_BATCH,
+    )
+    run_consumer(PositionConsumer(consumer, max_batch=settings.POSITION_CONSUMER_MAX_BATCH))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.auth import get_keycloak_auth
+from app.core.config import get_settings
+from app.core.log import current_request_id
+from app.core.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames in these modules are threads blocked waiting for work, such
+# as idle threadpool workers or the event loop in select()
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+
+class ProfilerBusy(Exception):
+    """Only one profile runs at a time per worker"""
+
+
+def _short_path(filename: str, roots: List[str]) -> str:
+    for root in roots:
+        if filename.startswith(root):
+            return filename[len(root):].lstrip(os.sep)
+    return filename
+
+
+class Profile:
+    """
+    Samples of one profiling run: how often each stack was seen, as tuples
+    of frame labels from the thread name (root) down to the running function.
+    """
+
+    def __init__(self, stacks: Counter, idle_labels: Set[str], samples: int, seconds: float, interval: float):
+        self.stacks = stacks
+        self.idle_labels = idle_labels
+        self.samples = samples
+        self.seconds = seconds
+        self.interval = interval
+
+    def _active(self, idle: bool) -> Counter:
+        if idle:
+            return self.stacks
+        return Counter({stack: count for stack, count in self.stacks.items() if stack[-1] not in self.idle_labels})
+
+    def collapsed(self, idle: bool = False) -> str:
+        """One `frame;frame;frame count` line per stack, the input of flamegraph.pl and speedscope"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self._active(idle).most_common())
+
+    def top(self, limit: int, idle: bool = False) -> dict:
+        """Functions by samples spent in them (self) and under them (total)"""
+        stacks = self._active(idle)
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in stacks.items():
+            # stack[0] is the thread name
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        seen = sum(stacks.values())
+        return {
+            "samples": self.samples,
+            "seconds": round(self.seconds, 3),
+            "interval_ms": self.interval * 1000,
+            "thread_samples": seen,
+            "functions": [
+                {
+                    "function": label,
+                    "self": own[label],
+                    "total": total[label],
+                    "self_pct": round(own[label] * 100 / seen, 2),
+                    "total_pct": round(total[label] * 100 / seen, 2),
+                }
+                for label, _ in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:limit]
+            ],
+        }
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads every `interval` seconds from a
+    thread of its own, via sys._current_frames. Nothing is hooked into the
+    interpreter, so the running code is slowed only by the sampling thread
+    holding the GIL while it walks the stacks.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._labels: Dict[CodeType, str] = {}
+        self._idle_labels: Set[str] = set()
+        self._roots = sorted((path for path in sys.path if path), key=len, reverse=True)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({_short_path(code.co_filename, self._roots)}:{code.co_firstlineno})"
+            self._labels[code] = label
+            if code.co_filename.endswith(_IDLE_MODULES):
+                self._idle_labels.add(label)
+        return label
+
+    def _sample(self, own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack: List[str] = []
+            current: Optional[FrameType] = frame
+            while current is not None:
+                stack.append(self._label(current.f_code))
+                current = current.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self._stacks[tuple(stack)] += 1
+        self._samples += 1
+
+    def _run(self):
+        own = threading.get_ident()
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            self._sample(own)
+            next_at += self.interval
+            self._stop.wait(max(next_at - time.perf_counter(), 0))
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        self._thread.join()
+        return Profile(self._stacks, self._idle_labels, self._samples, time.perf_counter() - self._started, self.interval)
+
+
+_running = threading.Lock()
+
+
+def start_profiler(interval: Optional[float] = None) -> SamplingProfiler:
+    """Start sampling, raises ProfilerBusy while another profile runs"""
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running on this worker")
+    try:
+        profiler = SamplingProfiler(interval or get_settings().PROFILE_INTERVAL_MS / 1000)
+        profiler.start()
+    except BaseException:
+        _running.release()
+        raise
+    get_metrics().inc("profiler.runs")
+    return profiler
+
+
+def stop_profiler(profiler: SamplingProfiler) -> Profile:
+    try:
+        return profiler.stop()
+    finally:
+        _running.release()
+
+
+class RequestProfiles:
+    """The latest per-request profiles, by request id"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, request_id: str, profile: Profile):
+        with self._lock:
+            self._profiles[request_id] = profile
+            self._profiles.move_to_end(request_id)
+            while len(self._profiles) > self.capacity:
+                self._profiles.popitem(last=False)
+
+    def get(self, request_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._profiles.get(request_id)
+
+
+_request_profiles: Optional[RequestProfiles] = None
+
+
+def get_request_profiles() -> RequestProfiles:
+    global _request_profiles
+    if _request_profiles is None:
+        _request_profiles = RequestProfiles(get_settings().PROFILE_KEEP_REQUESTS)
+    return _request_profiles
+
+
+def _is_admin(request: Request) -> bool:
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = request.cookies.get("access_token")
+    if not token:
+        return False
+    try:
+        auth = get_keycloak_auth()
+        return auth.has_any_role(auth.validate_token(token), ["admin"])
+    except Exception:
+        return False
+
+
+class RequestProfilingMiddleware:
+    """
+    Profiles one request when an admin sends an X-Profile header. The
+    profile is kept under the request id, returned as X-Profile-Id, for
+    GET /admin/profile/requests/{id}. Other requests only pay for looking
+    for the header; without an admin token it is ignored.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not any(name == b"x-profile" for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        if not get_settings().PROFILE_REQUESTS or not await run_in_threadpool(_is_admin, Request(scope)):
+            await self.app(scope, receive, send)
+            return
+        try:
+            profiler = start_profiler()
+        except ProfilerBusy:
+            get_metrics().inc("profiler.busy")
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = current_request_id() or f"{time.time_ns():x}"
+
+        async def send_with_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile = stop_profiler(profiler)
+            get_request_profiles().add(profile_id, profile)
+            logger.info("Request profiled", extra={"path": scope["path"], "samples": profile.samples})
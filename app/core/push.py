@@ -0,0 +1,206 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.api.responses import dumps
+from app.core.changes import read_changes
+from app.core.config import get_settings
+from app.core.metrics import get_metrics
+from app.core.outbox_listener import get_outbox_tailer
+from app.db.database import session_scope
+from app.db.models import OutboxEvent
+
+# Aggregate types of outbox events, clients filter on these
+TOPICS = ("order", "bucket_action", "bucket", "position")
+
+# (event id, event type, JSON text); an id of None marks an overflow notice
+PushMessage = Tuple[Optional[int], str, str]
+
+
+class Subscriber:
+    """
+    One push client. Events wait in a bounded queue; when a slow client
+    lets it fill up, the backlog is dropped and replaced by an overflow
+    notice carrying the cursor to resume from with GET /changes.
+    """
+
+    def __init__(self, topics: Iterable[str], max_queue: int):
+        self.topics: Set[str] = set(topics)
+        self.queue: "asyncio.Queue[PushMessage]" = asyncio.Queue(max_queue)
+        # Last event id handed to the client, and ids at or below `floor`
+        # were already sent by a backfill
+        self.delivered = 0
+        self.floor = 0
+        self.overflows = 0
+
+    def offer(self, message: PushMessage):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflows += 1
+            get_metrics().inc("push.overflows")
+            self.queue.put_nowait(overflow_notice(self.delivered))
+
+    async def next(self, timeout: float) -> Optional[PushMessage]:
+        """The next message to send, None if nothing arrived within `timeout`"""
+        while True:
+            try:
+                message = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            event_id = message[0]
+            if event_id is not None:
+                if event_id <= self.floor:
+                    continue
+                self.delivered = max(self.delivered, event_id)
+            return message
+
+
+class PushHub:
+    """
+    Fans outbox events out to push clients of this worker.
+
+    The worker's outbox tailer is the only upstream: each event is encoded
+    once and offered to the clients subscribed to its aggregate type, so an
+    idle client costs a queue and no database work.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscriber]] = defaultdict(set)
+        self._count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self.delivered = 0
+
+    def subscribe(self, topics: Iterable[str], max_queue: int) -> Subscriber:
+        """Must be called on the event loop"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(topics, max_queue)
+        with self._lock:
+            for topic in subscriber.topics:
+                self._subscribers[topic].add(subscriber)
+            self._count += 1
+        return subscriber
+
+    def set_topics(self, subscriber: Subscriber, topics: Iterable[str]):
+        with self._lock:
+            for topic in subscriber.topics:
+                self._subscribers[topic].discard(subscriber)
+            subscriber.topics = set(topics)
+            for topic in subscriber.topics:
+                self._subscribers[topic].add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            for topic in subscriber.topics:
+                self._subscribers[topic].discard(subscriber)
+            self._count -= 1
+
+    def on_event(self, event: OutboxEvent):
+        """Outbox handler, runs on the tailer's thread"""
+        if not self._count or self._loop is None:
+            return
+        data = dumps({
+            "id": event.id,
+            "event_type": event.event_type,
+            "aggregate_type": event.aggregate_type,
+            "aggregate_id": event.aggregate_id,
+            "payload": event.payload,
+            "created_at": event.created_at,
+        }).decode()
+        message = (event.id, event.event_type, data)
+        self._loop.call_soon_threadsafe(self._fan_out, event.aggregate_type, message)
+
+    def _fan_out(self, topic: str, message: PushMessage):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscriber in subscribers:
+            subscriber.offer(message)
+        self.delivered += len(subscribers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "clients": self._count,
+                "by_topic": {topic: len(subs) for topic, subs in self._subscribers.items()},
+                "delivered": self.delivered,
+            }
+
+
+def read_backfill(since: int, topics: Set[str], limit: int) -> Tuple[List[PushMessage], int, bool]:
+    """
+    Events after `since` for a reconnecting client: the messages, the cursor
+    they reach, and whether more remain (the client should page GET /changes).
+    """
+    with session_scope() as db:
+        events, cursor = read_changes(db, since, limit, get_settings().CHANGES_GAP_TIMEOUT_SECONDS)
+    messages = [
+        (event["id"], event["event_type"], dumps(event).decode())
+        for event in events
+        if event["aggregate_type"] in topics
+    ]
+    return messages, cursor, len(events) == limit
+
+
+def overflow_notice(cursor: int) -> PushMessage:
+    return None, "overflow", dumps({"cursor": cursor}).decode()
+
+
+def parse_topics(raw: Optional[str]) -> Set[str]:
+    """Comma separated topic filter, all topics when empty; raises ValueError on unknown topics"""
+    if not raw:
+        return set(TOPICS)
+    topics = {topic.strip() for topic in raw.split(",") if topic.strip()}
+    unknown = topics - set(TOPICS)
+    if unknown:
+        raise ValueError(f"Unknown topics: {', '.join(sorted(unknown))}. Available: {', '.join(TOPICS)}")
+    return topics
+
+
+async def open_subscription(topics: Set[str], since: Optional[int]) -> Tuple[Subscriber, List[PushMessage]]:
+    """
+    Subscribe first, then read what was missed since `since`, so no event
+    falls between the backfill and the live stream; duplicates are skipped.
+
+    The tailer may already have pushed events the backfill cannot return
+    yet, past an id whose transaction is still in flight. When the backfill
+    ends below them the client gets an overflow notice and pages the rest
+    with GET /changes.
+    """
+    settings = get_settings()
+    subscriber = get_push_hub().subscribe(topics, settings.PUSH_CLIENT_QUEUE_SIZE)
+    # Events up to here were fanned out before this subscriber existed
+    pushed = get_outbox_tailer().cursor or 0
+    backlog: List[PushMessage] = []
+    if since is not None:
+        try:
+            backlog, cursor, truncated = await run_in_threadpool(
+                read_backfill, since, subscriber.topics, settings.PUSH_BACKFILL_LIMIT
+            )
+        except BaseException:
+            get_push_hub().unsubscribe(subscriber)
+            raise
+        subscriber.floor = subscriber.delivered = cursor
+        if truncated or cursor < pushed:
+            backlog.append(overflow_notice(cursor))
+    return subscriber, backlog
+
+
+_hub: Optional[PushHub] = None
+
+
+def get_push_hub() -> PushHub:
+    global _hub
+    if _hub is None:
+        _hub = PushHub()
+        get_metrics().register_collector("push", _hub.stats)
+    return _hub
+
+
+def on_outbox_event(event: OutboxEvent):
+    get_push_hub().on_event(event)
@@ -0,0 +1,216 @@
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, bindparam, delete, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.api.schemas import OrderType, TERMINAL_ORDER_STATUSES
+from app.core.metrics import get_metrics
+from app.db.models import Order, OutboxEvent, Reservation
+from app.db.outbox import add_outbox_event
+
+# ("bucket", bucket_id) or ("position", position_id)
+Claim = Tuple[str, int]
+
+TERMINAL = {status.value for status in TERMINAL_ORDER_STATUSES}
+
+
+def payload_claims(payload: dict) -> List[Claim]:
+    """
+    The claims of an order_created payload, the same ones its creator took:
+    moved buckets (loading orders bring new ones) and target positions.
+    """
+    claims = {}
+    for action in payload["actions"]:
+        if payload["order_type"] != OrderType.LOADING.value and action.get("bucket_id"):
+            claims[("bucket", action["bucket_id"])] = None
+        if action.get("target_position"):
+            claims[("position", action["target_position"]["id"])] = None
+    return list(claims)
+
+
+def describe(claim: Claim) -> str:
+    kind, resource_id = claim
+    return f"Bucket {resource_id}" if kind == "bucket" else f"Position {resource_id}"
+
+
+class ReservationIndex:
+    """
+    Buckets and positions held by this warehouse's unfinished orders.
+
+    Every worker keeps a copy, built from the reservations table and kept
+    current from order_created / order_status_changed outbox events, so
+    most conflicts are refused with dictionary lookups. The table's primary
+    key decides races the copy has not seen yet.
+    """
+
+    def __init__(self):
+        self._holders: Dict[Claim, int] = {}
+        self._claims: Dict[int, List[Claim]] = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def load(self, rows: Iterable[Tuple[str, int, int]]):
+        holders = {}
+        claims: Dict[int, List[Claim]] = {}
+        for kind, resource_id, order_id in rows:
+            holders[(kind, resource_id)] = order_id
+            claims.setdefault(order_id, []).append((kind, resource_id))
+        with self._lock:
+            self._holders = holders
+            self._claims = claims
+            self.loaded = True
+
+    def holder(self, claim: Claim) -> Optional[int]:
+        return self._holders.get(claim)
+
+    def add(self, order_id: int, claims: List[Claim]):
+        with self._lock:
+            for claim in claims:
+                self._holders[claim] = order_id
+            self._claims[order_id] = list(claims)
+
+    def release(self, order_ids: Iterable[int]):
+        with self._lock:
+            for order_id in order_ids:
+                for claim in self._claims.pop(order_id, ()):
+                    if self._holders.get(claim) == order_id:
+                        del self._holders[claim]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"orders": len(self._claims), "claims": len(self._holders)}
+
+
+_index: Optional[ReservationIndex] = None
+
+
+def get_reservation_index() -> ReservationIndex:
+    global _index
+    if _index is None:
+        _index = ReservationIndex()
+        get_metrics().register_collector("reservations", _index.stats)
+    return _index
+
+
+def load_reservation_index(db: Session):
+    rows = db.execute(
+        select(Reservation.kind, Reservation.resource_id, Reservation.order_id)
+        .where(Reservation.order_id.is_not(None))
+    ).all()
+    get_reservation_index().load(rows)
+
+
+def _insert_ignoring_conflicts(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        raise RuntimeError(f"Reservations are not supported on {dialect}")
+    return (
+        dialect_insert(Reservation)
+        .on_conflict_do_nothing(index_elements=[Reservation.kind, Reservation.resource_id])
+        .returning(Reservation.kind, Reservation.resource_id)
+    )
+
+
+def insert_claims(db: Session, claims: List[Claim]) -> Set[Claim]:
+    """
+    Insert claims into the reservations table and return those that were
+    free. A claim held by another uncommitted transaction waits for it and
+    is only refused if that one commits. Does not commit.
+    """
+    if not claims:
+        return set()
+    # Sorted, so concurrent batches wait on each other's rows in the same order
+    rows = [{"kind": kind, "resource_id": resource_id} for kind, resource_id in sorted(claims)]
+    return set(db.execute(_insert_ignoring_conflicts(db), rows).tuples())
+
+
+def assign_claims(db: Session, claims: Dict[int, List[Claim]]):
+    """Attach claims to the ids of the orders that were inserted with them"""
+    rows = [
+        {"c_kind": kind, "c_id": resource_id, "c_order": order_id}
+        for order_id, order_claims in claims.items()
+        for kind, resource_id in order_claims
+    ]
+    if rows:
+        table = Reservation.__table__
+        db.execute(
+            table.update()
+            .where(and_(table.c.kind == bindparam("c_kind"), table.c.resource_id == bindparam("c_id")))
+            .values(order_id=bindparam("c_order")),
+            rows,
+        )
+
+
+def delete_claims(db: Session, claims: List[Claim]):
+    table = Reservation.__table__
+    db.execute(
+        table.delete().where(and_(table.c.kind == bindparam("c_kind"), table.c.resource_id == bindparam("c_id"))),
+        [{"c_kind": kind, "c_id": resource_id} for kind, resource_id in claims],
+    )
+
+
+def release_orders(db: Session, order_ids: List[int]):
+    """Drop the claims of finished orders. Does not commit."""
+    if order_ids:
+        db.execute(delete(Reservation).where(Reservation.order_id.in_(order_ids)))
+
+
+def release_claims(db: Session, order_ids: List[int], reason: str):
+    """
+    Drop the claims of orders that will not finish through the status
+    consumer, here and, through the outbox, in every worker's index.
+    Does not commit.
+    """
+    if not order_ids:
+        return
+    release_orders(db, order_ids)
+    add_outbox_event(
+        db=db,
+        aggregate_type="order",
+        aggregate_id="claims",
+        event_type="order_claims_released",
+        payload={"order_ids": order_ids, "reason": reason},
+    )
+    get_metrics().inc(f"reservations.released.{reason}", len(order_ids))
+
+
+def release_expired_claims(db: Session, updated_before: datetime, limit: int) -> List[int]:
+    """
+    Release the claims of up to `limit` orders that are finished (their
+    status update released nothing, e.g. it never reached the consumer) or
+    whose status has not changed since `updated_before`. Does not commit.
+    """
+    order_ids = list(db.execute(
+        select(Reservation.order_id)
+        .join(Order, Order.id == Reservation.order_id)
+        .where(or_(
+            Order.status.in_(TERMINAL),
+            func.coalesce(Order.status_updated_at, Order.created_at) < updated_before,
+        ))
+        .group_by(Reservation.order_id)
+        .order_by(Reservation.order_id)
+        .limit(limit)
+    ).scalars())
+    release_claims(db, order_ids, "expired")
+    return order_ids
+
+
+def on_order_created(event: OutboxEvent):
+    claims = payload_claims(event.payload)
+    if claims:
+        get_reservation_index().add(event.payload["order_id"], claims)
+
+
+def on_order_status_changed(event: OutboxEvent):
+    if event.payload.get("status") in TERMINAL:
+        get_reservation_index().release([event.payload["id"]])
+
+
+def on_order_claims_released(event: OutboxEvent):
+    get_reservation_index().release(event.payload["order_ids"])
@@ -0,0 +1,169 @@
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Coords = Tuple[int, int, int]
+
+
+@dataclass
+class SequencePlan:
+    """Execution order as indices into the actions, with the travel between actions before and after"""
+    order: List[int]
+    distance_before: float
+    distance_after: float
+
+    @property
+    def distance_saved(self) -> float:
+        return self.distance_before - self.distance_after
+
+
+def transition_costs(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """cost[i, j]: Euclidean travel from where action i ends to where action j starts"""
+    # |e - s|^2 = |e|^2 + |s|^2 - 2 e.s, a matrix product instead of an n x n x 3 temporary
+    cost = ends @ starts.T
+    cost *= -2
+    cost += (ends * ends).sum(axis=1)[:, None]
+    cost += (starts * starts).sum(axis=1)[None, :]
+    np.maximum(cost, 0, out=cost)
+    return np.sqrt(cost, out=cost)
+
+
+def path_length(cost: np.ndarray, order: np.ndarray) -> float:
+    return float(cost[order[:-1], order[1:]].sum())
+
+
+def nearest_neighbour(cost: np.ndarray, first: int = 0) -> np.ndarray:
+    """Greedy path: always continue with the action that starts closest to where the last one ended"""
+    n = len(cost)
+    order = np.empty(n, dtype=np.intp)
+    visited = np.zeros(n, dtype=bool)
+    current = first
+    for k in range(n - 1):
+        order[k] = current
+        visited[current] = True
+        current = int(np.where(visited, np.inf, cost[current]).argmin())
+    order[n - 1] = current
+    return order
+
+
+def _two_opt_pass(cost: np.ndarray, order: np.ndarray, deadline: float) -> bool:
+    """
+    Reverse segments of `order` in place where that shortens the path.
+
+    Costs are asymmetric, so a reversal also changes the transitions inside
+    the segment. Prefix sums of the forward and backward transitions give
+    the gain of reversing order[i..j] for all j at once.
+    """
+    n = len(order)
+    improved = False
+    forward = np.concatenate(([0.0], np.cumsum(cost[order[:-1], order[1:]])))
+    backward = np.concatenate(([0.0], np.cumsum(cost[order[1:], order[:-1]])))
+    for i in range(n - 1):
+        if time.perf_counter() >= deadline:
+            break
+        j = np.arange(i + 1, n)
+        delta = (backward[j] - backward[i]) - (forward[j] - forward[i])
+        if i > 0:
+            delta += cost[order[i - 1], order[j]] - cost[order[i - 1], order[i]]
+        inner = j[:-1]
+        delta[:-1] += cost[order[i], order[inner + 1]] - cost[order[inner], order[inner + 1]]
+
+        best = int(delta.argmin())
+        if delta[best] < -1e-9:
+            end = j[best]
+            order[i:end + 1] = order[i:end + 1][::-1].copy()
+            forward = np.concatenate(([0.0], np.cumsum(cost[order[:-1], order[1:]])))
+            backward = np.concatenate(([0.0], np.cumsum(cost[order[1:], order[:-1]])))
+            improved = True
+    return improved
+
+
+def _relocate_pass(cost: np.ndarray, order: np.ndarray, deadline: float) -> bool:
+    """Move single actions in place to where they fit best, what reversals alone miss on asymmetric costs"""
+    n = len(order)
+    improved = False
+    for i in range(n):
+        if time.perf_counter() >= deadline:
+            break
+        node = order[i]
+        saved = 0.0
+        if i > 0:
+            saved += cost[order[i - 1], node]
+        if i < n - 1:
+            saved += cost[node, order[i + 1]]
+        if 0 < i < n - 1:
+            saved -= cost[order[i - 1], order[i + 1]]
+
+        rest = np.delete(order, i)
+        # Insert before rest[k]; k == 0 is the front, k == n - 1 the end
+        added = np.empty(n)
+        added[0] = cost[node, rest[0]]
+        added[-1] = cost[rest[-1], node]
+        added[1:-1] = cost[rest[:-1], node] + cost[node, rest[1:]] - cost[rest[:-1], rest[1:]]
+
+        best = int(added.argmin())
+        if added[best] - saved < -1e-9:
+            order[:] = np.insert(rest, best, node)
+            improved = True
+    return improved
+
+
+def local_search(cost: np.ndarray, order: np.ndarray, deadline: float) -> np.ndarray:
+    """2-opt reversals and single-action moves until neither helps or `deadline` (perf_counter) passes"""
+    if len(order) < 2:
+        return order
+    while time.perf_counter() < deadline:
+        reversed_any = _two_opt_pass(cost, order, deadline)
+        moved_any = _relocate_pass(cost, order, deadline)
+        if not (reversed_any or moved_any):
+            break
+    return order
+
+
+def plan_sequence(legs: Sequence[Tuple[Coords, Coords]], deadline: float) -> SequencePlan:
+    """
+    Order actions, given as (start, end) coordinates, to minimise the travel
+    between them. Nearest neighbour paths are built from as many starting
+    actions as half the remaining time allows, the shortest is then improved
+    by local search until `deadline`. The travel within each action is the
+    same in any order and is not counted. Keeps the given order unless the
+    plan is shorter, or when `deadline` has already passed.
+    """
+    n = len(legs)
+    identity = np.arange(n)
+    points = np.asarray(legs, dtype=np.float64)
+    cost = transition_costs(points[:, 0], points[:, 1])
+    before = path_length(cost, identity)
+    if n < 2 or time.perf_counter() >= deadline:
+        return SequencePlan(identity.tolist(), before, before)
+
+    starts_until = time.perf_counter() + (deadline - time.perf_counter()) / 2
+    order = nearest_neighbour(cost)
+    length = path_length(cost, order)
+    for first in range(1, n):
+        if time.perf_counter() >= starts_until:
+            break
+        candidate = nearest_neighbour(cost, first)
+        candidate_length = path_length(cost, candidate)
+        if candidate_length < length:
+            order, length = candidate, candidate_length
+
+    order = local_search(cost, order, deadline)
+    after = path_length(cost, order)
+    if after >= before:
+        return SequencePlan(identity.tolist(), before, before)
+    return SequencePlan(order.tolist(), before, after)
+
+
+def can_reorder(actions: Sequence[Tuple[Optional[int], Optional[int], Optional[int]]]) -> bool:
+    """
+    Whether (bucket, source, target) actions are independent of each other,
+    so any order is valid: no bucket is moved twice and no position is
+    emptied by one action and filled by another.
+    """
+    buckets = [bucket for bucket, _, _ in actions if bucket]
+    sources = {source for _, source, _ in actions if source}
+    targets = {target for _, _, target in actions if target}
+    return len(buckets) == len(set(buckets)) and not sources & targets
@@ -0,0 +1,198 @@
+import json
+import operator
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "message_schemas.json")
+
+# First byte of binary payloads, a JSON document never starts with it.
+# The second byte is the schema version the payload was written with.
+BINARY_MAGIC = 0x00
+
+
+def topic_setting(mapping: Dict[str, str], topic_name: str, default: str) -> str:
+    """Per-topic setting; priority lane topics (order.urgent) fall back to their base topic"""
+    if topic_name in mapping:
+        return mapping[topic_name]
+    return mapping.get(topic_name.split(".", 1)[0], default)
+
+
+class Serializer(ABC):
+    """Encodes message values for one wire format, `name` is its setting value"""
+
+    name = ""
+
+    @abstractmethod
+    def dumps(self, topic_name: str, value: Any) -> bytes:
+        """Encode a message value for `topic_name`"""
+
+    @abstractmethod
+    def loads(self, topic_name: str, data: bytes) -> Any:
+        """Decode a message value read from `topic_name`"""
+
+
+class JsonSerializer(Serializer):
+    """JSON via orjson when it is installed, the standard library otherwise"""
+
+    name = "json"
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError:
+            self._dumps = lambda value: json.dumps(value, separators=(",", ":")).encode("utf-8")
+            self._loads = json.loads
+        else:
+            self._dumps = orjson.dumps
+            self._loads = orjson.loads
+
+    def dumps(self, topic_name: str, value: Any) -> bytes:
+        return self._dumps(value)
+
+    def loads(self, topic_name: str, data: bytes) -> Any:
+        return self._loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """
+    MessagePack with records laid out by the local schema file: a record is
+    written as a list of its field values in schema order, so keys are not
+    repeated per action. A schema field absent from the payload is read
+    back as None, and keys the schema does not know are kept in a map
+    appended to the list. Topics without a record are written as plain maps.
+    Every payload starts with the magic byte and its schema version, so
+    consumers can read messages written with any version in the file.
+    """
+
+    name = "msgpack"
+
+    def __init__(self, schema_file: str = SCHEMA_FILE):
+        import msgpack
+
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+        with open(schema_file) as f:
+            schema = json.load(f)
+        self.version = int(schema["current"])
+        self._encoders: Dict[int, Dict[str, Callable]] = {}
+        self._decoders: Dict[int, Dict[str, Callable]] = {}
+        for version, definition in schema["versions"].items():
+            records = definition["records"]
+            topics = definition.get("topics", {})
+            self._encoders[int(version)] = {
+                topic: _compile(records, record, _record_encoder, {}) for topic, record in topics.items()
+            }
+            self._decoders[int(version)] = {
+                topic: _compile(records, record, _record_decoder, {}) for topic, record in topics.items()
+            }
+
+    def dumps(self, topic_name: str, value: Any) -> bytes:
+        encode = topic_setting(self._encoders[self.version], topic_name, None)
+        body = encode(value) if encode else value
+        return bytes((BINARY_MAGIC, self.version)) + self._packb(body)
+
+    def loads(self, topic_name: str, data: bytes) -> Any:
+        version = data[1]
+        if version not in self._decoders:
+            raise ValueError(f"Unknown message schema version {version}")
+        body = self._unpackb(data[2:])
+        decode = topic_setting(self._decoders[version], topic_name, None)
+        return decode(body) if decode else body
+
+
+def _compile(records: Dict[str, list], record: str, build: Callable, compiled: Dict[str, Callable]) -> Callable:
+    """Build the codec for `record` once, nested records become closures instead of schema lookups"""
+    if record not in compiled:
+        plan = []
+        for field in records[record]:
+            if isinstance(field, str):
+                plan.append((field, None, False))
+            elif "record" in field:
+                plan.append((field["name"], _compile(records, field["record"], build, compiled), False))
+            else:
+                plan.append((field["name"], _compile(records, field["array"], build, compiled), True))
+        compiled[record] = build(plan)
+    return compiled[record]
+
+
+def _record_encoder(plan: List[Tuple[str, Optional[Callable], bool]]) -> Callable:
+    names = [name for name, _, _ in plan]
+    known = frozenset(names)
+    size = len(plan)
+    get_all = operator.itemgetter(*names)
+    nested = [(index, codec, many) for index, (_, codec, many) in enumerate(plan) if codec is not None]
+
+    def encode(value: Optional[dict]):
+        if value is None:
+            return None
+        try:
+            out = list(get_all(value)) if size > 1 else [get_all(value)]
+            complete = True
+        except KeyError:
+            out = [value.get(name) for name in names]
+            complete = False
+        for index, codec, many in nested:
+            item = out[index]
+            if item is not None:
+                out[index] = [codec(element) for element in item] if many else codec(item)
+        # Every schema field present and nothing else is the common case
+        if not complete or len(value) > size:
+            extra = {key: item for key, item in value.items() if key not in known}
+            if extra:
+                out.append(extra)
+        return out
+
+    return encode
+
+
+def _record_decoder(plan: List[Tuple[str, Optional[Callable], bool]]) -> Callable:
+    size = len(plan)
+
+    def decode(value: Optional[list]):
+        if value is None:
+            return None
+        out = {}
+        for (name, codec, many), item in zip(plan, value):
+            if codec is not None and item is not None:
+                item = [codec(element) for element in item] if many else codec(item)
+            out[name] = item
+        if len(value) > size:
+            out.update(value[size])
+        return out
+
+    return decode
+
+
+SERIALIZERS = {
+    JsonSerializer.name: JsonSerializer,
+    MsgpackSerializer.name: MsgpackSerializer,
+}
+
+_serializers: Dict[str, Serializer] = {}
+_serializers_lock = threading.Lock()
+
+
+def get_serializer(name: str) -> Serializer:
+    with _serializers_lock:
+        if name not in _serializers:
+            if name not in SERIALIZERS:
+                raise ValueError(f"Unknown Kafka serializer {name!r}, expected one of {sorted(SERIALIZERS)}")
+            _serializers[name] = SERIALIZERS[name]()
+        return _serializers[name]
+
+
+def serialize(topic_name: str, value: Any) -> bytes:
+    settings = get_settings()
+    name = topic_setting(settings.KAFKA_TOPIC_SERIALIZERS, topic_name, settings.KAFKA_SERIALIZER)
+    return get_serializer(name).dumps(topic_name, value)
+
+
+def deserialize(topic_name: str, data: bytes) -> Any:
+    """Reads either format whatever the producer is configured with, so topics can switch without downtime"""
+    if data[:1] == bytes((BINARY_MAGIC,)):
+        return get_serializer(MsgpackSerializer.name).loads(topic_name, data)
+    return get_serializer(JsonSerializer.name).loads(topic_name, data)
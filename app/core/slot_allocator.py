@@ -0,0 +1,179 @@
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.spatial_index import get_position_index
+from app.db.database import session_scope
+from app.db.models import Bucket, OutboxEvent, Position
+
+Coords = Tuple[int, int, int]
+
+
+class NotEnoughFreeSlots(Exception):
+    pass
+
+
+class SlotAllocator:
+    """
+    Occupancy bitmap over position ids.
+
+    Three arrays indexed directly by position id say whether a position
+    exists, holds a bucket, and until when it is reserved by an allocation.
+    Updates are single array writes; finding free slots is one vectorized
+    scan, or a nearest-neighbour walk over the position index when a
+    reference point is given. Reservations expire after the allocation TTL
+    unless a bucket is placed there first.
+    """
+
+    def __init__(self, reservation_ttl: float):
+        self.reservation_ttl = reservation_ttl
+        self._lock = threading.Lock()
+        self._exists = np.zeros(0, dtype=bool)
+        self._occupied = np.zeros(0, dtype=bool)
+        self._reserved_until = np.zeros(0, dtype=np.float64)
+        self.loaded = False
+
+    def _ensure_capacity(self, position_id: int):
+        size = len(self._exists)
+        if position_id < size:
+            return
+        new_size = max(position_id + 1, size * 2, 1024)
+        self._exists = np.concatenate([self._exists, np.zeros(new_size - size, dtype=bool)])
+        self._occupied = np.concatenate([self._occupied, np.zeros(new_size - size, dtype=bool)])
+        self._reserved_until = np.concatenate([self._reserved_until, np.zeros(new_size - size)])
+
+    def load(self, position_ids: Iterable[int], occupied_ids: Iterable[int]):
+        positions = np.fromiter(position_ids, dtype=np.int64)
+        occupied = np.fromiter(occupied_ids, dtype=np.int64)
+        size = int(positions.max()) + 1 if len(positions) else 0
+        with self._lock:
+            # Reloads follow position uploads, outstanding allocations survive them
+            reserved_until = np.zeros(size, dtype=np.float64)
+            kept = min(size, len(self._reserved_until))
+            reserved_until[:kept] = self._reserved_until[:kept]
+            self._exists = np.zeros(size, dtype=bool)
+            self._occupied = np.zeros(size, dtype=bool)
+            self._exists[positions] = True
+            self._occupied[occupied[occupied < size]] = True
+            reserved_until[~self._exists | self._occupied] = 0
+            self._reserved_until = reserved_until
+            self.loaded = True
+
+    def add_position(self, position_id: int):
+        with self._lock:
+            self._ensure_capacity(position_id)
+            self._exists[position_id] = True
+
+    def occupy(self, position_id: int):
+        with self._lock:
+            self._ensure_capacity(position_id)
+            self._occupied[position_id] = True
+            self._reserved_until[position_id] = 0
+
+    def release(self, position_id: int):
+        with self._lock:
+            if position_id < len(self._occupied):
+                self._occupied[position_id] = False
+
+    def move(self, from_position_id: Optional[int], to_position_id: Optional[int]):
+        """A bucket moved; either side may be None (entering or leaving the warehouse)"""
+        with self._lock:
+            if from_position_id is not None and from_position_id < len(self._occupied):
+                self._occupied[from_position_id] = False
+            if to_position_id is not None:
+                self._ensure_capacity(to_position_id)
+                self._occupied[to_position_id] = True
+                self._reserved_until[to_position_id] = 0
+
+    def cancel_reservation(self, position_ids: Iterable[int]):
+        with self._lock:
+            for position_id in position_ids:
+                if position_id < len(self._reserved_until):
+                    self._reserved_until[position_id] = 0
+
+    def is_free(self, position_id: int) -> bool:
+        with self._lock:
+            return self._is_free(position_id, time.time())
+
+    def _is_free(self, position_id: int, now: float) -> bool:
+        return (
+            position_id < len(self._exists)
+            and self._exists[position_id]
+            and not self._occupied[position_id]
+            and self._reserved_until[position_id] <= now
+        )
+
+    def _find_free(self, count: int, near: Optional[Coords], now: float) -> List[int]:
+        if near is None:
+            mask = self._exists & ~self._occupied & (self._reserved_until <= now)
+            return np.flatnonzero(mask)[:count].tolist()
+
+        # Walk outward from the reference point until enough free slots are found
+        index = get_position_index()
+        total = len(index)
+        k = min(max(count * 4, 64), total)
+        while True:
+            free = [
+                position_id
+                for position_id, _, _ in index.nearest(near, k)
+                if self._is_free(position_id, now)
+            ]
+            if len(free) >= count or k >= total:
+                return free[:count]
+            k = min(k * 4, total)
+
+    def free_slots(self, count: int, near: Optional[Coords] = None) -> List[int]:
+        """Up to `count` free position ids, closest to `near` first when given"""
+        with self._lock:
+            return self._find_free(count, near, time.time())
+
+    def allocate(self, count: int, near: Optional[Coords] = None) -> List[int]:
+        """Reserve exactly `count` free slots, or none if not enough are free"""
+        with self._lock:
+            now = time.time()
+            slots = self._find_free(count, near, now)
+            if len(slots) < count:
+                raise NotEnoughFreeSlots(f"Only {len(slots)} free slots available, {count} requested")
+            self._reserved_until[slots] = now + self.reservation_ttl
+            return slots
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.time()
+            return {
+                "positions": int(self._exists.sum()),
+                "occupied": int((self._exists & self._occupied).sum()),
+                "reserved": int((self._exists & ~self._occupied & (self._reserved_until > now)).sum()),
+            }
+
+
+_allocator: Optional[SlotAllocator] = None
+
+
+def get_slot_allocator() -> SlotAllocator:
+    global _allocator
+    if _allocator is None:
+        _allocator = SlotAllocator(reservation_ttl=get_settings().SLOT_RESERVATION_TTL_SECONDS)
+    return _allocator
+
+
+def load_slot_allocator(db: Session):
+    position_ids = db.execute(select(Position.id)).scalars()
+    occupied_ids = db.execute(
+        select(Bucket.position_id).where(Bucket.position_id.is_not(None))
+    ).scalars()
+    get_slot_allocator().load(position_ids, occupied_ids)
+
+
+def on_position_created(event: OutboxEvent):
+    get_slot_allocator().add_position(event.payload["id"])
+
+
+def on_positions_uploaded(event: OutboxEvent):
+    with session_scope() as db:
+        load_slot_allocator(db)
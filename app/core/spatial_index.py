@@ -0,0 +1,280 @@
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.database import session_scope
+from app.db.models import OutboxEvent, Position
+
+Coords = Tuple[int, int, int]
+
+# Average number of positions per grid cell the layout is sized for
+TARGET_CELL_OCCUPANCY = 8
+
+
+class _Grid(NamedTuple):
+    ids: np.ndarray         # (n,) position ids, grouped by cell
+    coords: np.ndarray      # (n, 3) x/y/z, same order as ids
+    cell_start: np.ndarray  # (cells + 1,) offset of each cell's first position
+    origin: np.ndarray      # (3,) lowest x/y/z covered by the grid
+    cell_size: np.ndarray   # (3,) cell edge length per axis
+    shape: np.ndarray       # (3,) number of cells per axis
+
+
+class _Snapshot(NamedTuple):
+    grid: _Grid
+    shadowed: np.ndarray    # ids whose grid entry is superseded by a pending one
+    pending_ids: np.ndarray
+    pending_coords: np.ndarray
+
+
+def _empty_ids() -> np.ndarray:
+    return np.empty(0, dtype=np.int64)
+
+
+def _empty_coords() -> np.ndarray:
+    return np.empty((0, 3), dtype=np.int64)
+
+
+def _build_grid(ids: np.ndarray, coords: np.ndarray) -> _Grid:
+    if len(ids) == 0:
+        one = np.ones(3, dtype=np.int64)
+        return _Grid(ids, coords, np.zeros(2, dtype=np.int64), np.zeros(3, dtype=np.int64), one, one)
+
+    origin = coords.min(axis=0)
+    extent = coords.max(axis=0) - origin + 1
+    cells_wanted = max(1, len(ids) // TARGET_CELL_OCCUPANCY)
+    edge = (float(np.prod(extent)) / cells_wanted) ** (1 / 3)
+    shape = np.clip(np.ceil(extent / edge), 1, extent).astype(np.int64)
+    cell_size = np.ceil(extent / shape).astype(np.int64)
+    shape = (extent + cell_size - 1) // cell_size
+
+    cell = (coords - origin) // cell_size
+    cell_ids = (cell[:, 0] * shape[1] + cell[:, 1]) * shape[2] + cell[:, 2]
+    order = np.argsort(cell_ids, kind="stable")
+    counts = np.bincount(cell_ids, minlength=int(np.prod(shape)))
+    cell_start = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    return _Grid(
+        np.ascontiguousarray(ids[order]),
+        np.ascontiguousarray(coords[order]),
+        cell_start,
+        origin,
+        cell_size,
+        shape,
+    )
+
+
+class PositionIndex:
+    """
+    In-memory spatial index over position coordinates.
+
+    Positions live in a uniform 3D grid stored CSR-style in NumPy arrays
+    (positions sorted by cell plus an offset per cell), sized for a handful of
+    positions per cell. A bounding box query gathers the overlapping cells and
+    filters them exactly; a k-nearest query grows a cube of cells around the
+    query point until the k-th distance is inside the searched cube. New or
+    moved positions go to a small pending buffer that is scanned brute force
+    and merged into the grid once it exceeds `rebuild_threshold`.
+
+    Queries read an immutable snapshot, writers swap in a new one under a lock.
+    """
+
+    def __init__(self, rebuild_threshold: int = 1024):
+        self.rebuild_threshold = rebuild_threshold
+        self._lock = threading.Lock()
+        self._grid = _build_grid(_empty_ids(), _empty_coords())
+        self._grid_lookup: Dict[int, int] = {}
+        self._pending: Dict[int, Coords] = {}
+        self.loaded = False
+        self._snapshot = self._make_snapshot()
+
+    def __len__(self) -> int:
+        snapshot = self._snapshot
+        return len(snapshot.grid.ids) - len(snapshot.shadowed) + len(snapshot.pending_ids)
+
+    def load(self, rows: Iterable[Tuple[int, int, int, int]]):
+        """Replace the index content with (id, x, y, z) rows"""
+        data = np.array(list(rows), dtype=np.int64).reshape(-1, 4)
+        with self._lock:
+            self._set_grid(data[:, 0], data[:, 1:])
+            self._pending = {}
+            self.loaded = True
+            self._snapshot = self._make_snapshot()
+
+    def add(self, position_id: int, x: int, y: int, z: int):
+        """Insert a position, or move it if the id is already indexed"""
+        self.add_many([(position_id, x, y, z)])
+
+    def add_many(self, rows: Iterable[Tuple[int, int, int, int]]):
+        with self._lock:
+            for position_id, x, y, z in rows:
+                self._pending[int(position_id)] = (int(x), int(y), int(z))
+            if len(self._pending) >= self.rebuild_threshold:
+                self._merge_pending()
+            self._snapshot = self._make_snapshot()
+
+    def coords_of(self, position_id: int) -> Optional[Coords]:
+        with self._lock:
+            if position_id in self._pending:
+                return self._pending[position_id]
+            row = self._grid_lookup.get(position_id)
+            if row is None:
+                return None
+            return tuple(int(v) for v in self._grid.coords[row])
+
+    def _set_grid(self, ids: np.ndarray, coords: np.ndarray):
+        self._grid = _build_grid(ids, coords)
+        self._grid_lookup = {int(pid): row for row, pid in enumerate(self._grid.ids)}
+
+    def _pending_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        ids = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+        coords = np.array(list(self._pending.values()), dtype=np.int64).reshape(-1, 3)
+        return ids, coords
+
+    def _merge_pending(self):
+        pending_ids, pending_coords = self._pending_arrays()
+        keep = ~np.isin(self._grid.ids, pending_ids)
+        self._set_grid(
+            np.concatenate([self._grid.ids[keep], pending_ids]),
+            np.concatenate([self._grid.coords[keep], pending_coords]),
+        )
+        self._pending = {}
+
+    def _make_snapshot(self) -> _Snapshot:
+        if not self._pending:
+            return _Snapshot(self._grid, _empty_ids(), _empty_ids(), _empty_coords())
+        pending_ids, pending_coords = self._pending_arrays()
+        shadowed = np.array(
+            [pid for pid in self._pending if pid in self._grid_lookup], dtype=np.int64
+        )
+        return _Snapshot(self._grid, shadowed, pending_ids, pending_coords)
+
+    @staticmethod
+    def _gather(snapshot: _Snapshot, low_cell: np.ndarray, high_cell: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Ids and coords in the inclusive cell range, pending positions appended"""
+        grid = snapshot.grid
+        low_cell = np.maximum(low_cell, 0)
+        high_cell = np.minimum(high_cell, grid.shape - 1)
+        if np.any(high_cell < low_cell) or len(grid.ids) == 0:
+            ids, coords = _empty_ids(), _empty_coords()
+        else:
+            cx = np.arange(low_cell[0], high_cell[0] + 1)
+            cy = np.arange(low_cell[1], high_cell[1] + 1)
+            cz = np.arange(low_cell[2], high_cell[2] + 1)
+            cells = ((cx[:, None, None] * grid.shape[1] + cy[None, :, None]) * grid.shape[2] + cz[None, None, :]).ravel()
+            starts = grid.cell_start[cells]
+            lengths = grid.cell_start[cells + 1] - starts
+            total = int(lengths.sum())
+            # Flatten the [start, start + length) ranges of all cells into one index array
+            rows = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+            ids, coords = grid.ids[rows], grid.coords[rows]
+            if len(snapshot.shadowed):
+                keep = ~np.isin(ids, snapshot.shadowed)
+                ids, coords = ids[keep], coords[keep]
+        return (
+            np.concatenate([ids, snapshot.pending_ids]),
+            np.concatenate([coords, snapshot.pending_coords]),
+        )
+
+    def within(
+        self,
+        min_corner: Coords,
+        max_corner: Coords,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[int, Coords]]:
+        """Positions inside the inclusive box, ordered by id"""
+        snapshot = self._snapshot
+        grid = snapshot.grid
+        low = np.asarray(min_corner, dtype=np.int64)
+        high = np.asarray(max_corner, dtype=np.int64)
+
+        ids, coords = self._gather(
+            snapshot,
+            (low - grid.origin) // grid.cell_size,
+            (high - grid.origin) // grid.cell_size,
+        )
+        mask = np.all((coords >= low) & (coords <= high), axis=1)
+        ids, coords = ids[mask], coords[mask]
+
+        order = np.argsort(ids, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return list(zip(ids[order].tolist(), map(tuple, coords[order].tolist())))
+
+    def nearest(self, point: Coords, k: int) -> List[Tuple[int, Coords, float]]:
+        """The `k` positions closest to `point` by Euclidean distance, closest first"""
+        snapshot = self._snapshot
+        grid = snapshot.grid
+        query = np.asarray(point, dtype=np.int64)
+        center = np.clip((query - grid.origin) // grid.cell_size, 0, grid.shape - 1)
+
+        radius = 0
+        while True:
+            low_cell = center - radius
+            high_cell = center + radius
+            ids, coords = self._gather(snapshot, low_cell, high_cell)
+            covers_all = np.all(low_cell <= 0) and np.all(high_cell >= grid.shape - 1)
+            if len(ids) >= k or covers_all:
+                distances = np.sqrt(((coords - query).astype(np.float64) ** 2).sum(axis=1))
+                if covers_all or len(ids) == 0:
+                    break
+                kth = np.partition(distances, k - 1)[k - 1]
+                # Distance from the query to the nearest face of the searched cube,
+                # faces at the grid border don't limit the search
+                low_face = np.where(low_cell <= 0, np.inf, query - (grid.origin + low_cell * grid.cell_size))
+                high_face = np.where(
+                    high_cell >= grid.shape - 1,
+                    np.inf,
+                    grid.origin + (high_cell + 1) * grid.cell_size - query,
+                )
+                if kth <= min(low_face.min(), high_face.min()):
+                    break
+            radius = max(1, radius * 2)
+
+        if len(ids) == 0:
+            return []
+        if len(ids) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.lexsort((ids[top], distances[top]))]
+        return list(zip(ids[top].tolist(), map(tuple, coords[top].tolist()), distances[top].tolist()))
+
+
+_position_index: Optional[PositionIndex] = None
+
+
+def get_position_index() -> PositionIndex:
+    global _position_index
+    if _position_index is None:
+        _position_index = PositionIndex()
+    return _position_index
+
+
+def load_position_index(db: Session):
+    rows = db.execute(
+        select(Position.id, Position.position_x, Position.position_y, Position.position_z)
+    ).all()
+    get_position_index().load(rows)
+
+
+def on_positions_uploaded(event: OutboxEvent):
+    with session_scope() as db:
+        load_position_index(db)
+
+
+def on_position_created(event: OutboxEvent):
+    payload = event.payload
+    get_position_index().add(
+        payload["id"],
+        payload["position_x"],
+        payload["position_y"],
+        payload["position_z"],
+    )
+
+
+def on_position_updated(event: OutboxEvent):
+    # add() moves a position that is already indexed
+    on_position_created(event)
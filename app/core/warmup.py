@@ -0,0 +1,39 @@
+import logging
+import time
+from typing import Callable, Dict
+
+from app.core.auth import get_keycloak_auth
+from app.core.config import get_settings
+from app.core.kafka_producer import warm_up_producer
+from app.db.database import warm_up_pool
+
+logger = logging.getLogger(__name__)
+
+
+def _run_step(name: str, step: Callable[[], object], report: Dict[str, dict]):
+    started = time.perf_counter()
+    try:
+        step()
+        ok = True
+    except Exception as e:
+        # A dependency being down must not keep the worker from starting,
+        # the first request will retry and surface the error
+        logger.warning(f"Warm-up step '{name}' failed: {e}")
+        ok = False
+    report[name] = {
+        "ok": ok,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def warm_up() -> Dict[str, dict]:
+    """
+    Prepare the DB pool, JWKS keys and Kafka producer.
+    Returns a per-step report with success flag and duration.
+    """
+    settings = get_settings()
+    report: Dict[str, dict] = {}
+    _run_step("database", lambda: warm_up_pool(settings.WARMUP_DB_CONNECTIONS), report)
+    _run_step("jwks", lambda: get_keycloak_auth().get_public_keys(), report)
+    _run_step("kafka", warm_up_producer, report)
+    return report
@@ -1,10 +1,68 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
 from .models import Base
-from app.core.config import settings
+from .table_versions import seed_table_versions, track_table_versions
+from app.core.config import get_settings
+
+_engine = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+track_table_versions(SessionLocal)
+
+
+def get_engine() -> Engine:
+    """Create the engine on first use and bind SessionLocal to it"""
+    global _engine
+    if _engine is None:
+        settings = get_settings()
+        _engine = create_engine(
+            settings.DATABASE_URL,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """Session for work outside a request (background jobs, worker threads)"""
+    get_engine()
+    db = SessionLocal()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def warm_up_pool(connections: int):
+    """Open `connections` pooled connections so first requests don't pay for connecting"""
+    engine = get_engine()
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def dispose_engine():
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+    seed_table_versions(get_engine())
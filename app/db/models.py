@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON, DateTime, Boolean, Text
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, JSON, DateTime, Boolean, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -13,6 +13,9 @@ class Order(Base):
     priority = Column(Integer, nullable=False)
     order_type = Column(String, nullable=False)
     description = Column(Text, nullable=True)
+    status = Column(String(20), nullable=False, default="pending", server_default="pending")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    status_updated_at = Column(DateTime(timezone=True), nullable=True)
 
     bucket_actions = relationship(
         "BucketAction",
@@ -20,6 +23,11 @@ class Order(Base):
         cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        # Dashboards list active orders by status, most urgent first
+        Index("ix_orders_status_priority", "status", "priority"),
+    )
+
 
 class Position(Base):
     __tablename__ = "positions"
@@ -94,6 +102,11 @@ class BucketAction(Base):
         nullable=True
     )
 
+    status = Column(String(20), nullable=False, default="pending", server_default="pending")
+    status_updated_at = Column(DateTime(timezone=True), nullable=True)
+    # Partition key in Postgres, where the primary key is (id, created_at)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
     order = relationship("Order", back_populates="bucket_actions")
     bucket = relationship("Bucket", back_populates="bucket_actions")
 
@@ -120,7 +133,38 @@ class OutboxEvent(Base):
     event_type = Column(String(100), nullable=False)
     payload = Column(JSON, nullable=False)
     status = Column(String(20), nullable=False, default="NEW", server_default="NEW")
+    # Partition key in Postgres, where the primary key is (id, created_at)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(JSON, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class Reservation(Base):
+    """A bucket or target position claimed by an order that has not finished yet"""
+    __tablename__ = "reservations"
+
+    kind = Column(String(16), primary_key=True)
+    resource_id = Column(Integer, primary_key=True)
+    # Null only inside the creating transaction, before the order has its id
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class TableVersion(Base):
+    """Write counter per table, bumped in the transaction of every write to it"""
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
 
 
 def model_to_dict(obj):
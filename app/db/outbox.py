@@ -2,7 +2,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from app.db.models import OutboxEvent
 
 
-async def add_to_outbox_event(db, aggregate_type, aggregate_id, event_type, payload, status="NEW"):
+def add_outbox_event(db, aggregate_type, aggregate_id, event_type, payload, status="NEW"):
     # Basic validation
     if not all([aggregate_type, aggregate_id, event_type]):
         raise ValueError("aggregate_type, aggregate_id, and event_type are required and cannot be empty.")
@@ -24,3 +24,7 @@ async def add_to_outbox_event(db, aggregate_type, aggregate_id, event_type, payl
         return event
     except SQLAlchemyError as e:
         raise RuntimeError(f"Failed to add event to outbox: {str(e)}")
+
+
+async def add_to_outbox_event(db, aggregate_type, aggregate_id, event_type, payload, status="NEW"):
+    return add_outbox_event(db, aggregate_type, aggregate_id, event_type, payload, status)
@@ -0,0 +1,75 @@
+from typing import Dict, Iterable
+
+from sqlalchemy import event, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.models import TableVersion
+
+# Tables whose reads are answered with ETags derived from their version
+VERSIONED_TABLES = ("orders", "bucket_actions", "positions")
+
+_CHANGED = "changed_tables"
+
+
+def mark_changed(db: Session, *tables: str):
+    """
+    Record a write the session events can't see, such as
+    bulk_insert_mappings or raw SQL text.
+    """
+    changed = db.info.setdefault(_CHANGED, set())
+    changed.update(table for table in tables if table in VERSIONED_TABLES)
+
+
+def _after_flush(session: Session, flush_context):
+    # Still the pre-flush state here: what this flush wrote
+    mark_changed(session, *{obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)})
+
+
+def _on_execute(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        mark_changed(state.session, state.statement.table.name)
+
+
+def _before_commit(session: Session):
+    # Pending objects are only flushed after this hook, flush them first
+    # so their tables are known
+    session.flush()
+    changed = session.info.pop(_CHANGED, None)
+    if changed:
+        # Sorted so concurrent writers take the row locks in the same order
+        session.execute(
+            update(TableVersion)
+            .where(TableVersion.table_name.in_(sorted(changed)))
+            .values(version=TableVersion.version + 1)
+        )
+
+
+def _after_transaction_end(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_CHANGED, None)
+
+
+def track_table_versions(factory: sessionmaker):
+    """Bump the version of every versioned table a session writes to, as part of its commit"""
+    event.listen(factory, "after_flush", _after_flush)
+    event.listen(factory, "do_orm_execute", _on_execute)
+    event.listen(factory, "before_commit", _before_commit)
+    event.listen(factory, "after_transaction_end", _after_transaction_end)
+
+
+def seed_table_versions(engine: Engine):
+    """Create the counter rows that are missing, the bump only updates existing rows"""
+    with engine.begin() as conn:
+        existing = set(conn.execute(select(TableVersion.table_name)).scalars())
+        missing = [{"table_name": table, "version": 0} for table in VERSIONED_TABLES if table not in existing]
+        if missing:
+            conn.execute(TableVersion.__table__.insert(), missing)
+
+
+def get_table_versions(db: Session, tables: Iterable[str]) -> Dict[str, int]:
+    rows = db.execute(
+        select(TableVersion.table_name, TableVersion.version)
+        .where(TableVersion.table_name.in_(list(tables)))
+    ).all()
+    return {table_name: version for table_name, version in rows}
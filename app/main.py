@@ -1,15 +1,103 @@
+import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from anyio import to_thread
+from fastapi import FastAPI, Response
+from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from app.api.routes import router
 from app.api.auth_routes import router as auth_router
-from app.db.database import init_db
+from app.api.ws_routes import router as ws_router
+from app.api.push_routes import router as push_router
+from app.core.admission import AdmissionControlMiddleware
+from app.core.background import cancel_tasks, run_periodically
+from app.core.cache import get_invalidation_listener
+from app.core.config import get_settings
+from app.core.jobs import (
+    expire_order_claims,
+    load_in_memory_state,
+    purge_idempotency_keys,
+    setup_outbox_subscriptions,
+    tail_outbox,
+)
+from app.core.dispatch import close_dispatcher
+from app.core.kafka_producer import close_producer
+from app.core.log import RequestContextMiddleware, setup_logging, stop_logging
+from app.core.order_batcher import close_order_batcher
+from app.core.partitions import maintain_partitions
+from app.core.profiler import RequestProfilingMiddleware
+from app.core.warmup import warm_up
+from app.db.database import init_db, dispose_engine
 
 from fastapi.middleware.cors import CORSMiddleware
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    setup_logging()
+    app.state.ready = False
+    app.state.warmup = {}
+    if settings.WARMUP_ON_STARTUP:
+        # Warm-up does blocking I/O, keep it off the event loop
+        app.state.warmup = await run_in_threadpool(warm_up)
+    if settings.ORDER_GROUP_COMMIT:
+        # POST /order handlers hold a thread while they wait on the batcher;
+        # give them threads of their own on top of the shared pool
+        to_thread.current_default_thread_limiter().total_tokens += settings.ORDER_GROUP_COMMIT_MAX_BATCH
+    setup_outbox_subscriptions()
+    get_invalidation_listener().start()
+    try:
+        await run_in_threadpool(load_in_memory_state)
+    except Exception as e:
+        # The outbox job retries loading on its next run
+        logger.warning(f"Loading in-memory state failed: {e}")
+    try:
+        # Right away, rows for periods without a partition land in the default one
+        await run_in_threadpool(maintain_partitions)
+    except Exception as e:
+        logger.warning(f"Partition maintenance failed: {e}")
+    background_tasks = [
+        run_periodically("outbox-tailer", settings.OUTBOX_POLL_INTERVAL_SECONDS, tail_outbox),
+        run_periodically(
+            "idempotency-cleanup",
+            settings.IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS,
+            purge_idempotency_keys,
+        ),
+        run_periodically(
+            "order-claim-cleanup",
+            settings.ORDER_CLAIM_CLEANUP_INTERVAL_SECONDS,
+            expire_order_claims,
+        ),
+        run_periodically(
+            "partition-maintenance",
+            settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+            maintain_partitions,
+        ),
+    ]
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    await cancel_tasks(background_tasks)
+    await run_in_threadpool(get_invalidation_listener().stop)
+    await run_in_threadpool(close_order_batcher)
+    await run_in_threadpool(close_dispatcher)
+    await run_in_threadpool(close_producer)
+    dispose_engine()
+    stop_logging()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Innermost, so a profile covers the request and not its wait for admission
+app.add_middleware(RequestProfilingMiddleware)
+# Added before CORS so that 503 responses still carry CORS headers
+app.add_middleware(AdmissionControlMiddleware)
+# Outside admission control, so shed requests get an id too
+app.add_middleware(RequestContextMiddleware)
 
 # Allow requests from Angular app
 origins = [
@@ -26,6 +114,8 @@ app.add_middleware(
 
 app.include_router(router)
 app.include_router(auth_router)
+app.include_router(ws_router)
+app.include_router(push_router)
 
 
 @app.get("/")
@@ -38,3 +128,10 @@ async def say_hello(name: str):
     return {"message": f"Hello {name}"}
 
 
+@app.get("/health/ready")
+async def readiness(response: Response):
+    if not app.state.ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": app.state.ready, "warmup": app.state.warmup}
+
+
@@ -0,0 +1,12 @@
+import os
+
+# Settings required by app.core.config, only used when not already set
+DEFAULT_ENV = {
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_DB": "ois",
+    "DATABASE_URL": "sqlite://",
+    "KAFKA_BOOTSTRAP_SERVERS": "localhost:9092",
+}
+for name, value in DEFAULT_ENV.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,75 @@
+import asyncio
+
+from app.core.admission import AdmissionController, AdmissionLimiter
+from app.core.config import get_settings
+
+
+def test_slot_handed_over_at_the_deadline_is_not_leaked(monkeypatch):
+    limiter = AdmissionLimiter("bulk", limit=1, max_queue=4, max_wait=0.05)
+    wait_for = asyncio.wait_for
+
+    async def scenario():
+        assert await limiter.acquire()
+
+        async def release_then_time_out(future, timeout):
+            # The release resolves the waiter in the same iteration as its deadline
+            limiter.release(0.01)
+            assert future.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, "wait_for", release_then_time_out)
+        assert not await limiter.acquire()
+        monkeypatch.setattr(asyncio, "wait_for", wait_for)
+
+        assert limiter.active == 0
+        assert await limiter.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_timed_out_waiters_leave_the_queue():
+    limiter = AdmissionLimiter("bulk", limit=1, max_queue=2, max_wait=0.01)
+
+    async def scenario():
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        assert not await limiter.acquire()
+        assert len(limiter._waiters) == 0
+        # Stale entries would have filled the queue and shed this one at once
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(0.001)
+        assert await waiter
+        assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    limiter = AdmissionLimiter("bulk", limit=1, max_queue=2, max_wait=1)
+
+    async def scenario():
+        assert await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert len(limiter._waiters) == 0
+        limiter.release(0.001)
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_group_committed_orders_get_a_class_sized_to_the_batch(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "ORDER_GROUP_COMMIT", True)
+    monkeypatch.setattr(settings, "ORDER_GROUP_COMMIT_MAX_BATCH", 100)
+    controller = AdmissionController()
+
+    assert controller.classify("POST", "/order") == "order"
+    assert controller.limiters["order"].limit == 100
+    assert controller.classify("POST", "/orders/bulk") == "bulk"
+
+    monkeypatch.setattr(settings, "ORDER_GROUP_COMMIT", False)
+    assert AdmissionController().classify("POST", "/order") == "write"
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import Future
+
+from app.core.dispatch import PriorityDispatcher, Tier, _Pending
+
+
+def make_dispatcher(batch_size: int = 10) -> PriorityDispatcher:
+    return PriorityDispatcher(
+        tiers=[Tier("urgent", 8, None), Tier("normal", 4, 200.0), Tier("bulk", None, 1000.0)],
+        batch_size=batch_size,
+    )
+
+
+def enqueue(dispatcher: PriorityDispatcher, tier: str, count: int, age_ms: float = 0):
+    enqueued_at = time.monotonic() - age_ms / 1000
+    for _ in range(count):
+        dispatcher._queues[tier].append(_Pending(enqueued_at, "order", {}, None, Future()))
+
+
+def served(dispatcher: PriorityDispatcher) -> list:
+    order = []
+    while any(dispatcher._queues.values()):
+        tier, _ = dispatcher._take()
+        order.append(tier.name)
+    return order
+
+
+def test_highest_tier_first():
+    dispatcher = make_dispatcher()
+    enqueue(dispatcher, "bulk", 20)
+    enqueue(dispatcher, "urgent", 20)
+    assert served(dispatcher) == ["urgent", "urgent", "bulk", "bulk"]
+
+
+def test_overdue_backlog_overtakes_one_batch_at_a_time():
+    dispatcher = make_dispatcher()
+    enqueue(dispatcher, "bulk", 1000, age_ms=5000)
+    enqueue(dispatcher, "urgent", 30)
+    order = served(dispatcher)
+    # Urgent batches alternate with the overdue bulk backlog instead of
+    # waiting for it to drain
+    assert order[:6] == ["bulk", "urgent", "bulk", "urgent", "bulk", "urgent"]
+    assert set(order[6:]) == {"bulk"}
+    assert dispatcher._overtakes["bulk"] == 3
+
+
+def test_urgent_waits_at_most_two_batches():
+    dispatcher = make_dispatcher()
+    enqueue(dispatcher, "bulk", 1000, age_ms=5000)
+    enqueue(dispatcher, "normal", 1000, age_ms=5000)
+    for _ in range(20):
+        enqueue(dispatcher, "urgent", 1)
+        waited = 0
+        while dispatcher._queues["urgent"]:
+            dispatcher._take()
+            waited += 1
+        assert waited <= 2
+
+
+def test_overdue_tiers_take_turns():
+    dispatcher = make_dispatcher()
+    enqueue(dispatcher, "bulk", 10000, age_ms=5000)
+    enqueue(dispatcher, "normal", 10000, age_ms=5000)
+    served_tiers = []
+    for _ in range(150):
+        # Urgent keeps flooding in
+        enqueue(dispatcher, "urgent", 10)
+        tier, _ = dispatcher._take()
+        served_tiers.append(tier.name)
+    assert served_tiers[:8] == ["normal", "urgent", "bulk", "urgent", "normal", "urgent", "bulk", "urgent"]
+    # Every overdue tier is served within 2 * (tiers - 1) batches
+    for name in ("normal", "bulk"):
+        positions = [i for i, served_tier in enumerate(served_tiers) if served_tier == name]
+        assert positions[0] < 4
+        assert max(b - a for a, b in zip(positions, positions[1:])) <= 4
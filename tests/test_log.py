@@ -0,0 +1,55 @@
+import logging
+import queue
+
+from app.core import log
+from app.core.log import _EnqueueHandler, _log_context, bind_log_context, log_sampled
+from app.core.metrics import get_metrics
+
+
+def record(message: str, **fields) -> logging.LogRecord:
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+    record.__dict__.update(fields)
+    return record
+
+
+def test_records_are_dropped_when_the_queue_is_full():
+    handler = _EnqueueHandler(queue.Queue(1))
+    dropped = get_metrics().snapshot()["counters"].get("logging.dropped", 0)
+
+    handler.handle(record("first"))
+    handler.handle(record("second"))
+
+    assert handler.queue.get_nowait().msg == "first"
+    assert handler.queue.empty()
+    assert get_metrics().snapshot()["counters"]["logging.dropped"] == dropped + 1
+
+
+def test_request_context_is_stamped_without_overriding_extra_fields():
+    handler = _EnqueueHandler(queue.Queue())
+    token = _log_context.set({"request_id": "abc"})
+    try:
+        bind_log_context(order_id=7)
+        handler.handle(record("bound"))
+        handler.handle(record("explicit", order_id=8))
+    finally:
+        _log_context.reset(token)
+    handler.handle(record("outside"))
+
+    bound, explicit, outside = (handler.queue.get_nowait() for _ in range(3))
+    assert (bound.request_id, bound.order_id) == ("abc", 7)
+    assert (explicit.request_id, explicit.order_id) == ("abc", 8)
+    assert not hasattr(outside, "request_id")
+
+
+def test_sampled_lines_are_logged_at_info(monkeypatch, caplog):
+    logger = logging.getLogger("test.sampled")
+    monkeypatch.setattr(log.random, "random", lambda: 0.5)
+
+    monkeypatch.setattr(log.get_settings(), "LOG_SAMPLE_RATE", 1.0)
+    with caplog.at_level(logging.INFO):
+        log_sampled(logger, "kept", path="/order")
+    monkeypatch.setattr(log.get_settings(), "LOG_SAMPLE_RATE", 0.1)
+    with caplog.at_level(logging.INFO):
+        log_sampled(logger, "skipped")
+
+    assert [(r.levelno, r.getMessage(), r.path) for r in caplog.records] == [(logging.INFO, "kept", "/order")]
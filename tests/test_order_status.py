@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.core.order_status import apply_status_updates
+from app.db.models import Base, Order, Reservation
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Order(id=1, priority=5, order_type="place_changing", status="pending"))
+        session.add(Reservation(kind="bucket", resource_id=7, order_id=1))
+        session.commit()
+        yield session
+
+
+def update(status: str, seconds: int) -> dict:
+    return {"order_id": 1, "status": status, "bucket_action_id": None, "at": T0 + timedelta(seconds=seconds)}
+
+
+def status_of(db: Session) -> str:
+    return db.execute(select(Order.status)).scalar_one()
+
+
+def test_newest_update_wins_regardless_of_arrival(db):
+    apply_status_updates(db, [update("in_progress", 2), update("pending", 1)])
+    assert status_of(db) == "in_progress"
+
+
+def test_late_non_terminal_update_does_not_hide_a_terminal_one(db):
+    counters = apply_status_updates(db, [update("completed", 2), update("in_progress", 3)])
+    assert status_of(db) == "completed"
+    assert counters["orders_finished"] == 1
+    assert db.execute(select(Reservation)).first() is None
+
+
+def test_terminal_update_older_than_the_stored_one_still_applies(db):
+    apply_status_updates(db, [update("in_progress", 5)])
+    apply_status_updates(db, [update("failed", 4)])
+    assert status_of(db) == "failed"
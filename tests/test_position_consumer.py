@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.core import batch_consumer
+from app.core.position_consumer import PositionConsumer
+from app.db.models import Base, OutboxEvent, Position
+
+
+class FakeConsumer:
+    """One partition; poll hands out everything after the committed offset"""
+
+    def __init__(self):
+        self.messages = []
+        self.committed = 0
+        self.polled = 0
+
+    def send(self, *values):
+        for value in values:
+            self.messages.append(SimpleNamespace(value=value, offset=len(self.messages)))
+
+    def poll(self, timeout_ms, max_records):
+        batch = self.messages[self.polled:self.polled + max_records]
+        self.polled += len(batch)
+        return {"positions-0": batch} if batch else {}
+
+    def commit(self):
+        self.committed = self.polled
+
+    def redeliver(self):
+        """What a consumer restarting from the last commit sees"""
+        self.polled = self.committed = 0
+
+    def assignment(self):
+        return set()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    @contextmanager
+    def session_scope():
+        with Session(engine) as db:
+            yield db
+
+    monkeypatch.setattr(batch_consumer, "session_scope", session_scope)
+    return engine
+
+
+@pytest.fixture
+def fake():
+    return FakeConsumer()
+
+
+def positions(engine):
+    with Session(engine) as db:
+        return db.execute(
+            select(Position.id, Position.position_x, Position.position_y, Position.position_z).order_by(Position.id)
+        ).all()
+
+
+def events(engine):
+    with Session(engine) as db:
+        return [
+            (event.event_type, event.payload)
+            for event in db.execute(select(OutboxEvent).order_by(OutboxEvent.id)).scalars()
+        ]
+
+
+def position(x, y, z, position_id=None) -> dict:
+    value = {"position_x": x, "position_y": y, "position_z": z}
+    if position_id is not None:
+        value["id"] = position_id
+    return value
+
+
+def test_rows_with_an_id_are_upserted_last_message_wins(engine, fake):
+    consumer = PositionConsumer(fake, max_batch=100)
+    fake.send(position(1, 1, 1, 5))
+    consumer.run_once()
+    fake.send(position(2, 2, 2, 5), position(3, 3, 3, 5), position(4, 4, 4, 6))
+    consumer.run_once()
+
+    assert positions(engine) == [(5, 3, 3, 3), (6, 4, 4, 4)]
+    assert events(engine) == [
+        ("position_created", {"id": 5, "position_x": 1, "position_y": 1, "position_z": 1}),
+        ("position_updated", {"id": 5, "position_x": 3, "position_y": 3, "position_z": 3}),
+        ("position_created", {"id": 6, "position_x": 4, "position_y": 4, "position_z": 4}),
+    ]
+
+
+def test_rows_without_an_id_are_inserted(engine, fake):
+    consumer = PositionConsumer(fake, max_batch=100)
+    fake.send(position(1, 2, 3), position(4, 5, 6), {"position_x": 1})
+    consumer.run_once()
+
+    rows = positions(engine)
+    assert [coords for _, *coords in rows] == [[1, 2, 3], [4, 5, 6]]
+    assert events(engine) == [
+        ("position_created", {"id": rows[0][0], "position_x": 1, "position_y": 2, "position_z": 3}),
+        ("position_created", {"id": rows[1][0], "position_x": 4, "position_y": 5, "position_z": 6}),
+    ]
+    assert fake.committed == 3
+
+
+def test_redelivered_batch_changes_nothing(engine, fake):
+    consumer = PositionConsumer(fake, max_batch=100)
+    fake.send(position(1, 1, 1, 5), position(2, 2, 2), position(2, 2, 2))
+    consumer.run_once()
+    before = (positions(engine), events(engine))
+
+    fake.redeliver()
+    assert consumer.run_once() == 3
+    assert (positions(engine), events(engine)) == before
+    assert len(before[0]) == 2
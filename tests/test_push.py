@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.core import push
+from app.core.outbox_listener import get_outbox_tailer
+
+
+@pytest.fixture
+def tailer_at(monkeypatch):
+    def set_cursor(cursor: int):
+        monkeypatch.setattr(get_outbox_tailer(), "cursor", cursor)
+    return set_cursor
+
+
+def backfill_until(monkeypatch, cursor: int, truncated: bool = False):
+    def read_backfill(since, topics, limit):
+        messages = [(event_id, "order_created", "{}") for event_id in range(since + 1, cursor + 1)]
+        return messages, cursor, truncated
+    monkeypatch.setattr(push, "read_backfill", read_backfill)
+
+
+def subscribe(since: int):
+    async def run():
+        subscriber, backlog = await push.open_subscription({"order"}, since)
+        push.get_push_hub().unsubscribe(subscriber)
+        return subscriber, backlog
+    return asyncio.run(run())
+
+
+def test_backfill_that_reaches_the_tailer_has_no_notice(monkeypatch, tailer_at):
+    tailer_at(5)
+    backfill_until(monkeypatch, 5)
+    subscriber, backlog = subscribe(since=2)
+    assert [message[0] for message in backlog] == [3, 4, 5]
+    assert subscriber.floor == 5
+
+
+def test_backfill_stopped_below_pushed_events_ends_with_a_notice(monkeypatch, tailer_at):
+    # Id 5 is still in flight, the tailer already pushed 6..8 to older clients
+    tailer_at(8)
+    backfill_until(monkeypatch, 4)
+    subscriber, backlog = subscribe(since=2)
+    assert [message[0] for message in backlog] == [3, 4, None]
+    assert backlog[-1] == push.overflow_notice(4)
+    assert subscriber.floor == 4
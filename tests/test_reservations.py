@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.api.schemas import BucketActionCreate, OrderCreate, OrderType
+from app.core import orders as orders_module
+from app.core.orders import OrderResult, claim_references
+from app.core.reservations import ReservationIndex, release_expired_claims
+from app.db.models import Base, Order, OutboxEvent, Reservation
+
+NOW = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = ReservationIndex()
+    monkeypatch.setattr(orders_module, "get_reservation_index", lambda: index)
+    return index
+
+
+def move(bucket_id: int, target_position_id: int) -> OrderCreate:
+    return OrderCreate(
+        priority=5,
+        order_type=OrderType.PLACE_CHANGING,
+        actions=[BucketActionCreate(bucket_id=bucket_id, source_position_id=1, target_position_id=target_position_id)],
+    )
+
+
+def claim(db: Session, orders):
+    results = [OrderResult(index=i) for i in range(len(orders))]
+    claimed = claim_references(db, orders, results)
+    return results, claimed
+
+
+def claimed_rows(db: Session):
+    return set(db.execute(select(Reservation.kind, Reservation.resource_id)).tuples())
+
+
+def test_claim_held_in_the_index_is_refused(db, index):
+    index.add(41, [("position", 20)])
+    results, claimed = claim(db, [move(1, 20), move(2, 21)])
+
+    assert results[0].error.status_code == 409
+    assert "unfinished order 41" in results[0].error.detail
+    assert results[1].ok
+    assert claimed == {1: [("bucket", 2), ("position", 21)]}
+    assert claimed_rows(db) == {("bucket", 2), ("position", 21)}
+
+
+def test_second_claim_inside_a_batch_is_refused(db, index):
+    results, claimed = claim(db, [move(1, 20), move(1, 21)])
+
+    assert results[0].ok
+    assert results[1].error.status_code == 409
+    assert "submitted at the same time" in results[1].error.detail
+    assert list(claimed) == [0]
+    assert claimed_rows(db) == {("bucket", 1), ("position", 20)}
+
+
+def test_claim_taken_by_another_worker_loses_the_race(db, index):
+    # Committed by a worker whose event this worker's index has not seen yet
+    db.add(Reservation(kind="position", resource_id=20, order_id=None))
+    db.flush()
+    results, claimed = claim(db, [move(1, 20), move(2, 21)])
+
+    assert results[0].error.status_code == 409
+    assert "Position 20" in results[0].error.detail
+    assert results[1].ok
+    assert list(claimed) == [1]
+    # The loser's other claim is given back
+    assert claimed_rows(db) == {("position", 20), ("bucket", 2), ("position", 21)}
+
+
+def test_claims_of_stale_and_finished_orders_expire(db):
+    for order_id, status, updated in [(1, "in_progress", 2), (2, "pending", 0), (3, "completed", 0)]:
+        db.add(Order(
+            id=order_id,
+            priority=5,
+            order_type="place_changing",
+            status=status,
+            created_at=NOW - timedelta(hours=3),
+            status_updated_at=NOW - timedelta(hours=updated),
+        ))
+        db.add(Reservation(kind="bucket", resource_id=order_id, order_id=order_id))
+    db.flush()
+
+    released = release_expired_claims(db, NOW - timedelta(hours=1), limit=10)
+
+    assert released == [1, 3]
+    assert claimed_rows(db) == {("bucket", 2)}
+    event = db.execute(select(OutboxEvent)).scalar_one()
+    assert event.event_type == "order_claims_released"
+    assert event.payload["order_ids"] == [1, 3]
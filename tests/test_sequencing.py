@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import pytest
+
+from app.api.schemas import BucketActionCreate, OrderCreate, OrderType
+from app.core.orders import _sequence_actions
+from app.core.sequencing import can_reorder, path_length, plan_sequence, transition_costs
+
+
+def random_legs(n: int, seed: int):
+    points = np.random.default_rng(seed).integers(0, 100, size=(n, 2, 3))
+    return [(tuple(start), tuple(end)) for start, end in points.tolist()]
+
+
+def travel(legs, order) -> float:
+    points = np.asarray(legs, dtype=np.float64)
+    return path_length(transition_costs(points[:, 0], points[:, 1]), np.asarray(order))
+
+
+def later(ms: float) -> float:
+    return time.perf_counter() + ms / 1000
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_plan_is_a_permutation_that_never_travels_further(seed):
+    legs = random_legs(60, seed)
+    plan = plan_sequence(legs, later(20))
+
+    assert sorted(plan.order) == list(range(60))
+    assert plan.distance_after <= plan.distance_before
+    assert plan.distance_before == pytest.approx(travel(legs, range(60)))
+    assert plan.distance_after == pytest.approx(travel(legs, plan.order))
+
+
+def test_plan_keeps_an_order_that_is_already_optimal():
+    legs = [((i, 0, 0), (i, 0, 0)) for i in range(10)]
+    plan = plan_sequence(legs, later(20))
+    assert plan.order == list(range(10))
+    assert plan.distance_saved == 0
+
+
+def test_plan_stops_at_the_deadline():
+    legs = random_legs(400, 0)
+    started = time.perf_counter()
+    plan_sequence(legs, later(10))
+    # One nearest neighbour pass may run over, local search may not keep going
+    assert time.perf_counter() - started < 0.1
+
+
+def test_plan_past_the_deadline_keeps_the_given_order():
+    legs = random_legs(50, 1)
+    plan = plan_sequence(legs, time.perf_counter())
+    assert plan.order == list(range(50))
+    assert plan.distance_after == plan.distance_before
+
+
+def test_order_is_not_sequenced_once_the_batch_deadline_passed():
+    order = OrderCreate(
+        priority=5,
+        order_type=OrderType.UNLOADING,
+        optimize_sequence=True,
+        actions=[BucketActionCreate(bucket_id=i, target_position_id=i) for i in (1, 2, 3)],
+    )
+    positions = {1: (0, 0, 0), 2: (50, 0, 0), 3: (1, 0, 0)}
+
+    actions, plan = _sequence_actions(order, positions, later(20))
+    assert plan is not None
+
+    actions, plan = _sequence_actions(order, positions, time.perf_counter())
+    assert actions == order.actions
+    assert plan is None
+
+
+def test_independent_actions_can_be_reordered():
+    assert can_reorder([(1, 10, 20), (2, 11, 21), (None, None, 22)])
+
+
+def test_bucket_moved_twice_cannot_be_reordered():
+    assert not can_reorder([(1, 10, 20), (1, 20, 30)])
+
+
+def test_position_emptied_and_filled_cannot_be_reordered():
+    assert not can_reorder([(1, 10, 20), (2, 20, 30)])
+    assert not can_reorder([(None, None, 10), (2, 10, None)])
@@ -0,0 +1,24 @@
+from app.core.slot_allocator import SlotAllocator
+
+
+def test_reload_keeps_outstanding_reservations():
+    allocator = SlotAllocator(reservation_ttl=60)
+    allocator.load(range(1, 11), [1])
+    first = allocator.allocate(3)
+    assert first == [2, 3, 4]
+
+    # A position upload reloads the allocator; a bucket has since arrived at 3
+    allocator.load(range(1, 21), [1, 3])
+    assert not allocator.is_free(2)
+    assert not allocator.is_free(4)
+    second = allocator.allocate(3)
+    assert not set(first) & set(second)
+
+
+def test_reload_drops_reservations_of_removed_positions():
+    allocator = SlotAllocator(reservation_ttl=60)
+    allocator.load(range(1, 11), [])
+    allocator.allocate(2)
+    allocator.load(range(3, 11), [])
+    allocator.add_position(1)
+    assert allocator.is_free(1)
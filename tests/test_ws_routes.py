@@ -0,0 +1,28 @@
+import asyncio
+import time
+
+from app.api.ws_routes import OrderIngestConnection
+
+
+class IdleWebSocket:
+    """A client that connects and then never sends anything"""
+
+    def __init__(self):
+        self.closed = None
+
+    async def receive_text(self) -> str:
+        await asyncio.Event().wait()
+
+    async def close(self, code: int, reason: str):
+        self.closed = (code, reason)
+
+
+def test_idle_order_socket_is_closed_when_its_token_expires():
+    websocket = IdleWebSocket()
+    connection = OrderIngestConnection(websocket, {"exp": time.time() + 0.05}, max_in_flight=4)
+
+    started = time.monotonic()
+    asyncio.run(asyncio.wait_for(connection.run(), 2))
+
+    assert time.monotonic() - started < 1
+    assert websocket.closed == (1008, "Token has expired")